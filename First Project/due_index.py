@@ -0,0 +1,108 @@
+"""Sidecar index of task due dates, so tasks due in a date range are
+found without reading the whole of tasks.txt."""
+
+from datetime import date
+from datetime import timedelta
+
+import task_journal
+from offset_index import OffsetIndex
+from task_dates import date_key
+from task_files import iter_raw_tasks
+
+
+def iter_due_offsets(file_path, end=None):
+    """Scans the tasks file once and yields the due date of each task.
+
+    Tasks with a due date that cannot be read are left out.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    end: Byte offset to stop before, or None to read to the end.
+
+    Yields:
+    tuple: (due date as YYYY-MM-DD, byte offset) in file order.
+    """
+    for offset, task in iter_raw_tasks(file_path, 0, end):
+        key = date_key(task[4]) if len(task) >= 6 else "unknown"
+        if key != "unknown":
+            yield key, offset
+
+
+# The due date of each task, kept in tasks.txt.index so tasks due in a
+# range are found by a range query on the date
+date_index = OffsetIndex("due", iter_due_offsets)
+
+
+def record_due_dates(file_path, new_tasks):
+    """Adds newly appended tasks to the index.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    new_tasks: List of (due date, byte offset) pairs in file order.
+    """
+    if not new_tasks:
+        return
+    entries = []
+    for due_date, offset in new_tasks:
+        key = date_key(due_date)
+        if key != "unknown":
+            entries.append((key, offset))
+    date_index.record(file_path, entries, new_tasks[0][1])
+
+
+def date_range(start=None, end=None):
+    """Converts a date range to the YYYY-MM-DD keys used by the index.
+
+    Parameters:
+    start (date): First day of the range, or None for no lower limit.
+    end (date): Day after the range ends, or None for no upper limit.
+
+    Returns:
+    tuple: (start key, end key)
+    """
+    start_key = start.strftime("%Y-%m-%d") if start else ""
+    end_key = end.strftime("%Y-%m-%d") if end else "9999-99-99"
+    return start_key, end_key
+
+
+def get_tasks_due(file_path, start=None, end=None, include_completed=False):
+    """Yields the tasks due from start up to, but not including, end in
+    due date order. Due dates changed in the task journal are taken into
+    account.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    start (date): First due date to include, or None for no lower limit.
+    end (date): Day after the last due date to include, or None.
+    include_completed (bool): True to include completed tasks.
+    """
+    start_key, end_key = date_range(start, end)
+    entries = date_index.range_offsets(file_path, start_key, end_key)
+    offsets = [offset for _, offset in entries]
+
+    def in_range(due_date):
+        key = date_key(due_date)
+        return key != "unknown" and start_key <= key < end_key
+
+    found = [
+        (date_key(task[4]), offset, task)
+        for offset, task in task_journal.lookup(
+            file_path, offsets, "due_date", in_range
+        )
+        if include_completed or task[5].strip().lower() != "yes"
+    ]
+    found.sort(key=lambda item: item[:2])
+    for _, _, task in found:
+        yield task
+
+
+def due_within(today=None, days=7):
+    """Returns the (start, end) dates for tasks due in the next days days,
+    counting today."""
+    today = today or date.today()
+    return today, today + timedelta(days=days)
+
+
+def overdue_range(today=None):
+    """Returns the (start, end) dates for tasks due before today."""
+    return None, today or date.today()
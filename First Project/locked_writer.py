@@ -0,0 +1,238 @@
+"""Appends to the shared text files under an advisory lock.
+
+Several copies of the programme may write to the same tasks.txt and
+user.txt. Every write, and the index and stats updates that follow it,
+happens while holding an exclusive fcntl lock on a .lock file next to
+the data file. The lock file is never replaced, so the lock still holds
+while compact swaps in a new tasks.txt.
+
+Within one process GroupWriter queues appends from many threads and
+commits whatever has built up as one write and one fsync under a single
+lock, so more writers mean bigger batches rather than more waiting.
+"""
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so only threads in this process are kept apart
+    fcntl = None
+
+# Guards _file_locks
+_registry_lock = threading.Lock()
+
+# A reentrant thread lock and open lock file for each data file
+_file_locks = {}
+
+
+def lock_path(file_path):
+    """Returns the path of the lock file for a data file."""
+    return file_path + ".lock"
+
+
+class _FileLock:
+    """Holds the thread lock and fcntl lock for one data file.
+
+    fcntl locks belong to the whole process, so the thread lock decides
+    which thread holds it and a depth count lets the same thread take it
+    again while it already holds it.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def acquire(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self.file = open(lock_path(self.file_path), "a")
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+
+@contextmanager
+def locked(file_path):
+    """Holds the exclusive lock on a data file for the body of a with
+    block. The same thread may nest these blocks.
+
+    Parameters:
+    file_path: The path to the data file being written.
+    """
+    key = os.path.abspath(file_path)
+    with _registry_lock:
+        file_lock = _file_locks.get(key)
+        if file_lock is None:
+            file_lock = _file_locks[key] = _FileLock(file_path)
+    file_lock.acquire()
+    try:
+        yield
+    finally:
+        file_lock.release()
+
+
+def run_after_write(file_path, function, *args):
+    """Calls function to update the indexes and stats of a file that has
+    just been appended to and synced.
+
+    The new lines are already safely on disk, so a failure here must not
+    be reported as a failed write. It is printed as a warning instead, and
+    the sidecars, which no longer match the file's signature, are rebuilt
+    the next time they are read.
+
+    Parameters:
+    file_path: The path to the file written.
+    function: The function to call with args.
+    """
+    try:
+        function(*args)
+    except Exception as error:
+        print(
+            f"Warning: {file_path} was written but its indexes could not"
+            f" be updated: {error}",
+            file=sys.stderr,
+        )
+
+
+class _Pending:
+    """One queued line and, once written, where it went."""
+
+    __slots__ = ("item", "data", "offset", "error", "done")
+
+    def __init__(self, item, data):
+        self.item = item
+        self.data = data
+        self.offset = None
+        self.error = None
+        self.done = False
+
+
+class GroupWriter:
+    """Appends lines to a file, committing queued lines in groups.
+
+    The first thread to find no commit under way takes the file lock,
+    then everything queued by then, writes it with one write and one
+    fsync and wakes the others. Threads that queued a line meanwhile
+    either find it written or commit the next group themselves.
+
+    Attributes:
+    file_path (str): The path to the file appended to.
+    after_write: Optional function called, still under the lock, with a
+    list of (item, offset) pairs for each group written. Indexes and stats
+    that must match the file are updated here.
+    """
+
+    def __init__(self, file_path, after_write=None):
+        self.file_path = file_path
+        self.after_write = after_write
+        self._condition = threading.Condition()
+        self._queue = []
+        self._committing = False
+
+    def append(self, item, line):
+        """Queues a line and returns once it has been written.
+
+        Parameters:
+        item: Passed on to after_write alongside the line's offset.
+        line (str): The line to append, including its newline.
+
+        Returns:
+        int: The byte offset the line was written at.
+        """
+        pending = _Pending(item, line.encode())
+        with self._condition:
+            self._queue.append(pending)
+            while not pending.done:
+                if self._committing:
+                    self._condition.wait()
+                    continue
+                self._committing = True
+                self._condition.release()
+                try:
+                    self._commit()
+                finally:
+                    self._condition.acquire()
+                    self._committing = False
+                    self._condition.notify_all()
+        if pending.error is not None:
+            raise pending.error
+        return pending.offset
+
+    def _take_queue(self):
+        """Removes and returns everything queued so far."""
+        with self._condition:
+            group, self._queue = self._queue, []
+        return group
+
+    def _write(self, group):
+        """Appends the lines of a group with one write and one fsync.
+
+        A write that fails part way is cut back off the file, so no part
+        line is left behind.
+        """
+        with open(self.file_path, "ab") as file:
+            start = offset = file.seek(0, os.SEEK_END)
+            for pending in group:
+                pending.offset = offset
+                offset += len(pending.data)
+            try:
+                file.write(b"".join(pending.data for pending in group))
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                file.truncate(start)
+                raise
+
+    def _commit(self):
+        """Writes everything queued and runs after_write.
+
+        The queue is only taken once the file lock is held, so lines
+        queued while waiting for another process join this group. Only a
+        failure to take the lock or to write fails the group's appends,
+        see run_after_write.
+        """
+        group = []
+        written = False
+        try:
+            with locked(self.file_path):
+                group = self._take_queue()
+                self._write(group)
+                written = True
+                if self.after_write is not None:
+                    run_after_write(
+                        self.file_path,
+                        self.after_write,
+                        [(pending.item, pending.offset) for pending in group],
+                    )
+        except Exception as error:
+            # Releasing the lock can fail after the lines were written,
+            # in which case they are still reported as written
+            if not written:
+                if not group:
+                    group = self._take_queue()
+                for pending in group:
+                    pending.error = error
+        for pending in group:
+            pending.done = True
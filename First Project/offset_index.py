@@ -0,0 +1,325 @@
+"""Append-only sidecar indexes from keys to the byte offsets of tasks.
+
+Every index of a tasks file lives in one SQLite database next to it,
+tasks.txt.index, with a table per index. A row holds a run of offsets
+for one key packed into a blob, so adding tasks inserts a row for each
+key they touch instead of writing the whole index again. Runs of a key
+are merged once the newest are no bigger than the one before, which
+keeps the number of rows per key logarithmic in its number of tasks.
+
+Each index records the signature of the tasks file it covers. It is
+extended when new tasks start exactly where it ends and rebuilt when
+the file changed in any other way. A lookup reads only the rows of the
+keys it needs.
+"""
+
+import os
+import sqlite3
+import threading
+from array import array
+from itertools import groupby
+
+from task_files import file_signature
+
+# How long to wait for another process writing the same index
+busy_timeout = 30
+
+# One connection per thread and index file, sqlite3 connections cannot
+# be shared between threads
+_local = threading.local()
+
+schema = """
+CREATE TABLE IF NOT EXISTS coverage (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+"""
+
+# Created for each index, with {name} replaced by the index's name
+table_schema = """
+CREATE TABLE IF NOT EXISTS {name} (
+    key TEXT NOT NULL,
+    run INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    offsets BLOB NOT NULL,
+    PRIMARY KEY (key, run)
+);
+"""
+
+
+def index_path(file_path):
+    """Returns the path of the index database for a tasks file."""
+    return file_path + ".index"
+
+
+def _pack(offsets):
+    """Returns a list of offsets as a blob."""
+    return array("q", offsets).tobytes()
+
+
+def _unpack(blob):
+    """Reverses _pack."""
+    offsets = array("q")
+    offsets.frombytes(blob)
+    return offsets
+
+
+def _connections():
+    """Returns this thread's open connections keyed by database path."""
+    if not hasattr(_local, "connections"):
+        _local.connections = {}
+    return _local.connections
+
+
+def _open(path):
+    """Opens an index database, creating it if needed."""
+    connection = sqlite3.connect(
+        path, timeout=busy_timeout, isolation_level=None
+    )
+    try:
+        # The index can always be rebuilt, so losing the last few appends
+        # in a power cut is an acceptable price for not syncing each one
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(schema)
+    except sqlite3.Error:
+        connection.close()
+        raise
+    return connection
+
+
+def _remove(path):
+    """Deletes a damaged index database along with its WAL files."""
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def connect(file_path):
+    """Returns this thread's connection to the index database of a tasks
+    file. A database that cannot be opened is deleted and started again.
+    """
+    path = index_path(file_path)
+    connections = _connections()
+    if path not in connections:
+        try:
+            connections[path] = _open(path)
+        except sqlite3.OperationalError:
+            raise
+        except sqlite3.DatabaseError:
+            _remove(path)
+            connections[path] = _open(path)
+    return connections[path]
+
+
+def close_indexes():
+    """Closes this thread's index connections, so the next lookup opens
+    the databases again from disk."""
+    connections = _connections()
+    for connection in connections.values():
+        connection.close()
+    connections.clear()
+
+
+class OffsetIndex:
+    """One index in the database, from a key to the offsets of tasks.
+
+    Attributes:
+    name (str): The table the index is kept in.
+    build: Function taking (file path, end) and yielding (key, offset)
+    pairs for the tasks before byte end, in file order.
+    """
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+
+    def _coverage(self, connection):
+        """Returns the signature of the tasks file the index covers, or
+        None if it has not been built."""
+        row = connection.execute(
+            "SELECT size, mtime FROM coverage WHERE name = ?", (self.name,)
+        ).fetchone()
+        return list(row) if row else None
+
+    def _set_coverage(self, connection, signature):
+        """Records the signature of the tasks file the index covers."""
+        connection.execute(
+            "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?)",
+            (self.name, *signature),
+        )
+
+    def _rebuild(self, connection, file_path, signature):
+        """Replaces the index with one built from the tasks file up to
+        the size in signature."""
+        offsets = {}
+        for key, offset in self.build(file_path, signature[0]):
+            offsets.setdefault(key, []).append(offset)
+        connection.execute(f"DELETE FROM {self.name}")
+        connection.executemany(
+            f"INSERT INTO {self.name} VALUES (?, 0, ?, ?)",
+            (
+                (key, len(key_offsets), _pack(key_offsets))
+                for key, key_offsets in offsets.items()
+            ),
+        )
+        self._set_coverage(connection, signature)
+
+    def _append(self, connection, key, offsets):
+        """Adds offsets later than any already indexed to a key, merging
+        the newest runs into them while those are no more than twice as
+        long."""
+        runs = connection.execute(
+            f"SELECT run, count FROM {self.name} WHERE key = ? "
+            "ORDER BY run DESC",
+            (key,),
+        ).fetchall()
+        count = len(offsets)
+        merged = []
+        for run, run_count in runs:
+            if run_count > 2 * count:
+                break
+            merged.append(run)
+            count += run_count
+        if not merged:
+            run = runs[0][0] + 1 if runs else 0
+            connection.execute(
+                f"INSERT INTO {self.name} VALUES (?, ?, ?, ?)",
+                (key, run, count, _pack(offsets)),
+            )
+            return
+        first = merged[-1]
+        blobs = connection.execute(
+            f"SELECT offsets FROM {self.name} WHERE key = ? AND run >= ? "
+            "ORDER BY run",
+            (key, first),
+        ).fetchall()
+        joined = array("q")
+        for (blob,) in blobs:
+            joined.extend(_unpack(blob))
+        joined.extend(offsets)
+        connection.execute(
+            f"DELETE FROM {self.name} WHERE key = ? AND run >= ?",
+            (key, first),
+        )
+        connection.execute(
+            f"INSERT INTO {self.name} VALUES (?, ?, ?, ?)",
+            (key, first, count, joined.tobytes()),
+        )
+
+    def _write(self, file_path, write):
+        """Runs write(connection) in a write transaction, starting the
+        database again if it turns out to be damaged."""
+        for attempt in range(2):
+            connection = connect(file_path)
+            try:
+                connection.execute(table_schema.format(name=self.name))
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    write(connection)
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                connection.execute("COMMIT")
+                return
+            except sqlite3.OperationalError:
+                # Busy or locked, which says nothing about the file itself
+                raise
+            except sqlite3.DatabaseError:
+                if attempt:
+                    raise
+                close_indexes()
+                _remove(index_path(file_path))
+
+    def _read(self, file_path, read):
+        """Returns read(connection) from an index that covers the tasks
+        file as it is now, rebuilding the index first if it does not."""
+        signature = file_signature(file_path)
+        if signature is None:
+            raise FileNotFoundError(2, "No such file", file_path)
+        connection = connect(file_path)
+        damaged = False
+        try:
+            connection.execute("BEGIN")
+            try:
+                if self._coverage(connection) == signature:
+                    return read(connection)
+            finally:
+                connection.execute("COMMIT")
+        except sqlite3.OperationalError as error:
+            # A missing table is the same as an index never built
+            if "no such table" not in str(error):
+                raise
+            damaged = True
+
+        def rebuild(connection):
+            # Another process may have rebuilt it while this one waited
+            if damaged or self._coverage(connection) != signature:
+                self._rebuild(connection, file_path, signature)
+
+        self._write(file_path, rebuild)
+        return read(connect(file_path))
+
+    def offsets(self, file_path, key):
+        """Returns the offsets of the tasks indexed under key in file
+        order."""
+
+        def read(connection):
+            offsets = array("q")
+            for (blob,) in connection.execute(
+                f"SELECT offsets FROM {self.name} WHERE key = ? "
+                "ORDER BY run",
+                (key,),
+            ):
+                offsets.extend(_unpack(blob))
+            return offsets
+
+        return self._read(file_path, read)
+
+    def range_offsets(self, file_path, start_key, end_key):
+        """Returns (key, offset) pairs for the keys from start_key up to,
+        but not including, end_key in key and then file order."""
+
+        def read(connection):
+            return [
+                (key, offset)
+                for key, blob in connection.execute(
+                    f"SELECT key, offsets FROM {self.name} "
+                    "WHERE key >= ? AND key < ? ORDER BY key, run",
+                    (start_key, end_key),
+                )
+                for offset in _unpack(blob)
+            ]
+
+        return self._read(file_path, read)
+
+    def record(self, file_path, entries, start):
+        """Adds newly appended tasks to the index.
+
+        The index is only extended if it covered the file right up to the
+        first new task, otherwise it is rebuilt from scratch.
+
+        Parameters:
+        file_path: The path to the tasks file.
+        entries: (key, offset) pairs for just the new tasks in file
+        order.
+        start (int): The byte offset the first new task was written at.
+        """
+        signature = file_signature(file_path)
+
+        def write(connection):
+            coverage = self._coverage(connection)
+            if coverage == signature:
+                return
+            if coverage is None or coverage[0] != start:
+                self._rebuild(connection, file_path, signature)
+                return
+            ordered = sorted(entries, key=lambda entry: entry[0])
+            for key, group in groupby(ordered, key=lambda entry: entry[0]):
+                self._append(connection, key, [offset for _, offset in group])
+            self._set_coverage(connection, signature)
+
+        self._write(file_path, write)
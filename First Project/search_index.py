@@ -0,0 +1,193 @@
+"""Sidecar inverted index of the words in task titles and descriptions.
+
+Each word maps to the byte offsets of the tasks using it, kept in
+tasks.txt.index (see offset_index), so a search reads only the postings
+for its words and then the matching tasks, never the whole of tasks.txt.
+
+Queries are words separated by spaces, all of which must match. Words
+joined by OR match if either does, and a word ending in * matches every
+word starting with it, so "report OR summary proj*" finds tasks about a
+report or a summary that mention a project. Results are ranked by how
+many of the query's words each task matches.
+"""
+
+import re
+
+import task_journal
+from offset_index import OffsetIndex
+from task_files import iter_raw_tasks, read_tasks_at
+
+# Letters and digits make up a word, everything else separates them
+word_pattern = re.compile(r"[^\W_]+")
+
+
+def tokenise(text):
+    """Returns the lower case words in some text."""
+    return word_pattern.findall(text.lower())
+
+
+def task_words(task):
+    """Returns the set of words in a task's title and description."""
+    return set(tokenise(task[1])) | set(tokenise(task[2]))
+
+
+def add_task_postings(postings, task, offset):
+    """Adds a task's words to a postings dictionary.
+
+    Parameters:
+    postings (dict): Words as keys and lists of offsets as values.
+    task: The task's fields.
+    offset (int): The byte offset of the task, later than any already
+    added so each list stays sorted.
+    """
+    for word in task_words(task):
+        postings.setdefault(word, []).append(offset)
+
+
+def iter_word_offsets(file_path, end=None):
+    """Scans the tasks file once and yields each word of each task.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    end: Byte offset to stop before, or None to read to the end.
+
+    Yields:
+    tuple: (word, byte offset) in file order.
+    """
+    for offset, task in iter_raw_tasks(file_path, 0, end):
+        if len(task) >= 6:
+            for word in task_words(task):
+                yield word, offset
+
+
+# The words of each task, kept in tasks.txt.index
+word_index = OffsetIndex("words", iter_word_offsets)
+
+# Sorts after every other character, so a prefix followed by it bounds
+# the words starting with the prefix
+last_character = chr(0x10FFFF)
+
+
+def lookup(file_path, word, prefix=False):
+    """Returns the set of offsets for a word, or for every word starting
+    with it if prefix is True."""
+    if not prefix:
+        return set(word_index.offsets(file_path, word))
+    return {
+        offset
+        for _, offset in word_index.range_offsets(
+            file_path, word, word + last_character
+        )
+    }
+
+
+def record_postings(file_path, new_postings, start):
+    """Adds the words of newly appended tasks to the index.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    new_postings (dict): Postings built by add_task_postings for just the
+    new tasks.
+    start (int): The byte offset the first new task was written at.
+    """
+    if not new_postings:
+        return
+    word_index.record(
+        file_path,
+        [
+            (word, offset)
+            for word, offsets in new_postings.items()
+            for offset in offsets
+        ],
+        start,
+    )
+
+
+def parse_query(query):
+    """Splits a query into the groups of words that must all match.
+
+    Parameters:
+    query (str): Words separated by spaces, optionally joined by OR and
+    ending in * for a prefix.
+
+    Returns:
+    list: One list per group of (word, prefix) pairs, any of which may
+    match.
+    """
+    groups = []
+    join_next = False
+    for part in query.split():
+        if part in ("OR", "|"):
+            join_next = bool(groups)
+            continue
+        prefix = part.endswith("*")
+        terms = [(word, False) for word in tokenise(part)]
+        if not terms:
+            continue
+        if prefix:
+            terms[-1] = (terms[-1][0], True)
+        # A word such as "sign-off" must match both halves
+        if join_next and len(terms) == 1:
+            groups[-1].append(terms[0])
+        else:
+            groups.extend([term] for term in terms)
+        join_next = False
+    return groups
+
+
+def rank(groups, lookup):
+    """Finds the ids matching every group, best matches first.
+
+    Parameters:
+    groups (list): Output of parse_query.
+    lookup: Function taking (word, prefix) and returning a set of ids.
+
+    Returns:
+    list: (number of words matched, id) pairs, most matched first and
+    then in id order.
+    """
+    scores = None
+    for group in groups:
+        group_scores = {}
+        for word, prefix in group:
+            for task_id in lookup(word, prefix):
+                group_scores[task_id] = group_scores.get(task_id, 0) + 1
+        if scores is None:
+            scores = group_scores
+        else:
+            scores = {
+                task_id: score + group_scores[task_id]
+                for task_id, score in scores.items()
+                if task_id in group_scores
+            }
+        if not scores:
+            return []
+    return sorted(
+        ((score, task_id) for task_id, score in (scores or {}).items()),
+        key=lambda item: (-item[0], item[1]),
+    )
+
+
+def search(file_path, query):
+    """Yields the tasks matching a query, best matches first. Deleted
+    tasks are left out and journalled edits applied.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    query (str): The search, see parse_query.
+
+    Yields:
+    tuple: (number of words matched, offset, task)
+    """
+    ranked = rank(
+        parse_query(query),
+        lambda word, prefix: lookup(file_path, word, prefix),
+    )
+    overlay = task_journal.load_overlay(file_path)
+    offsets = [offset for _, offset in ranked]
+    for (score, offset), task in zip(
+        ranked, read_tasks_at(file_path, offsets)
+    ):
+        task = task_journal.merge(overlay, offset, task)
+        if task is not None:
+            yield score, offset, task
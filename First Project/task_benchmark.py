@@ -0,0 +1,367 @@
+"""Benchmarks for the task manager's storage backends.
+
+Generates user.txt and tasks.txt files of a chosen size in the app's own
+format, then times loading, viewing all tasks ("va"), viewing one user's
+tasks ("vm"), statistics, searching and adding tasks through the storage
+classes rather than the interactive menu. Each run is added to a JSON
+file so runs can be compared over time.
+
+With --login-costs it instead times logging in with passwords hashed at
+each cost, one at a time and with every core busy, to help choose
+user_credentials.hash_iterations.
+
+Usage:
+    python task_benchmark.py --rows 10000 1000000 --backend text sqlite
+    python task_benchmark.py --login-costs 50000 200000 600000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+
+import due_index
+import offset_index
+import task_dates
+import task_journal
+import task_stats
+import task_storage
+import task_store
+import user_credentials
+
+# Words the generated titles and descriptions are made from
+words = (
+    "finish review update prepare send check report summary budget "
+    "meeting client server deploy invoice project schedule design test "
+    "plan draft agenda backup migrate audit website order stock"
+).split()
+
+# Row counts the request asked for, used when none are given
+default_rows = [10_000]
+
+
+def generate_users(file_path, count):
+    """Writes admin and count - 1 generated users to a user.txt file.
+
+    Returns:
+    list: The usernames written.
+    """
+    usernames = ["admin"] + [f"user{number}" for number in range(1, count)]
+    with open(file_path, "w") as file:
+        file.write("admin, adm1n\n")
+        for username in usernames[1:]:
+            file.write(f"{username}, pass{username[4:]}\n")
+    return usernames
+
+
+def generate_tasks(file_path, count, usernames, seed=0):
+    """Writes count generated tasks to a tasks.txt file.
+
+    Dates are spread over two years either side of today and written in
+    each of the formats tasks.txt is known to contain. Some descriptions
+    hold a | where the user typed a comma, as replace_commas would store.
+
+    Parameters:
+    file_path: The path to write to.
+    count (int): The number of tasks.
+    usernames (list): Users to assign the tasks to.
+    seed (int): Seed for the random choices, so runs are repeatable.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    days = [today + timedelta(days=offset) for offset in range(-365, 366)]
+    # Formatting dates is slow, so each day is formatted once per format
+    date_strings = [
+        [day.strftime(pattern) for pattern in task_dates.date_formats]
+        for day in days
+    ]
+    with open(file_path, "w", buffering=1024 * 1024) as file:
+        for _ in range(count):
+            day = rng.randrange(len(days) - 30)
+            assigned = rng.choice(date_strings[day])
+            due = rng.choice(date_strings[day + rng.randrange(30)])
+            title = " ".join(rng.sample(words, 2)).capitalize()
+            description = " ".join(rng.sample(words, 6))
+            if rng.random() < 0.2:
+                description = description.replace(" ", "| ", 1)
+            completed = "Yes" if rng.random() < 0.3 else "No"
+            file.write(
+                f"{rng.choice(usernames)}, {title}, {description}, "
+                f"{assigned}, {due}, {completed}\n"
+            )
+
+
+def clear_caches():
+    """Forgets everything the modules keep in memory, as a freshly started
+    programme would."""
+    task_stats._stats_cache.clear()
+    offset_index.close_indexes()
+    task_journal._journal_cache.clear()
+    task_dates._parse.cache_clear()
+
+
+@contextmanager
+def timed(timings, name):
+    """Adds the seconds taken by the body of a with block to timings."""
+    start = time.perf_counter()
+    yield
+    timings[name] = round(time.perf_counter() - start, 6)
+
+
+def open_storage(backend, directory):
+    """Returns a storage backend over the files in directory."""
+    user_file = os.path.join(directory, "user.txt")
+    task_file = os.path.join(directory, "tasks.txt")
+    if backend == "sqlite":
+        db_path = os.path.join(directory, "tasks.db")
+        return task_storage.SqliteStorage(db_path)
+    storage = task_storage.TextStorage(user_file, task_file)
+    if backend == "memory":
+        return task_store.MemoryStorage(storage)
+    return storage
+
+
+def view_all(storage, page_size=10):
+    """Reads every page the way "va" does and returns the number of
+    tasks seen."""
+    pager = storage.pager(page_size)
+    page = 0
+    seen = 0
+    while True:
+        tasks = pager.read_page(page)
+        if not tasks:
+            return seen
+        seen += len(tasks)
+        page += 1
+
+
+def new_tasks(count, usernames, seed=1):
+    """Returns count tasks to add, in the format new_task builds."""
+    rng = random.Random(seed)
+    today = datetime.today().strftime(task_dates.canonical_format)
+    return [
+        [
+            rng.choice(usernames),
+            " ".join(rng.sample(words, 2)).capitalize(),
+            " ".join(rng.sample(words, 6)),
+            today,
+            today,
+            "No",
+        ]
+        for _ in range(count)
+    ]
+
+
+def run_benchmark(rows, backend, directory, adds=100, bulk_adds=10_000):
+    """Generates files of the given size and times each operation.
+
+    Parameters:
+    rows (int): The number of tasks to generate.
+    backend (str): "text", "sqlite" or "memory".
+    directory (str): Where to write the generated files.
+    adds (int): Tasks added one at a time, as "a" does.
+    bulk_adds (int): Tasks added in one call to add_tasks.
+
+    Returns:
+    dict: Operation names as keys and seconds taken as values.
+    """
+    user_file = os.path.join(directory, "user.txt")
+    task_file = os.path.join(directory, "tasks.txt")
+    timings = {}
+    usernames = generate_users(user_file, max(10, rows // 100))
+    with timed(timings, "generate"):
+        generate_tasks(task_file, rows, usernames)
+    if backend == "sqlite":
+        storage = open_storage(backend, directory)
+        with timed(timings, "import_text"):
+            task_storage.import_text_files(storage, user_file, task_file)
+        storage.close()
+
+    # Cold means no sidecar files and nothing cached, as on a first run
+    clear_caches()
+    with timed(timings, "load_cold"):
+        storage = open_storage(backend, directory)
+        storage.load_users()
+        storage.statistics()
+    storage.close()
+    clear_caches()
+    with timed(timings, "load_warm"):
+        storage = open_storage(backend, directory)
+        storage.load_users()
+        storage.statistics()
+
+    with timed(timings, "view_all"):
+        view_all(storage)
+    with timed(timings, "view_mine"):
+        for _ in storage.iter_user_tasks(usernames[1]):
+            pass
+    with timed(timings, "statistics"):
+        storage.statistics()
+    with timed(timings, "due_this_week"):
+        for _ in storage.iter_tasks_due(*due_index.due_within()):
+            pass
+    with timed(timings, "search_cold"):
+        for _ in storage.search_tasks("report budget*"):
+            pass
+    with timed(timings, "search_warm"):
+        for _ in storage.search_tasks("report OR summary proj*"):
+            pass
+
+    tasks = new_tasks(adds + bulk_adds, usernames)
+    with timed(timings, f"add_task_x{adds}"):
+        for task in tasks[:adds]:
+            storage.add_task(task)
+    with timed(timings, f"add_tasks_x{bulk_adds}"):
+        storage.add_tasks(tasks[adds:])
+    with timed(timings, "statistics_after_adds"):
+        storage.statistics()
+    storage.close()
+    return timings
+
+
+def run_login_benchmark(cost, logins=50, threads=None):
+    """Times checking passwords hashed with a given number of iterations.
+
+    Parameters:
+    cost (int): PBKDF2 iterations, as passed to --hash-cost.
+    logins (int): Passwords to check at each concurrency.
+    threads (int): Logins checked at once, every core by default. The
+    hashing releases the GIL, so threads use every core.
+
+    Returns:
+    dict: Measurement names as keys, times in seconds.
+    """
+    threads = threads or os.cpu_count() or 1
+    stored = user_credentials.hash_password("pass1", cost)
+    timings = {}
+    latencies = []
+    for _ in range(logins):
+        start = time.perf_counter()
+        user_credentials.verify_password(stored, "pass1")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    timings["login_median"] = round(latencies[len(latencies) // 2], 6)
+    timings["login_max"] = round(latencies[-1], 6)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for _ in pool.map(
+            user_credentials.verify_password,
+            [stored] * logins,
+            ["pass1"] * logins,
+        ):
+            pass
+    seconds = time.perf_counter() - start
+    timings[f"logins_per_second_x{threads}"] = round(logins / seconds, 1)
+    return timings
+
+
+def save_results(output_file, runs):
+    """Adds runs to the list of earlier runs in a JSON file."""
+    try:
+        with open(output_file, "r") as file:
+            results = json.load(file)
+    except (FileNotFoundError, ValueError):
+        results = []
+    results.extend(runs)
+    with open(output_file, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Task manager benchmarks")
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=default_rows,
+        help="numbers of tasks to generate, e.g. 10000 1000000 10000000",
+    )
+    parser.add_argument(
+        "--backend",
+        nargs="+",
+        choices=["text", "sqlite", "memory"],
+        default=["text"],
+        help="storage backends to time",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark_results.json",
+        help="JSON file the results are added to",
+    )
+    parser.add_argument(
+        "--dir",
+        help="directory to generate files in, a temporary one by default",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the generated files"
+    )
+    parser.add_argument(
+        "--login-costs",
+        type=int,
+        nargs="+",
+        metavar="ITERATIONS",
+        help="time logins at each password hashing cost instead",
+    )
+    args = parser.parse_args(argv)
+
+    runs = []
+    for cost in args.login_costs or []:
+        timings = run_login_benchmark(cost)
+        print(f"login cost {cost}")
+        for name, value in timings.items():
+            if name.startswith("logins_per_second"):
+                print(f"  {name:<24}{value:.1f}")
+            else:
+                print(f"  {name:<24}{value * 1000:.1f}ms")
+        runs.append(
+            {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "login_cost": cost,
+                "timings": timings,
+            }
+        )
+    if args.login_costs:
+        save_results(args.output, runs)
+        print(f"Results added to {args.output}")
+        return
+
+    for rows in args.rows:
+        for backend in args.backend:
+            directory = tempfile.mkdtemp(prefix="tasks-", dir=args.dir)
+            try:
+                timings = run_benchmark(rows, backend, directory)
+            finally:
+                if not args.keep:
+                    shutil.rmtree(directory)
+            print(f"{backend} {rows} rows")
+            for name, seconds in timings.items():
+                print(f"  {name:<24}{seconds:.3f}s")
+            runs.append(
+                {
+                    "time": datetime.now().isoformat(timespec="seconds"),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "rows": rows,
+                    "backend": backend,
+                    "timings": timings,
+                }
+            )
+    save_results(args.output, runs)
+    print(f"Results added to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
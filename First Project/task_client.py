@@ -0,0 +1,236 @@
+"""Terminal client for task_server.py.
+
+Shows the same login and menu as task_manager.py, but every option is
+carried out by the server, so many people can use one shared copy of the
+tasks at once.
+
+Usage:
+    python task_client.py --port 8765
+    python task_client.py --unix /tmp/task_manager.sock
+"""
+
+import argparse
+import json
+import socket
+import sys
+
+from task_manager import (
+    format_task,
+    get_due_date,
+    get_valid_input,
+    print_statistics,
+    separator,
+)
+
+
+class ServerError(Exception):
+    """Raised when the server refuses a request. The message says why."""
+
+
+class TaskClient:
+    """Sends requests to the server over one connection.
+
+    Attributes:
+    connection (socket): The connection to the server.
+    file: Buffered reader and writer over the connection.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.file = connection.makefile("rwb")
+
+    def request(self, op, **fields):
+        """Sends a request and returns the server's response.
+
+        Raises:
+        ServerError: If the server could not carry it out.
+        ConnectionError: If the server has gone away.
+        """
+        fields["op"] = op
+        self.file.write(json.dumps(fields).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection")
+        response = json.loads(line)
+        if not response.pop("ok"):
+            raise ServerError(response["error"])
+        return response
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+def connect(args):
+    """Opens a connection to the server."""
+    if args.unix:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(args.unix)
+        return connection
+    return socket.create_connection((args.host, args.port))
+
+
+def login(client):
+    """Asks for a username and password until the server accepts them.
+
+    Returns:
+    dict: The server's response, with "username" and "admin".
+    """
+    while True:
+        print(separator)
+        username = input("Please enter your username: ")
+        password = input("Please enter your password: ")
+        try:
+            response = client.request(
+                "login", username=username, password=password
+            )
+        except ServerError as e:
+            print(e)
+            print("Login failed. Please try again")
+            continue
+        print(separator)
+        print("Login successful")
+        return response
+
+
+def page_through(client, op):
+    """Pages through the tasks from "va" or "vm" as "va" does in
+    task_manager.py."""
+    page = 0
+    while True:
+        response = client.request(op, page=page)
+        last_page = response["last_page"]
+        if not response["tasks"]:
+            print(separator)
+            print("There are no tasks to show.")
+            print(separator)
+            return
+        last = " (last page)" if page == last_page else ""
+        output = "".join(format_task(task) for task in response["tasks"])
+        output += f"{separator}\nPage {page + 1}{last}\n{separator}\n"
+        sys.stdout.write(output)
+
+        choice = input(
+            "n - next page, p - previous page, "
+            "page number - jump to page, e - exit: "
+        ).lower()
+        if choice == "n":
+            if page == last_page:
+                print("Already on the last page.")
+            else:
+                page += 1
+        elif choice == "p":
+            if page == 0:
+                print("Already on the first page.")
+            else:
+                page -= 1
+        elif choice.isdigit() and 0 < int(choice) <= last_page + 1:
+            page = int(choice) - 1
+        elif choice == "e":
+            return
+        else:
+            print("Invalid input. Please try again")
+
+
+def add_task(client):
+    """Asks for a new task and sends it to the server."""
+    task_user = input("Please assign the task to a user: ")
+    task_title = get_valid_input("Please input title of task: ")
+    task_desc = input("Please input description of task: ")
+    task_due = get_due_date()
+    client.request(
+        "a",
+        user=task_user,
+        title=task_title,
+        description=task_desc,
+        due=task_due,
+    )
+    print(separator)
+    print("Task successfully added!")
+
+
+def register_user(client):
+    """Asks for a new username and password and registers them."""
+    new_username = get_valid_input("Please enter new username: ")
+    while True:
+        print(separator)
+        new_password = get_valid_input("Please enter new password: ")
+        new_password_check = input("Please reenter password: ")
+        if new_password == new_password_check:
+            break
+        print("Passwords do not match. Please try again")
+    client.request("r", username=new_username, password=new_password)
+    print("User registered.")
+
+
+def display_menu(admin):
+    """Shows the options the server offers and returns the one chosen."""
+    options = (
+        "Select one of the following options: \n"
+        "r - register a user \n"
+        "a - add task \n"
+        "va - view all tasks \n"
+        "vm - view my tasks \n"
+    )
+    if admin:
+        options += "s - view statistics \n"
+    return input(options + "e - exit \n: ").lower()
+
+
+def run_menu(client, admin):
+    """Shows the menu and carries out options until the user exits."""
+    actions = {
+        "r": register_user,
+        "a": add_task,
+        "va": lambda client: page_through(client, "va"),
+        "vm": lambda client: page_through(client, "vm"),
+        "s": lambda client: print_statistics(
+            client.request("s")["statistics"]
+        ),
+    }
+    while True:
+        print(separator)
+        menu = display_menu(admin)
+        if menu == "e":
+            client.request("e")
+            print(separator)
+            print("Successfully logged out")
+            print("Goodbye!!!")
+            print(separator)
+            return
+        if menu not in actions:
+            print("You have entered an invalid input. Please try again")
+            continue
+        try:
+            actions[menu](client)
+        except ServerError as e:
+            print(separator)
+            print(e)
+            print(separator)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Task manager client")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", metavar="PATH", help="Unix socket to use")
+    args = parser.parse_args(argv)
+    try:
+        client = TaskClient(connect(args))
+    except OSError as e:
+        print(f"Error. Cannot connect to the server: {e}")
+        return 1
+    try:
+        response = login(client)
+        run_menu(client, response["admin"])
+    except ConnectionError as e:
+        print(f"Error. {e}")
+        return 1
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Date handling for the mixed date formats found in tasks.txt.
+
+The same few hundred date strings repeat across every row of a large
+tasks file, so each distinct string is parsed once and the result kept
+in a bounded LRU cache.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+
+from task_files import parse_task_line, replacing
+
+# Format written by date_format and get_due_date in task_manager.py
+canonical_format = "%d %b %y"
+
+# Formats seen in tasks.txt and import files, most common first
+date_formats = [
+    "%d %b %y",
+    "%d %b %Y",
+    "%d/%m/%y",
+    "%d/%m/%Y",
+    "%Y-%m-%d",
+]
+
+
+@lru_cache(maxsize=4096)
+def _parse(date_string):
+    """Tries each known format on a stripped date string."""
+    for date_format in date_formats:
+        try:
+            return datetime.strptime(date_string, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def parse_date(date_string):
+    """Converts a date string in any known format to a date.
+
+    Parameters:
+    date_string (str): The date to convert, e.g. "15 Nov 24".
+
+    Returns:
+    date: The parsed date, or None if no format matched.
+    """
+    return _parse(date_string.strip())
+
+
+def date_key(date_string):
+    """Converts a date string to YYYY-MM-DD so dates can be sorted and
+    compared as strings. Returns "unknown" if the date cannot be read."""
+    parsed = parse_date(date_string)
+    return parsed.isoformat() if parsed else "unknown"
+
+
+def normalise_date(date_string, date_format=canonical_format):
+    """Rewrites a date string in the canonical format.
+
+    Parameters:
+    date_string (str): The date to convert.
+    date_format (str): The format to write the date in.
+
+    Returns:
+    str: The converted date, or None if the date cannot be read.
+    """
+    parsed = parse_date(date_string)
+    return parsed.strftime(date_format) if parsed else None
+
+
+def rewrite_dates(file_path, date_format=canonical_format):
+    """Rewrites the date assigned and due date of every task in a tasks
+    file in a single format.
+
+    The file is streamed into a temporary file which is synced to disk
+    and then replaces the original, so a failure or crash part way
+    through leaves it untouched. Dates that cannot be read are left as
+    they are.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    date_format (str): The format to write the dates in.
+
+    Returns:
+    int: The number of lines that were changed.
+    """
+    changed = 0
+    with open(file_path, "r") as source, replacing(
+        file_path, sync=True
+    ) as target:
+        for line in source:
+            if not line.strip():
+                continue
+            task = parse_task_line(line)
+            if len(task) < 6:
+                target.write(line)
+                continue
+            new_task = list(task)
+            for column in (3, 4):
+                new_task[column] = (
+                    normalise_date(task[column], date_format) or task[column]
+                )
+            if new_task != task:
+                changed += 1
+            target.write(", ".join(new_task) + "\n")
+    return changed
@@ -0,0 +1,168 @@
+"""Low level helpers for reading tasks.txt, shared by every other module.
+
+Nothing here knows about the journal, the indexes or the storage
+backends, so any module can import it without creating an import cycle.
+"""
+
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+import task_profile
+
+# Size of the blocks prefix_checksum reads at a time
+checksum_block_size = 1024 * 1024
+
+# Bytes tail_checksum reads, however big the file
+tail_checksum_size = 64 * 1024
+
+
+def file_signature(file_path):
+    """Returns the size and modification time of a file.
+
+    Parameters:
+    file_path: The path to the file.
+
+    Returns:
+    list: [size in bytes, mtime in nanoseconds], or None if missing.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def prefix_checksum(file_path, size):
+    """Returns the crc32 of the first size bytes of a file.
+
+    Saved along with data parsed from a file, it shows whether the part
+    that was parsed is still the same, whatever else changed.
+
+    Parameters:
+    file_path: The path to the file.
+    size (int): The number of bytes to check.
+
+    Returns:
+    int: The checksum, or None if the file is shorter than size.
+    """
+    checksum = 0
+    with open(file_path, "rb") as file:
+        while size > 0:
+            block = file.read(min(size, checksum_block_size))
+            if not block:
+                return None
+            checksum = zlib.crc32(block, checksum)
+            size -= len(block)
+    return checksum
+
+
+def tail_checksum(file_path, size, length=tail_checksum_size):
+    """Returns the crc32 of the last length bytes of a file's first size
+    bytes, so it costs the same whatever the size of the file.
+
+    Parameters:
+    file_path: The path to the file.
+    size (int): Where the bytes checked end.
+    length (int): The number of bytes to check.
+
+    Returns:
+    int: The checksum, or None if the file is shorter than size.
+    """
+    start = max(size - length, 0)
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        block = file.read(size - start)
+    if len(block) < size - start:
+        return None
+    return zlib.crc32(block)
+
+
+@contextmanager
+def replacing(file_path, mode="w", buffering=-1, sync=False):
+    """Opens a temporary file that replaces file_path in a single rename
+    when the with block ends, so readers see either the old file or the
+    whole new one. The temporary file is removed if the block fails.
+
+    Parameters:
+    file_path: The file to replace.
+    mode (str): "w" to write text or "wb" to write bytes.
+    buffering (int): Passed to open.
+    sync (bool): True to fsync the new file before the rename, for files
+    that cannot be rebuilt from anything else.
+    """
+    # Other processes and threads may be replacing the same file, so each
+    # writes its own temporary file
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, mode, buffering=buffering) as file:
+            yield file
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_json(file_path, data):
+    """Saves data as a JSON sidecar file, see replacing."""
+    with replacing(file_path) as file:
+        # json.dumps uses the C encoder, json.dump the pure Python one
+        file.write(json.dumps(data))
+
+
+def parse_task_line(line):
+    """Splits one line of tasks.txt into its six stripped fields.
+
+    Parameters:
+    line (str): A line from tasks.txt.
+
+    Returns:
+    list: user, title, description, date assigned, due date, completed.
+    """
+    return [field.strip() for field in line.strip().split(",")]
+
+
+def iter_raw_tasks(file_path, start=0, end=None):
+    """Yields each task in the file along with its byte offset, exactly as
+    written, without the task journal applied.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    start: Byte offset to start reading from.
+    end: Byte offset to stop before, or None to read to the end. Both
+    must fall at the start of a line.
+
+    Yields:
+    tuple: (offset, task) where task is the list of parsed fields.
+    """
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        offset = start
+        for line in file:
+            if end is not None and offset >= end:
+                break
+            if line.strip():
+                yield offset, parse_task_line(line.decode())
+            offset += len(line)
+
+
+@task_profile.profiled_reader("read_tasks_at")
+def read_tasks_at(file_path, offsets):
+    """Yields the parsed task found at each byte offset.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    offsets: Byte offsets of task lines.
+    """
+    with open(file_path, "rb") as file:
+        for offset in offsets:
+            file.seek(offset)
+            yield parse_task_line(file.readline().decode())
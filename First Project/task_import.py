@@ -0,0 +1,103 @@
+"""Bulk import of tasks from CSV or JSONL files."""
+
+import csv
+import json
+from datetime import date
+
+from task_dates import normalise_date
+
+
+def iter_import_rows(file_path):
+    """Yields each row of a CSV or JSONL file as a dictionary.
+
+    CSV files need a header row. Files ending in .jsonl or .json are read
+    as one JSON object per line.
+
+    Parameters:
+    file_path: The path to the import file.
+
+    Yields:
+    tuple: (line number, row dictionary or None if the line is not valid)
+    """
+    with open(file_path, "r", newline="") as file:
+        if file_path.endswith((".jsonl", ".json")):
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+        else:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def prepare_tasks(rows, usernames, rejected):
+    """Turns import rows into task field lists ready to be written.
+
+    Rows with an unknown user, missing fields or a bad due date are
+    added to rejected instead.
+
+    Parameters:
+    rows: Iterable of (line number, row dictionary) pairs.
+    usernames (set): Registered usernames.
+    rejected (list): Receives (line number, reason) for skipped rows.
+
+    Yields:
+    list: user, title, description, date assigned, due date, completed.
+    """
+    today = date.today().strftime("%d %b %y")
+    for line_number, row in rows:
+        if row is None:
+            rejected.append((line_number, "line could not be read"))
+            continue
+        user = str(row.get("user") or "").strip()
+        title = str(row.get("title") or "").strip()
+        description = str(row.get("description") or "").strip()
+        due_date = str(row.get("due_date") or "").strip()
+        if not user or not title or not due_date:
+            rejected.append((line_number, "missing user, title or due_date"))
+            continue
+        if user not in usernames:
+            rejected.append((line_number, f'user "{user}" does not exist'))
+            continue
+        due_date = normalise_date(due_date)
+        if due_date is None:
+            rejected.append((line_number, "due_date not recognised"))
+            continue
+        assigned = str(row.get("date_assigned") or "").strip()
+        assigned = normalise_date(assigned) if assigned else today
+        if assigned is None:
+            rejected.append((line_number, "date_assigned not recognised"))
+            continue
+        completed = "No"
+        if str(row.get("completed")).strip().lower() == "yes":
+            completed = "Yes"
+
+        yield [
+            field.replace(",", "|")
+            for field in (user, title, description, assigned, due_date)
+        ] + [completed]
+
+
+def bulk_import(storage, file_path):
+    """Adds every valid task in an import file to the storage backend.
+
+    The file is streamed and all tasks are written in a single batch, so
+    a large import costs one open and one fsync of tasks.txt.
+
+    Parameters:
+    storage: The storage backend to add the tasks to.
+    file_path: The path to the CSV or JSONL file.
+
+    Returns:
+    tuple: (number of tasks added, list of (line number, reason) rejected)
+    """
+    usernames = set(storage.load_users())
+    rejected = []
+    rows = iter_import_rows(file_path)
+    added = storage.add_tasks(prepare_tasks(rows, usernames, rejected))
+    return added, rejected
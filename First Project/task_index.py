@@ -0,0 +1,53 @@
+"""Sidecar index mapping each user to the byte offsets of their tasks.
+
+The offsets are kept in tasks.txt.index, see offset_index, so adding a
+task appends to its user's offsets and viewing one user's tasks reads
+only that user's rows.
+"""
+
+import task_mmap
+from offset_index import OffsetIndex
+
+
+def iter_user_keys(file_path, end=None):
+    """Scans the tasks file once and yields the user of each task.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    end: Byte offset to stop before, or None to read to the end.
+
+    Yields:
+    tuple: (username, byte offset) in file order.
+    """
+    for offset, user in task_mmap.iter_user_offsets(file_path, end):
+        yield user, offset
+
+
+# The user of each task, built from tasks.txt alone
+user_index = OffsetIndex("users", iter_user_keys)
+
+
+def load_user_offsets(file_path, username):
+    """Returns the byte offsets of the tasks assigned to a user in
+    tasks.txt, rebuilding the index if the file was changed outside the
+    app.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    username: The user whose tasks are wanted.
+
+    Returns:
+    array: The offsets in file order.
+    """
+    return user_index.offsets(file_path, username)
+
+
+def record_tasks(file_path, new_tasks):
+    """Adds newly appended tasks to the index.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    new_tasks: List of (user, byte offset) pairs in file order.
+    """
+    if new_tasks:
+        user_index.record(file_path, new_tasks, new_tasks[0][1])
@@ -0,0 +1,307 @@
+"""Append-only journal of edits to tasks.txt.
+
+Marking a task complete, reassigning it, changing its due date or
+deleting it adds one line to tasks.txt.journal instead of rewriting
+tasks.txt. Readers merge the journal over the lines they read, and
+compact folds it into a fresh tasks.txt.
+
+Tasks are identified by the byte offset of their line in tasks.txt,
+which does not change while new tasks are appended. The offsets only
+mean something in the tasks.txt they were recorded against, so the
+journal starts with a header naming that file by device and inode, and
+by the size it had then and the crc32 of its last 64KB, in case it has
+since been copied. Neither needs more than that one block read, so an
+edit costs the same however big tasks.txt is. A journal left behind by
+a compaction that stopped after replacing tasks.txt matches neither, as
+a delete or any edit changing a line's length moves the bytes before
+the old size, and is ignored, then cleared by the next edit. Edits that
+keep every line's length could leave those bytes alone, but then the
+journal only sets fields to the values they already have.
+"""
+
+import json
+import os
+
+from task_files import (
+    file_signature,
+    iter_raw_tasks,
+    prefix_checksum,
+    read_tasks_at,
+    replacing,
+    tail_checksum,
+)
+
+# Field names that can be changed and where they sit in a task
+editable_fields = {"user": 0, "due_date": 4, "completed": 5}
+
+# In-memory copy of each journal so repeated reads skip the file
+_journal_cache = {}
+
+
+def journal_path(file_path):
+    """Returns the path of the journal for a tasks file."""
+    return file_path + ".journal"
+
+
+def base_id(file_path):
+    """Returns [device, inode] of a tasks file, which changes whenever it
+    is replaced by a rename, or None if it is missing."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_dev, stat.st_ino]
+
+
+def _header(file_path):
+    """Returns the header of a new journal for a tasks file."""
+    size = os.path.getsize(file_path)
+    return {
+        "base": base_id(file_path),
+        "size": size,
+        "tail_checksum": tail_checksum(file_path, size),
+    }
+
+
+def _apply_entry(overlay, entry):
+    """Adds one journal entry to the overlay dictionary."""
+    offset = entry["offset"]
+    if entry.get("delete"):
+        overlay[offset] = None
+    elif offset not in overlay or overlay[offset] is not None:
+        changes = overlay.setdefault(offset, {})
+        changes.update(entry["changes"])
+
+
+def _read_journal(path):
+    """Reads a journal file.
+
+    Returns:
+    tuple: (header, overlay). header is a dictionary from _header, None
+    for a journal written before headers were added, which applies to
+    any tasks file, or False if the header cannot be read.
+    """
+    overlay = {}
+    header = False
+    with open(path, "r") as file:
+        for number, line in enumerate(file):
+            try:
+                entry = json.loads(line)
+                if number == 0 and "base" in entry:
+                    header = entry
+                    continue
+                if number == 0:
+                    header = None
+                _apply_entry(overlay, entry)
+            except (ValueError, KeyError, TypeError):
+                # A line cut short by a crash mid-write is ignored
+                pass
+    return header, overlay
+
+
+def _load_journal(file_path):
+    """Returns [signature, header, overlay, checked] for the journal of a
+    tasks file, from memory while the journal is unchanged. checked is
+    the base_id the journal was last found to apply to."""
+    path = journal_path(file_path)
+    signature = file_signature(path)
+    cached = _journal_cache.get(file_path)
+    if cached and cached[0] == signature:
+        return cached
+    header, overlay = _read_journal(path) if signature else (None, {})
+    _journal_cache[file_path] = [signature, header, overlay, None]
+    return _journal_cache[file_path]
+
+
+def _applies(file_path, cached):
+    """Returns True if a journal was written against the tasks file as it
+    is now, rather than one that has since been replaced.
+
+    The same file is recognised by its inode, or by the bytes before the
+    size it had when the journal was begun having the same checksum.
+    """
+    signature, header, _, checked = cached
+    if signature is None or header is None:
+        return True
+    if not header:
+        return False
+    base = base_id(file_path)
+    if base in (header["base"], checked):
+        return True
+    if "tail_checksum" in header:
+        checksum = tail_checksum(file_path, header["size"])
+        if checksum != header["tail_checksum"]:
+            return False
+    elif prefix_checksum(file_path, header["size"]) != header["checksum"]:
+        # Journals begun before the tail checksum checked the whole start
+        return False
+    cached[3] = base
+    return True
+
+
+def load_overlay(file_path):
+    """Returns the edits recorded for a tasks file.
+
+    Parameters:
+    file_path: The path to the tasks file.
+
+    Returns:
+    dict: Byte offsets as keys. Each value is a dictionary of changed
+    fields, or None if the task was deleted. Empty if the journal was
+    written against a tasks file that has since been replaced.
+    """
+    cached = _load_journal(file_path)
+    return cached[2] if _applies(file_path, cached) else {}
+
+
+def apply_changes(task, changes):
+    """Returns a copy of a task with changes applied, or None if changes
+    is None because the task was deleted."""
+    if changes is None:
+        return None
+    task = list(task)
+    for field, value in changes.items():
+        task[editable_fields[field]] = value
+    return task
+
+
+def merge(overlay, offset, task):
+    """Returns the task at offset with any journalled edits applied, or
+    None if it has been deleted."""
+    if offset in overlay:
+        return apply_changes(task, overlay[offset])
+    return task
+
+
+def offsets_changed_to(file_path, field, value):
+    """Returns the offsets of tasks whose field was edited to value.
+
+    Indexes built from tasks.txt alone miss these tasks, so lookups by
+    user or due date add them to the offsets they find.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    field (str): "user", "due_date" or "completed".
+    value: The value to match, or a function returning True for matches.
+    """
+    matches = value if callable(value) else (lambda other: other == value)
+    return [
+        offset
+        for offset, changes in load_overlay(file_path).items()
+        if changes and field in changes and matches(changes[field])
+    ]
+
+
+def lookup(file_path, base_offsets, field, value):
+    """Yields the tasks whose field matches value once journalled edits
+    are applied.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    base_offsets: Offsets an index found by reading tasks.txt alone.
+    field (str): "user", "due_date" or "completed".
+    value: The value to match, or a function returning True for matches.
+
+    Yields:
+    tuple: (offset, task) in file order.
+    """
+    matches = value if callable(value) else (lambda other: other == value)
+    overlay = load_overlay(file_path)
+    offsets = sorted(
+        set(base_offsets) | set(offsets_changed_to(file_path, field, value))
+    )
+    tasks = read_tasks_at(file_path, offsets)
+    for offset, task in zip(offsets, tasks):
+        task = merge(overlay, offset, task)
+        if task is not None and matches(task[editable_fields[field]]):
+            yield offset, task
+
+
+def _append(file_path, entry):
+    """Writes one entry to the end of the journal.
+
+    Returns:
+    int: The size the journal was before the entry was written.
+    """
+    path = journal_path(file_path)
+    cached = _load_journal(file_path)
+    if cached[0] is None or not _applies(file_path, cached):
+        # Starts a new journal, replacing one left over from before
+        # tasks.txt was replaced
+        cached = [None, _header(file_path), {}, None]
+        with open(path, "w") as file:
+            file.write(json.dumps(cached[1]) + "\n")
+    signature, header, overlay, checked = cached
+    with open(path, "a") as file:
+        start = file.tell()
+        file.write(json.dumps(entry) + "\n")
+
+    # Extends the cached overlay if it covered the journal up to start
+    if (signature[0] if signature else start) == start:
+        _apply_entry(overlay, entry)
+        _journal_cache[file_path] = [
+            file_signature(path),
+            header,
+            overlay,
+            checked,
+        ]
+    else:
+        _journal_cache.pop(file_path, None)
+    return start
+
+
+def record_change(file_path, offset, changes):
+    """Records an edit to the task at offset.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    offset (int): The byte offset of the task's line.
+    changes (dict): New values keyed by "user", "due_date" or "completed".
+
+    Returns:
+    int: The size the journal was before the edit was written.
+    """
+    for field in changes:
+        if field not in editable_fields:
+            raise ValueError(f"{field} cannot be changed")
+    return _append(file_path, {"offset": offset, "changes": changes})
+
+
+def record_delete(file_path, offset):
+    """Records that the task at offset has been deleted.
+
+    Returns:
+    int: The size the journal was before the deletion was written.
+    """
+    return _append(file_path, {"offset": offset, "delete": True})
+
+
+def compact(file_path):
+    """Folds the journal into a new tasks file.
+
+    The merged tasks are streamed to a temporary file which then replaces
+    tasks.txt in a single rename, after which the journal is removed. If
+    the journal is not removed, its header describes the old tasks.txt
+    and so it is ignored. A journal already left over like that is removed.
+
+    Parameters:
+    file_path: The path to the tasks file.
+
+    Returns:
+    int: The number of edited tasks folded in, 0 if there were none.
+    """
+    overlay = load_overlay(file_path)
+    if not overlay:
+        if os.path.exists(journal_path(file_path)):
+            os.remove(journal_path(file_path))
+            _journal_cache.pop(file_path, None)
+        return 0
+
+    with replacing(file_path, sync=True) as file:
+        for offset, task in iter_raw_tasks(file_path):
+            task = merge(overlay, offset, task)
+            if task is not None:
+                file.write(", ".join(task) + "\n")
+    os.remove(journal_path(file_path))
+    _journal_cache.pop(file_path, None)
+    return len(overlay)
@@ -1,17 +1,48 @@
+import argparse
+import shlex
+import sys
 from datetime import date
 from datetime import datetime
 
+import due_index
+import task_dates
+import task_import
+import task_output
+import task_profile
+import task_reports
+import task_shards
+import task_storage
+import task_store
+import user_credentials
+
 # For added readability in the terminal
 separator = "--------------------------------------------"
 
+# Menu options, so anything else is profiled as a single invalid entry
+menu_options = [
+    "r",
+    "a",
+    "va",
+    "vm",
+    "d",
+    "o",
+    "f",
+    "m",
+    "s",
+    "gr",
+    "c",
+    "p",
+    "e",
+]
+
 
 def validate_user(user_list, username, password):
     """Validates the username and password of users from data in
     user_list.
 
     Parameters:
-    user_list: A dictionary with usernames as key and passwords as
-    values.
+    user_list: A dictionary with usernames as key and stored passwords,
+    hashed or plaintext, as values.
     username: The username to validate
     password: The password to validate
 
@@ -20,7 +51,7 @@ def validate_user(user_list, username, password):
     """
 
     if username in user_list:
-        if user_list[username] == password:
+        if user_credentials.verify_password(user_list[username], password):
             return True
         else:
             print("Password is incorrect")
@@ -31,27 +62,24 @@ def validate_user(user_list, username, password):
         return False
 
 
-def load_user_data(filename):
+@task_profile.profiled("load_user_data")
+def load_user_data(storage):
     """
-    Load user data from a specified file and return it as a dictionary.
+    Load user data from the storage backend and return it as a
+    dictionary.
 
     Parameters:
-    filename (str): The name of the file to read from.
+    storage: The storage backend to read from.
 
     Returns:
     dict: A dictionary with usernames as keys and passwords as values.
     """
-    user_list = {}
     try:
-        with open(filename, "r") as f:
-            lines = f.readlines()
-            for line in lines:
-                user, password = line.strip().split(",")
-                user_list[user.strip()] = password.strip()
+        user_list = storage.load_users()
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(separator)
-        print(f'Error. "{filename}" not found')
+        print(f'Error. "{e.filename}" not found')
         print("Cannot proceed with login")
         print(separator)
         exit()
@@ -106,119 +134,194 @@ def replace_commas(input_string):
     return input_string.replace(",", "|")
 
 
-def data_count(file_path):
-    """Count the number of non-empty lines in a text file
-    Parameters:
-    file_path: The path to the text file
+def format_task(task):
+    """Formats the fields of a single task for display
+    Parameter:
+    task: list of user, title, description, date assigned, due date and
+    completed
+
     Returns:
-    The number of non-empty lines (int)
+    The task as a block of text (str)
     """
-    count = 0
+    user, title, description, current_date, due_date, completed = task
+    return (
+        f"{separator}\n"
+        f"{'Task:':<20}{title}\n"
+        f"{'Assigned to:':<20}{user}\n"
+        f"{'Date assigned:':<20}{current_date}\n"
+        f"{'Due date:':<20}{due_date}\n"
+        f"{'Task Complete?':<20}{completed}\n"
+        f"{'Task description:':<20}{description}\n"
+    )
+
+
+def print_task(task):
+    """Prints the fields of a single task
+    Parameter:
+    task: list of user, title, description, date assigned, due date and
+    completed
+    """
+    sys.stdout.write(format_task(task))
+
+
+def get_tasks(storage, page_size=10):
+    """Shows all tasks one page at a time. Tasks are read lazily so only
+    the current page is ever held in memory.
+    Parameters:
+    storage: The storage backend to read from
+    page_size: number of tasks shown on each page
+    """
+    pager = storage.pager(page_size)
+    page = 0
+    shown = 0
     try:
-        with open(file_path, "r") as file:
-            for line in file:
-                if line.strip():
-                    count += 1
-        return count
+        while True:
+            tasks = pager.read_page(page)
+            if tasks is None:
+                print(separator)
+                print("Page not found.")
+                page = shown
+                continue
+            shown = page
+
+            # Builds the whole page so it goes out in one write
+            last = ""
+            if pager.last_page is not None:
+                last = f" of {pager.last_page + 1}"
+            output = "".join(format_task(task) for task in tasks)
+            output += f"{separator}\nPage {page + 1}{last}\n{separator}\n"
+            sys.stdout.write(output)
+            sys.stdout.flush()
+
+            choice = input(
+                "n - next page, p - previous page, "
+                "page number - jump to page, e - exit: "
+            ).lower()
+            if choice == "n":
+                if page == pager.last_page:
+                    print("Already on the last page.")
+                else:
+                    page += 1
+            elif choice == "p":
+                if page == 0:
+                    print("Already on the first page.")
+                else:
+                    page -= 1
+            elif choice.isdigit() and int(choice) > 0:
+                page = int(choice) - 1
+            elif choice == "e":
+                break
+            else:
+                print("Invalid input. Please try again")
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(separator)
-        print(f"{file_path} not found")
+        print(f'Error. "{e.filename}" not found')
         print(separator)
-        return 0
 
 
-def get_tasks(file_path):
-    """Reads tasks from a file and prints them
-    Parameter:
-    file_path: path to tasks file
+def get_user_tasks(storage, username):
+    """Prints tasks assigned to the current user. The backend looks them
+    up by user rather than reading every task.
+    Parameters:
+    storage: The storage backend to read from
+    username: The current user logged into the programme.
     """
     try:
-        with open("tasks.txt", "r") as t:
-            for line in t.readlines():
-                (
-                    user,
-                    title,
-                    description,
-                    current_date,
-                    due_date,
-                    completed,
-                ) = [field.strip() for field in line.strip().split(",")]
+        for task in storage.iter_user_tasks(username):
+            print_task(task)
+        print(separator)
 
-                print(separator)
-                print(f"{'Task:':<20}{title}")
-                print(f"{'Assigned to:':<20}{user}")
-                print(f"{'Date assigned:':<20}{current_date}")
-                print(f"{'Due date:':<20}{due_date}")
-                print(f"{'Task Complete?':<20}{completed}")
-                print(f"{'Task description:':<20}{description}")
-            print(separator)
+    except FileNotFoundError as e:
+        print(separator)
+        print(f'Error. "{e.filename}" not found')
+        print(separator)
+
+
+def get_due_tasks(storage, start, end):
+    """Prints incomplete tasks due from start up to, but not including,
+    end, soonest first. The due date index means only the matching tasks
+    are read.
+    Parameters:
+    storage: The storage backend to read from
+    start: First due date to show, or None for no lower limit
+    end: Day after the last due date to show, or None for no upper limit
 
-    except FileNotFoundError:
+    Returns:
+    The number of tasks shown (int)
+    """
+    count = 0
+    try:
+        for task in storage.iter_tasks_due(start, end):
+            print_task(task)
+            count += 1
         print(separator)
-        print('Error. "tasks.txt" not found')
+        print(f"{count} tasks found")
         print(separator)
 
+    except FileNotFoundError as e:
+        print(separator)
+        print(f'Error. "{e.filename}" not found')
+        print(separator)
+    return count
 
-def get_user_tasks(file_path):
-    """Reads tasks from a file and prints tasks assigned to the current
-    user.
-    Parameter:
-    file_path: path to tasks file
+
+def search_tasks(storage):
+    """Asks for search words and prints the tasks whose title or
+    description match, best matches first. Words must all match unless
+    joined by OR, and a word ending in * matches any word starting with
+    it.
+    Parameters:
+    storage: The storage backend to search
+
+    Returns:
+    The number of tasks found (int)
     """
+    query = input("Search for (e.g. report OR summary proj*): ")
+    count = 0
     try:
-        with open("tasks.txt", "r") as t:
-            for line in t.readlines():
-                (
-                    user,
-                    title,
-                    description,
-                    current_date,
-                    due_date,
-                    completed,
-                ) = [field.strip() for field in line.strip().split(",")]
-                if user == username:
-                    print(separator)
-                    print(f"{'Task:':<20}{title}")
-                    print(f"{'Assigned to:':<20}{user}")
-                    print(f"{'Date assigned:':<20}{current_date}")
-                    print(f"{'Due date:':<20}{due_date}")
-                    print(f"{'Task Complete?':<20}{completed}")
-                    print(f"{'Task description:':<20}{description}")
-            print(separator)
+        for matches, _, task in storage.search_tasks(query):
+            print_task(task)
+            print(f"{'Words matched:':<20}{matches}")
+            count += 1
+        print(separator)
+        print(f"{count} tasks found")
+        print(separator)
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(separator)
-        print('Error. "tasks.txt" not found')
+        print(f'Error. "{e.filename}" not found')
         print(separator)
+    return count
 
 
-def add_task_to_file(
-    task_user, task_title, task_desc, task_due, file_path="tasks.txt"
-):
-    """Appends a task to the specified file."""
+def add_task_to_file(storage, task_user, task_title, task_desc, task_due):
+    """Adds a task to the storage backend."""
     current_date = date_format(date.today())
-    task_data = (
-        f"{task_user}, {task_title}, {task_desc}, "
-        f"{current_date}, {task_due}, No \n"
-    )
+    task = [task_user, task_title, task_desc, current_date, task_due, "No"]
     try:
-        with open(file_path, "a") as file:
-            file.write(task_data)
-            print(separator)
-            print("Task successfully added!")
+        storage.add_task(task)
+        print(separator)
+        print("Task successfully added!")
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(separator)
-        print(f'Error. "{file_path}" not found')
+        print(f'Error. "{e.filename}" not found')
         print(separator)
 
 
-def new_task(username_list):
+def new_task(storage):
     """Main function to assign tasks to users."""
     while True:
         task_user = input("Please assign the task to a user: ")
-        if task_user not in username_list:
+        try:
+            user_found = storage.user_exists(task_user)
+        except FileNotFoundError as e:
+            print(separator)
+            print(f'Error. "{e.filename}" not found')
+            print(separator)
+            return
+        if not user_found:
             print("User does not exist. Register user before assigning task")
             while True:
                 menu_break = input("Revert to main menu? (Yes/No): ").lower()
@@ -235,15 +338,19 @@ def new_task(username_list):
             input_desc = input("Please input description of task: ")
             task_desc = replace_commas(input_desc)
             task_due = get_due_date()
-            add_task_to_file(task_user, task_title, task_desc, task_due)
+            add_task_to_file(
+                storage, task_user, task_title, task_desc, task_due
+            )
             break
 
 
-def admin_statistics(username):
-    """Check user is admin and then displays number of users on
-    user.txt and number of tasks on tasks.txt.
+def admin_statistics(storage, username):
+    """Check user is admin and then displays the number of users, the
+    number of tasks, how many are completed, incomplete and overdue, and
+    the number of tasks per user.
 
-    Parameter:
+    Parameters:
+    storage: The storage backend to count from.
     username: The current user logged into the programme.
     """
     if username != "admin":
@@ -252,19 +359,189 @@ def admin_statistics(username):
         print(separator)
 
     else:
-        count_users = data_count("user.txt")
-        count_tasks = data_count("tasks.txt")
-        # Should count total tasks and number still incomplete
+        try:
+            stats = storage.statistics()
+        except FileNotFoundError as e:
+            print(separator)
+            print(f"{e.filename} not found")
+            print(separator)
+            return
+
+        print_statistics(stats)
+
+
+def admin_reports(storage, username):
+    """Check user is admin and then writes task_overview.txt and
+    user_overview.txt.
+
+    Parameters:
+    storage: The storage backend to report on.
+    username: The current user logged into the programme.
+    """
+    if username != "admin":
+        print(separator)
+        print("You must be logged in as admin to access this section")
+        print(separator)
+        return
+    try:
+        paths = task_reports.generate_reports(storage)
+    except FileNotFoundError as e:
+        print(separator)
+        print(f"{e.filename} not found")
+        print(separator)
+        return
+    print(separator)
+    print(f"Reports written to {' and '.join(paths)}")
+    print(separator)
+
+
+def select_task(storage, task_user):
+    """Lists a user's tasks with numbers and asks which one to use.
+
+    Parameters:
+    storage: The storage backend to read from
+    task_user: The user whose tasks are listed
+
+    Returns:
+    tuple: (task id, task), or None if the user chose to go back.
+    """
+    tasks = list(storage.iter_user_task_ids(task_user))
+    if not tasks:
+        print(separator)
+        print(f"{task_user} has no tasks.")
+        return None
+
+    for number, (_, task) in enumerate(tasks, start=1):
+        print(separator)
+        print(f"{'Task number:':<20}{number}")
+        sys.stdout.write(format_task(task).split("\n", 1)[1])
+    print(separator)
+
+    while True:
+        choice = input("Enter task number (or e to go back): ").lower()
+        if choice == "e":
+            return None
+        if choice.isdigit() and 1 <= int(choice) <= len(tasks):
+            return tasks[int(choice) - 1]
+        print("Invalid input. Please try again")
+
+
+def edit_task(storage, username):
+    """Lets a user mark one of their tasks complete, reassign it, change
+    its due date or delete it. admin can edit any user's tasks.
+
+    Parameters:
+    storage: The storage backend to edit
+    username: The current user logged in
+    """
+    task_user = username
+    if username == "admin":
+        choice = input("Edit whose tasks? (leave blank for your own): ")
+        task_user = choice.strip() or username
+
+    try:
+        selected = select_task(storage, task_user)
+        if selected is None:
+            return
+        task_id, task = selected
+
+        choice = input(
+            "c - mark complete \n"
+            "r - reassign \n"
+            "d - change due date \n"
+            "x - delete \n"
+            "e - go back \n"
+            ": "
+        ).lower()
+        if choice == "c":
+            storage.update_task(task_id, {"completed": "Yes"})
+        elif choice == "r":
+            new_user = input("Reassign the task to: ")
+            if not storage.user_exists(new_user):
+                print("User does not exist. Register user first")
+                return
+            storage.update_task(task_id, {"user": new_user})
+        elif choice == "d":
+            storage.update_task(task_id, {"due_date": get_due_date()})
+        elif choice == "x":
+            confirm = input(f"Delete '{task[1]}'? (Yes/No): ").lower()
+            if confirm != "yes":
+                return
+            storage.delete_task(task_id)
+        else:
+            return
+        print(separator)
+        print("Task successfully updated!")
+
+    except KeyError:
+        print(separator)
+        print("Error. Task no longer exists")
+    except FileNotFoundError as e:
+        print(separator)
+        print(f'Error. "{e.filename}" not found')
+
+
+def compact_tasks(storage, username):
+    """Checks user is admin and then folds the task edit journal into
+    the tasks file.
+
+    Parameters:
+    storage: The storage backend to compact
+    username: The current user logged in
+    """
+    if username != "admin":
+        print(separator)
+        print("You must be logged in as admin to access this section")
+        return
+
+    try:
+        folded = storage.compact()
+    except FileNotFoundError as e:
+        print(separator)
+        print(f'Error. "{e.filename}" not found')
+        return
+    print(separator)
+    print(f"{folded} edited tasks folded into the tasks file")
+
+
+def admin_profile(username):
+    """Check user is admin and then shows the time taken, bytes read and
+    written, task lines parsed and files opened by each menu option and
+    measured function so far this session.
+
+    Parameters:
+    username: The current user logged into the programme.
+    """
+    if username != "admin":
+        print(separator)
+        print("You must be logged in as admin to access this section")
+        print(separator)
+        return
+    if not task_profile.enabled:
         print(separator)
-        print(f"{'Number of users: ':<15}{count_users}")
-        print(f"{'Number of tasks: ':<15}{count_tasks}")
+        print("Profiling is off. Start the programme with --profile")
         print(separator)
+        return
+
+    print(separator)
+    print(
+        f"{'Name':<28}{'Calls':>7}{'Seconds':>10}{'Read':>12}"
+        f"{'Written':>12}{'Lines':>9}{'Opens':>7}"
+    )
+    for name, record in task_profile.report().items():
+        print(
+            f"{name:<28}{record['calls']:>7}{record['seconds']:>10.3f}"
+            f"{record['bytes_read']:>12}{record['bytes_written']:>12}"
+            f"{record['lines_parsed']:>9}{record['file_opens']:>7}"
+        )
+    print(separator)
 
 
-def add_user(username):
+def add_user(storage, username):
     """Checks if user is admin before registering new user
 
-    Parameter:
+    Parameters:
+    storage: The storage backend to add the user to
     username: The current user logged in
     """
     if username != "admin":
@@ -274,7 +551,12 @@ def add_user(username):
     else:
         while True:
             new_username = get_valid_input(("Pleas enter new username: "))
-            if new_username in user_list:
+            try:
+                user_found = storage.user_exists(new_username)
+            except FileNotFoundError as e:
+                print(f'Error "{e.filename}" not found')
+                return
+            if user_found:
                 print("username already registered.")
 
             else:
@@ -289,12 +571,11 @@ def add_user(username):
                 print("Passwords do not match. Please try again")
             else:
                 break
-        # Adds new username and password to user.txt
+        # Adds new username and password to the storage backend
         try:
-            with open("user.txt", "a") as file:
-                file.write(f"{new_username}, {new_password}\n")
-        except FileNotFoundError:
-            print('Error "user.txt" not found')
+            storage.add_user(new_username, new_password)
+        except FileNotFoundError as e:
+            print(f'Error "{e.filename}" not found')
 
 
 def display_menu(username):
@@ -310,6 +591,10 @@ def display_menu(username):
             "a - add task \n"
             "va - view all tasks \n"
             "vm - view my tasks \n"
+            "d - view tasks due in the next 7 days \n"
+            "o - view overdue tasks \n"
+            "f - find tasks \n"
+            "m - edit a task \n"
             "e - exit \n"
             ": "
         ).lower()
@@ -321,67 +606,605 @@ def display_menu(username):
             "a - add task \n"
             "va - view all tasks \n"
             "vm - view my tasks \n"
+            "d - view tasks due in the next 7 days \n"
+            "o - view overdue tasks \n"
+            "f - find tasks \n"
+            "m - edit a task \n"
             "s - view statistics \n"
+            "gr - generate reports \n"
+            "c - compact task edits into the tasks file \n"
+            "p - view profile of this session \n"
             "e - exit \n"
             ": "
         ).lower()
     return menu
 
 
-# Gets data for login
-user_list = load_user_data("user.txt")
+class CommandError(Exception):
+    """Raised when a headless command cannot be carried out."""
 
-# Login section
-while True:
-    print(separator)
-    username = input("Please enter your username: ")
-    password = input("Please enter your password: ")
 
-    if validate_user(user_list, username, password):
-        print(separator)
-        print("Login successful")
-        break
+def positive_int(text):
+    """Reads a whole number of at least 1 for argparse."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'"{text}" is not a number above 0')
+    return value
+
+
+def parse_due_date(text):
+    """Reads a due date given on the command line in any format found in
+    tasks.txt, e.g. 15/11/24 or 2024-11-15.
+
+    Returns:
+    str: The date in the format stored in tasks.txt.
+    """
+    parsed = task_dates.parse_date(text)
+    if parsed is None:
+        raise CommandError(f'"{text}" is not a date, use DD/MM/YY')
+    return date_format(parsed)
+
+
+def build_task(storage, args):
+    """Checks the arguments of an add-task command and returns the task
+    to store."""
+    if not storage.user_exists(args.user):
+        raise CommandError(f'User "{args.user}" does not exist')
+    if args.assigned:
+        assigned = parse_due_date(args.assigned)
     else:
-        print("Login failed. Please try again")
+        assigned = date_format(date.today())
+    return [
+        args.user,
+        replace_commas(args.title),
+        replace_commas(args.description),
+        assigned,
+        parse_due_date(args.due),
+        "Yes" if args.completed else "No",
+    ]
+
+
+def command_add_task(storage, args):
+    """Adds one task given on the command line."""
+    storage.add_task(build_task(storage, args))
+    print("Task successfully added!")
+
+
+def iter_listed_tasks(storage, args):
+    """Yields the tasks a list command asked for."""
+    if args.overdue:
+        return storage.iter_tasks_due(*due_index.overdue_range())
+    if args.due_within is not None:
+        return storage.iter_tasks_due(
+            *due_index.due_within(days=args.due_within)
+        )
+    if args.search:
+        return (task for _, _, task in storage.search_tasks(args.search))
+    if args.user:
+        return storage.iter_user_tasks(args.user)
+    return storage.iter_tasks()
+
+
+def command_list(storage, args):
+    """Prints the tasks a list command asked for, as text blocks or in a
+    format other programs can read."""
+    tasks = iter_listed_tasks(storage, args)
+    if args.format in task_output.output_formats:
+        with task_output.open_stdout() as out:
+            task_output.write_tasks(tasks, out, args.format)
+        return
+    count = 0
+    for task in tasks:
+        print_task(task)
+        count += 1
+    print(separator)
+    print(f"{count} tasks found")
 
-# Provides menu - Requires username as admin has extra option.
-while True:
+
+def print_statistics(stats):
+    """Prints the figures from storage.statistics."""
+    print(separator)
+    print(f"{'Number of users: ':<25}{stats['users']}")
+    print(f"{'Number of tasks: ':<25}{stats['tasks']}")
+    print(f"{'Completed tasks: ':<25}{stats['completed']}")
+    print(f"{'Incomplete tasks: ':<25}{stats['incomplete']}")
+    print(f"{'Overdue tasks: ':<25}{stats['overdue']}")
+    print(separator)
+    print("Tasks per user:")
+    for user, count in sorted(stats["per_user"].items()):
+        print(f"{user:<25}{count}")
     print(separator)
-    menu = display_menu(username)
 
-    # Registers new user - must be logged in as admin
-    if menu == "r":
-        add_user(username)
 
-    # Adds new task and assigns to user on user_list.
-    elif menu == "a":
+def command_stats(storage, args):
+    """Prints the statistics admin sees on the menu."""
+    stats = storage.statistics()
+    if args.format in task_output.output_formats:
+        with task_output.open_stdout() as out:
+            task_output.write_statistics(stats, out, args.format)
+        return
+    print_statistics(stats)
 
-        user_list = load_user_data("user.txt")
-        username_list = list(user_list.keys())
 
-        print(separator)
-        new_task(username_list)
+def command_report(storage, args):
+    """Writes task_overview.txt and user_overview.txt."""
+    paths = task_reports.generate_reports(storage, args.dir)
+    print(f"Reports written to {' and '.join(paths)}")
+
+
+def command_add_user(storage, args):
+    """Registers a user given on the command line."""
+    if "," in args.username or "," in args.password:
+        raise CommandError("Commas are not allowed in usernames or passwords")
+    if storage.user_exists(args.username):
+        raise CommandError(f'User "{args.username}" is already registered')
+    storage.add_user(args.username, args.password)
+    print(f"User {args.username} registered")
+
+
+def add_format_argument(parser):
+    """Adds the --format option for choosing how output is written."""
+    parser.add_argument(
+        "--format",
+        choices=["text", *task_output.output_formats],
+        default="text",
+        help="text for people, jsonl or csv for other programs",
+    )
+
 
-    # Displays all tasks on tasks.txt
-    elif menu == "va":
-        get_tasks("tasks.txt")
+def add_command_parsers(subparsers):
+    """Adds the headless commands to an argparse subparsers object."""
+    add_task_parser = subparsers.add_parser("add-task", help="add a task")
+    add_task_parser.add_argument("user", help="user to assign the task to")
+    add_task_parser.add_argument("title")
+    add_task_parser.add_argument("description")
+    add_task_parser.add_argument("due", help="due date, e.g. 15/11/24")
+    add_task_parser.add_argument(
+        "--assigned", help="date assigned, today if not given"
+    )
+    add_task_parser.add_argument(
+        "--completed", action="store_true", help="mark the task complete"
+    )
+    add_task_parser.set_defaults(run=command_add_task)
+
+    list_parser = subparsers.add_parser("list", help="list tasks")
+    choice = list_parser.add_mutually_exclusive_group()
+    choice.add_argument("--user", help="only tasks assigned to this user")
+    choice.add_argument(
+        "--due-within",
+        type=int,
+        metavar="DAYS",
+        help="incomplete tasks due in the next DAYS days",
+    )
+    choice.add_argument(
+        "--overdue", action="store_true", help="incomplete overdue tasks"
+    )
+    choice.add_argument("--search", help="tasks matching search words")
+    add_format_argument(list_parser)
+    list_parser.set_defaults(run=command_list)
+
+    stats_parser = subparsers.add_parser("stats", help="show statistics")
+    add_format_argument(stats_parser)
+    stats_parser.set_defaults(run=command_stats)
+
+    report_parser = subparsers.add_parser(
+        "report", help="write task_overview.txt and user_overview.txt"
+    )
+    report_parser.add_argument(
+        "--dir", default=".", help="directory to write the reports to"
+    )
+    report_parser.set_defaults(run=command_report)
 
-    # Displays tasks on tasks.txt which are assigned to current user
-    elif menu == "vm":
-        get_user_tasks("tasks.txt")
+    add_user_parser = subparsers.add_parser("add-user", help="add a user")
+    add_user_parser.add_argument("username")
+    add_user_parser.add_argument("password")
+    add_user_parser.set_defaults(run=command_add_user)
 
-    # Shows statistics of number of users and tasks - Admin only
-    elif menu == "s":
-        admin_statistics(username)
 
-    # Exits the programme
-    elif menu == "e":
+def build_batch_parser():
+    """Returns the parser for one line of a batch file."""
+    parser = argparse.ArgumentParser(prog="batch", add_help=False)
+    add_command_parsers(parser.add_subparsers(dest="command", required=True))
+    return parser
+
+
+def run_batch(storage, lines):
+    """Runs one command per line against a storage backend opened once.
+
+    Lines are split like a shell command line, e.g.
+    add-task Mike "Send report" "Monthly figures" 15/11/24
+    Blank lines and lines starting with # are skipped. Runs of add-task
+    lines are stored together with add_tasks, so thousands of tasks cost
+    one write rather than one each.
+
+    Parameters:
+    storage: The storage backend to use.
+    lines: Iterable of command lines, e.g. an open file.
+
+    Returns:
+    int: The number of lines that failed.
+    """
+    parser = build_batch_parser()
+    pending = []
+    run = 0
+    failed = 0
+
+    def report(line_number, error):
+        nonlocal failed
+        failed += 1
+        print(f"Line {line_number}: {error}", file=sys.stderr)
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except (SystemExit, ValueError):
+            # argparse has already explained the problem on stderr
+            report(line_number, "could not be read")
+            continue
+
+        try:
+            if args.run is command_add_task:
+                pending.append(build_task(storage, args))
+            else:
+                if pending:
+                    storage.add_tasks(pending)
+                    pending = []
+                args.run(storage, args)
+            run += 1
+        except (CommandError, FileNotFoundError, KeyError) as e:
+            report(line_number, e)
+
+    if pending:
+        storage.add_tasks(pending)
+    print(separator)
+    print(f"{run} commands run, {failed} failed")
+    return failed
+
+
+def command_batch(storage, args):
+    """Runs the commands in a batch file, or piped in on stdin."""
+    if args.file == "-":
+        return run_batch(storage, sys.stdin)
+    with open(args.file, "r") as file:
+        return run_batch(storage, file)
+
+
+def build_parser():
+    """Returns the parser for the programme's startup options and
+    headless commands."""
+    parser = argparse.ArgumentParser(
+        description="Task manager. Runs the interactive menu unless a "
+        "command is given."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["text", "sqlite", "sharded"],
+        default="text",
+        help="store data in user.txt/tasks.txt, in an SQLite database or "
+        "in user.txt and tasks split into shard files by user",
+    )
+    parser.add_argument(
+        "--db", default="task_manager.db", help="SQLite database file"
+    )
+    parser.add_argument(
+        "--shard-dir",
+        default="task_shards",
+        help="directory of shard files for the sharded backend",
+    )
+    parser.add_argument(
+        "--split-tasks",
+        action="store_true",
+        help="copy tasks.txt into a new shard directory and exit",
+    )
+    parser.add_argument(
+        "--join-shards",
+        action="store_true",
+        help="write the shard directory back out to tasks.txt and exit",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=task_shards.default_shard_count,
+        help="number of shards --split-tasks creates",
+    )
+    parser.add_argument(
+        "--import-text",
+        action="store_true",
+        help="copy user.txt and tasks.txt into the SQLite database and "
+        "exit. Refused if the database already holds tasks, see --force",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="with --import-text, delete every task in the database "
+        "first, including any added since an earlier import",
+    )
+    parser.add_argument(
+        "--export-text",
+        action="store_true",
+        help="write the SQLite database out to user.txt and tasks.txt and "
+        "exit",
+    )
+    parser.add_argument(
+        "--bulk-import",
+        metavar="FILE",
+        help="add every task in a CSV or JSONL file and exit",
+    )
+    parser.add_argument(
+        "--normalise-dates",
+        action="store_true",
+        help="rewrite every task date in the DD Mon YY format and exit",
+    )
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="load every task into a compact in-memory store at startup",
+    )
+    parser.add_argument(
+        "--hash-passwords",
+        action="store_true",
+        help="replace every plaintext password with a salted hash and exit",
+    )
+    parser.add_argument(
+        "--hash-cost",
+        type=positive_int,
+        default=user_credentials.hash_iterations,
+        help="PBKDF2 iterations for new password hashes, see "
+        "task_benchmark.py --login-costs",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="measure time, I/O and lines parsed for the admin p report",
+    )
+    parser.add_argument(
+        "--profile-output",
+        metavar="FILE",
+        help="measure as --profile does and write the report to a JSON file "
+        "at exit",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    add_command_parsers(subparsers)
+    batch_parser = subparsers.add_parser(
+        "batch", help="run one command per line from a file or stdin"
+    )
+    batch_parser.add_argument(
+        "file", nargs="?", default="-", help="file of commands, - for stdin"
+    )
+    batch_parser.set_defaults(run=command_batch)
+    return parser
+
+
+def run_command(storage, args):
+    """Runs a headless command and returns the exit status."""
+    try:
+        with task_profile.measure(f"command {args.command}"):
+            failed = args.run(storage, args)
+    except (CommandError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except FileNotFoundError as e:
+        print(f'Error. "{e.filename}" not found', file=sys.stderr)
+        return 1
+    return 1 if failed else 0
+
+
+def login(storage):
+    """Asks for a username and password until they match a user.
+
+    Returns:
+    str: The username logged in.
+    """
+    user_list = load_user_data(storage)
+
+    # Login section
+    while True:
         print(separator)
-        print("Successfully logged out")
-        print("Goodbye!!!")
+        username = input("Please enter your username: ")
+        password = input("Please enter your password: ")
+
+        if validate_user(user_list, username, password):
+            print(separator)
+            print("Login successful")
+            break
+        else:
+            print("Login failed. Please try again")
+    return username
+
+
+def run_menu(storage, username):
+    """Shows the menu and carries out options until the user exits."""
+    # Provides menu - Requires username as admin has extra option.
+    while True:
         print(separator)
-        exit()
+        menu = display_menu(username)
+        name = menu if menu in menu_options else "invalid"
+        with task_profile.measure(f"menu {name}"):
+            # Registers new user - must be logged in as admin
+            if menu == "r":
+                add_user(storage, username)
+
+            # Adds new task and assigns to user on user_list.
+            elif menu == "a":
+                print(separator)
+                new_task(storage)
+
+            # Displays all tasks on tasks.txt
+            elif menu == "va":
+                get_tasks(storage)
+
+            # Displays tasks on tasks.txt which are assigned to current user
+            elif menu == "vm":
+                get_user_tasks(storage, username)
+
+            # Displays incomplete tasks due in the next week
+            elif menu == "d":
+                get_due_tasks(storage, *due_index.due_within(days=7))
+
+            # Displays incomplete tasks that are past their due date
+            elif menu == "o":
+                get_due_tasks(storage, *due_index.overdue_range())
+
+            # Searches task titles and descriptions
+            elif menu == "f":
+                search_tasks(storage)
+
+            # Marks complete, reassigns, changes due date or deletes a task
+            elif menu == "m":
+                edit_task(storage, username)
+
+            # Shows where time went this session - Admin only
+            elif menu == "p":
+                admin_profile(username)
+
+            # Writes the task and user overview reports - Admin only
+            elif menu == "gr":
+                admin_reports(storage, username)
+
+            # Folds the task edit journal into tasks.txt - Admin only
+            elif menu == "c":
+                compact_tasks(storage, username)
 
-    # Invalid menu input
+            # Shows statistics of number of users and tasks - Admin only
+            elif menu == "s":
+                admin_statistics(storage, username)
+
+            # Exits the programme
+            elif menu == "e":
+                print(separator)
+                print("Successfully logged out")
+                print("Goodbye!!!")
+                print(separator)
+                return
+
+            # Invalid menu input
+            else:
+                print("You have entered an invalid input. Please try again")
+
+
+def main(argv=None):
+    """Runs the programme. The interactive login and menu are used unless
+    a headless command is given."""
+    args = build_parser().parse_args(argv)
+    user_credentials.hash_iterations = args.hash_cost
+    if args.profile or args.profile_output:
+        task_profile.enable(args.profile_output)
+
+    if args.import_text or args.export_text:
+        database = task_storage.SqliteStorage(args.db)
+        if args.import_text:
+            try:
+                users, tasks = task_storage.import_text_files(
+                    database, replace=args.force
+                )
+            except FileExistsError:
+                print(
+                    f"Error. {args.db} already holds tasks, use --force to "
+                    "replace them"
+                )
+                database.close()
+                return 1
+            print(f"Imported {users} users and {tasks} tasks into {args.db}")
+        else:
+            users, tasks = task_storage.export_text_files(database)
+            print(f"Exported {users} users and {tasks} tasks from {args.db}")
+        database.close()
+        return 0
+
+    if args.split_tasks or args.join_shards:
+        try:
+            if args.split_tasks:
+                tasks = task_shards.split_tasks_file(
+                    "tasks.txt", args.shard_dir, args.shards
+                )
+                print(f"Split {tasks} tasks into {args.shards} shards")
+            else:
+                tasks = task_shards.join_shards(args.shard_dir, "tasks.txt")
+                print(f"Joined {tasks} tasks into tasks.txt")
+        except FileNotFoundError as e:
+            print(f'Error. "{e.filename}" not found')
+            return 1
+        except FileExistsError:
+            print(f"Error. {args.shard_dir} already holds shards")
+            return 1
+        return 0
+
+    if args.backend == "sqlite":
+        storage = task_storage.SqliteStorage(args.db)
+    elif args.backend == "sharded":
+        if args.in_memory:
+            # The in-memory store needs ids that grow as tasks are added
+            print("Error. --in-memory cannot be used with sharded storage")
+            return 1
+        try:
+            storage = task_shards.ShardedStorage("user.txt", args.shard_dir)
+        except FileNotFoundError:
+            print(f"Error. No shards in {args.shard_dir}, use --split-tasks")
+            return 1
     else:
-        print("You have entered an invalid input. Please try again")
+        storage = task_storage.TextStorage("user.txt", "tasks.txt")
+
+    if args.in_memory:
+        try:
+            with task_profile.measure("load in-memory store"):
+                storage = task_store.MemoryStorage(storage)
+        except FileNotFoundError as e:
+            print(f'Error. "{e.filename}" not found')
+            return 1
+
+    if args.hash_passwords:
+        try:
+            hashed = storage.hash_passwords()
+        except FileNotFoundError as e:
+            print(f'Error. "{e.filename}" not found')
+            return 1
+        print(f"{hashed} passwords were hashed")
+        storage.close()
+        return 0
+
+    if args.normalise_dates:
+        try:
+            changed = storage.normalise_dates()
+        except FileNotFoundError as e:
+            print(f'Error. "{e.filename}" not found')
+            return 1
+        print(f"{changed} tasks had their dates rewritten")
+        storage.close()
+        return 0
+
+    if args.bulk_import:
+        try:
+            added, rejected = task_import.bulk_import(
+                storage, args.bulk_import
+            )
+        except FileNotFoundError as e:
+            print(f'Error. "{e.filename}" not found')
+            return 1
+        print(separator)
+        print(f"{len(rejected)} rows rejected")
+        for line_number, reason in rejected:
+            print(f"Line {line_number}: {reason}")
+        print(separator)
+        print(f"{added} tasks added")
+        print(separator)
+        storage.close()
+        return 0
+
+    if args.command:
+        status = run_command(storage, args)
+        storage.close()
+        return status
+
+    username = login(storage)
+    run_menu(storage, username)
+    storage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Readers that scan a memory-mapped tasks.txt without copying it.
+
+Line and field boundaries are found directly in the mapped file by
+bytes.count and compiled regular expressions, which run in C, and only
+the lines that are actually shown are decoded into Python strings.
+"""
+
+import mmap
+import re
+from contextlib import contextmanager
+
+# Size of the slices newlines are counted in, bounding memory use
+chunk_size = 1024 * 1024
+
+# A line holding nothing but whitespace, found by the newline before it
+blank_line = re.compile(rb"\n[ \t\r\f\v]*(?=\n)")
+
+# The user field at the start of each line
+user_field = re.compile(rb"(?m)^[ \t]*([^,\r\n]*?)[ \t]*,")
+
+
+@contextmanager
+def mapped(file_path):
+    """Opens a file and maps it read-only into memory.
+
+    An empty file cannot be mapped, so empty bytes are given instead.
+
+    Parameters:
+    file_path: The path to the file.
+    """
+    with open(file_path, "rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+
+def count_lines(file_path):
+    """Counts the non-empty lines in a file.
+
+    Parameters:
+    file_path: The path to the file.
+
+    Returns:
+    int: The number of lines with something other than whitespace.
+    """
+    with mapped(file_path) as buffer:
+        first_newline = buffer.find(b"\n")
+        if first_newline == -1:
+            return 1 if buffer[:].strip() else 0
+
+        newlines = 0
+        for start in range(0, len(buffer), chunk_size):
+            newlines += buffer[start : start + chunk_size].count(b"\n")
+
+        # Blank lines between two newlines, then the first and last lines
+        blanks = sum(1 for _ in blank_line.finditer(buffer))
+        if not buffer[:first_newline].strip():
+            blanks += 1
+        tail = buffer[buffer.rfind(b"\n") + 1 :]
+        if tail:
+            newlines += 1
+            if not tail.strip():
+                blanks += 1
+        return newlines - blanks
+
+
+def iter_user_offsets(file_path, end=None):
+    """Yields the byte offset and user of every task, decoding only the
+    user field.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    end: Byte offset to stop before, or None to read to the end.
+
+    Yields:
+    tuple: (offset, username)
+    """
+    with mapped(file_path) as buffer:
+        end = len(buffer) if end is None else end
+        for match in user_field.finditer(buffer, 0, end):
+            yield match.start(), match.group(1).decode()
+
@@ -0,0 +1,163 @@
+"""JSONL and CSV output of tasks and statistics for other programs.
+
+Records are written as they are read from the storage backend, so memory
+use does not grow with the number of tasks, and output goes through a
+large buffer rather than being flushed line by line.
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+from contextlib import contextmanager
+from json.encoder import encode_basestring_ascii
+
+# Names of the fields of a task, in the order they are stored
+task_fields = [
+    "user",
+    "title",
+    "description",
+    "date_assigned",
+    "due_date",
+    "completed",
+]
+
+# A task as json.dumps would write it, with each field already quoted
+task_template = (
+    "{"
+    + ", ".join(f'"{field}": %s' for field in task_fields)
+    + "}"
+)
+
+# Formats other programs can read
+output_formats = ["jsonl", "csv"]
+
+# Size of the output buffer
+buffer_size = 1024 * 1024
+
+# JSONL lines are joined and written this many at a time
+batch_size = 1000
+
+
+@contextmanager
+def open_stdout():
+    """Gives a block buffered text stream writing to standard output.
+
+    Standard output is line buffered when it is a terminal, which makes
+    long listings slow, so a second stream with a large buffer is opened
+    on the same file descriptor and flushed at the end.
+    """
+    sys.stdout.flush()
+    try:
+        fileno = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        # Already redirected to something in memory
+        yield sys.stdout
+        return
+    out = open(
+        fileno,
+        "w",
+        buffering=buffer_size,
+        encoding=sys.stdout.encoding,
+        newline="",
+        closefd=False,
+    )
+    try:
+        yield out
+        out.flush()
+    except BrokenPipeError:
+        # The reader, e.g. head, stopped early. Anything still buffered
+        # is thrown away so it is not written again on exit.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, fileno)
+        os.close(devnull)
+
+
+def write_tasks_jsonl(tasks, out):
+    """Writes each task as a JSON object on its own line.
+
+    Returns:
+    int: The number of tasks written.
+    """
+    count = 0
+    lines = []
+    for task in tasks:
+        if len(task) == len(task_fields):
+            # Quoting each field in C is much quicker than json.dumps
+            line = task_template % tuple(map(encode_basestring_ascii, task))
+        else:
+            line = json.dumps(dict(zip(task_fields, task)))
+        lines.append(line)
+        if len(lines) == batch_size:
+            out.write("\n".join(lines) + "\n")
+            count += len(lines)
+            lines = []
+    if lines:
+        out.write("\n".join(lines) + "\n")
+        count += len(lines)
+    return count
+
+
+def write_tasks_csv(tasks, out):
+    """Writes the tasks as CSV with a header row.
+
+    Returns:
+    int: The number of tasks written.
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for task in tasks:
+            count += 1
+            yield task
+
+    writer = csv.writer(out)
+    writer.writerow(task_fields)
+    writer.writerows(counted())
+    return count
+
+
+def write_tasks(tasks, out, output_format):
+    """Writes tasks in "jsonl" or "csv" format.
+
+    Parameters:
+    tasks: Iterable of task field lists, consumed lazily.
+    out: Text stream to write to.
+    output_format (str): "jsonl" or "csv".
+
+    Returns:
+    int: The number of tasks written.
+    """
+    if output_format == "csv":
+        return write_tasks_csv(tasks, out)
+    return write_tasks_jsonl(tasks, out)
+
+
+def write_statistics(stats, out, output_format):
+    """Writes the figures from storage.statistics.
+
+    JSONL gives one object holding every figure. CSV gives one row per
+    figure with statistic, user and value columns, where the user column
+    is only filled in for the tasks per user.
+
+    Parameters:
+    stats (dict): Output of task_stats.summarise.
+    out: Text stream to write to.
+    output_format (str): "jsonl" or "csv".
+    """
+    totals = ["users", "tasks", "completed", "incomplete", "overdue"]
+    if output_format == "jsonl":
+        record = {name: stats[name] for name in totals}
+        record["per_user"] = dict(sorted(stats["per_user"].items()))
+        out.write(json.dumps(record) + "\n")
+        return
+
+    writer = csv.writer(out)
+    writer.writerow(["statistic", "user", "value"])
+    writer.writerows([name, "", stats[name]] for name in totals)
+    writer.writerows(
+        ["tasks_per_user", user, count]
+        for user, count in sorted(stats["per_user"].items())
+    )
@@ -0,0 +1,82 @@
+"""Parses a large tasks.txt on every CPU core at once.
+
+The file is cut into byte ranges that start and end on line boundaries,
+each range is parsed in a separate process, and the results are joined
+back together in file order by the caller. Splitting and stripping the
+fields is done in Python, so one process can only use one core however
+large the file.
+
+Small files, or machines with a single core, are read in this process
+as before, since starting the workers costs more than it saves. See
+task_stats.count_tasks and task_store.load_task_file.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from task_mmap import mapped
+
+# Files smaller than this are parsed in this process
+parallel_threshold = 32 * 1024 * 1024
+
+# Ranges per worker, so a worker that finishes early can take another
+ranges_per_worker = 4
+
+
+def worker_count():
+    """Returns the number of worker processes to parse with."""
+    return os.cpu_count() or 1
+
+
+def use_parallel(file_path, workers=None):
+    """Returns True if a file is big enough to be worth parsing in
+    parallel on this machine."""
+    workers = worker_count() if workers is None else workers
+    try:
+        size = os.path.getsize(file_path)
+    except FileNotFoundError:
+        return False
+    return workers > 1 and size >= parallel_threshold
+
+
+def line_ranges(file_path, count):
+    """Cuts a file into up to count byte ranges of about equal size, each
+    starting at the beginning of a line.
+
+    Parameters:
+    file_path: The path to the file.
+    count (int): The number of ranges wanted.
+
+    Returns:
+    list: (start, end) pairs in file order covering the whole file.
+    """
+    with mapped(file_path) as buffer:
+        size = len(buffer)
+        starts = [0]
+        for part in range(1, count):
+            newline = buffer.find(b"\n", max(size * part // count, starts[-1]))
+            if newline == -1:
+                break
+            if newline + 1 < size and newline + 1 > starts[-1]:
+                starts.append(newline + 1)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def map_ranges(function, file_path, workers):
+    """Runs function over the ranges of a file in a process pool and
+    yields the results in file order.
+
+    Parameters:
+    function: A module level function taking (file path, start, end), so
+    the workers can import it.
+    file_path: The path to the file.
+    workers (int): The number of processes.
+    """
+    ranges = line_ranges(file_path, workers * ranges_per_worker)
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(
+            function,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+        )
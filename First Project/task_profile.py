@@ -0,0 +1,240 @@
+"""Opt-in measurements of where a task_manager session spends its time.
+
+When turned on with enable, every menu action, headless command and
+function marked with profiled records how often it ran, the wall time
+taken, the bytes the process read and wrote, the task lines parsed and
+the files opened meanwhile. The task readers marked with profiled_reader
+record their time and the lines they parse.
+
+Measurements are off by default. A marked function then costs one extra
+call and a check of enabled, whatever the size of the files, and
+nothing is counted per line.
+
+Bytes read and written come from the operating system's counters in
+/proc/self/io, so they include terminal output and are not available
+on systems without it. The counters are read from a descriptor kept
+open, and the bytes read from it are taken off, so measuring does not
+count itself. File opens are counted by an audit hook.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# True once enable has been called
+enabled = False
+
+# Record for each name measured
+_records = {}
+
+# Running totals that are not kept by the operating system
+_totals = {"lines_parsed": 0, "file_opens": 0}
+
+# Where the operating system keeps this process's I/O counters
+io_counters_path = "/proc/self/io"
+
+# The descriptor io_counters_path is read from, the process it was
+# opened in, as /proc/self means the opener, and the bytes read from it
+_io_counters = {"fd": None, "pid": None, "own_reads": 0}
+
+# Measured quantities, in the order they are reported
+fields = [
+    "seconds",
+    "bytes_read",
+    "bytes_written",
+    "lines_parsed",
+    "file_opens",
+]
+
+
+class Record:
+    """Totals for one measured name.
+
+    Attributes:
+    calls (int): The number of times it ran.
+    seconds (float): Wall time taken in all.
+    bytes_read (int): Bytes the process read while it ran.
+    bytes_written (int): Bytes the process wrote while it ran.
+    lines_parsed (int): Task lines parsed while it ran.
+    file_opens (int): Files opened while it ran.
+    """
+
+    __slots__ = ["calls"] + fields
+
+    def __init__(self):
+        self.calls = 0
+        for field in fields:
+            setattr(self, field, 0)
+
+    def as_dict(self):
+        """Returns the totals as a dictionary."""
+        record = {"calls": self.calls}
+        for field in fields:
+            record[field] = getattr(self, field)
+        record["seconds"] = round(self.seconds, 6)
+        return record
+
+
+def _audit(event, args):
+    """Counts files opened while measurements are on."""
+    if event == "open" and enabled and args[0] != io_counters_path:
+        _totals["file_opens"] += 1
+
+
+def enable(output_file=None):
+    """Turns measurements on for the rest of the process.
+
+    Parameters:
+    output_file (str): JSON file to write the report to at exit, or
+    None.
+    """
+    global enabled
+    if not enabled:
+        # Audit hooks cannot be removed, so the hook checks enabled
+        sys.addaudithook(_audit)
+    enabled = True
+    if output_file is not None:
+        atexit.register(save_report, output_file)
+
+
+def _io_bytes():
+    """Returns (bytes read, bytes written) by the process so far, not
+    counting the reads of the counters themselves, or (0, 0) where the
+    counters cannot be read."""
+    try:
+        if _io_counters["pid"] != os.getpid():
+            # A forked child would otherwise read its parent's counters
+            if _io_counters["fd"] is not None:
+                os.close(_io_counters["fd"])
+            _io_counters["fd"] = os.open(io_counters_path, os.O_RDONLY)
+            _io_counters["pid"] = os.getpid()
+            _io_counters["own_reads"] = 0
+        data = os.pread(_io_counters["fd"], 4096, 0)
+        counters = dict(line.split(b":") for line in data.splitlines())
+    except (OSError, ValueError):
+        return 0, 0
+    # This read is only added to rchar once it has returned
+    read = int(counters[b"rchar"]) - _io_counters["own_reads"]
+    _io_counters["own_reads"] += len(data)
+    return read, int(counters[b"wchar"])
+
+
+def _snapshot():
+    """Returns the current value of every measured quantity."""
+    read, written = _io_bytes()
+    return [
+        time.perf_counter(),
+        read,
+        written,
+        _totals["lines_parsed"],
+        _totals["file_opens"],
+    ]
+
+
+def _record(name):
+    """Returns the record for a name, creating it if needed."""
+    record = _records.get(name)
+    if record is None:
+        record = _records[name] = Record()
+    return record
+
+
+@contextmanager
+def measure(name):
+    """Adds whatever the body of a with block does to the record for
+    name. Does nothing unless measurements are on."""
+    if not enabled:
+        yield
+        return
+    start = _snapshot()
+    try:
+        yield
+    finally:
+        end = _snapshot()
+        record = _record(name)
+        record.calls += 1
+        for field, before, after in zip(fields, start, end):
+            setattr(record, field, getattr(record, field) + after - before)
+
+
+def profiled(name):
+    """Decorator measuring every call of a function under name."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with measure(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profiled_reader(name, counts_lines=True):
+    """Decorator for a generator function that reads tasks.
+
+    The time spent producing each item is added up under name, and each
+    item counts as one task line parsed unless counts_lines is False.
+    Only the time and lines are recorded, as reading the I/O counters for
+    every item would cost more than the reading being measured.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            items = function(*args, **kwargs)
+            if not enabled:
+                return items
+            return _measured_items(name, items, counts_lines)
+
+        return wrapper
+
+    return decorator
+
+
+def _measured_items(name, items, counts_lines):
+    """Yields from items, recording the time taken and lines parsed."""
+    record = _record(name)
+    record.calls += 1
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record.seconds += time.perf_counter() - start
+            return
+        record.seconds += time.perf_counter() - start
+        if counts_lines:
+            record.lines_parsed += 1
+            _totals["lines_parsed"] += 1
+        yield item
+
+
+def count_lines(lines):
+    """Counts lines parsed by a reader that is not a generator. Measured
+    functions it is called from include them."""
+    if enabled:
+        _totals["lines_parsed"] += lines
+
+
+def report():
+    """Returns every record as a dictionary keyed by name, most time
+    taken first."""
+    ordered = sorted(
+        _records.items(), key=lambda item: item[1].seconds, reverse=True
+    )
+    return {name: record.as_dict() for name, record in ordered}
+
+
+def save_report(output_file):
+    """Writes the report to a JSON file."""
+    with open(output_file, "w") as file:
+        json.dump(report(), file, indent=2)
@@ -0,0 +1,130 @@
+"""Streaming readers for tasks.txt that never hold the whole file."""
+
+import task_journal
+import task_profile
+from task_files import iter_raw_tasks, parse_task_line
+
+
+@task_profile.profiled_reader("iter_task_lines")
+def iter_task_lines(file_path, start=0, end=None):
+    """Yields each task in the file along with its byte offset, with any
+    journalled edits applied and deleted tasks left out.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    start: Byte offset to start reading from.
+    end: Byte offset to stop before, or None to read to the end. Both
+    must fall at the start of a line.
+
+    Yields:
+    tuple: (offset, task) where task is the list of parsed fields.
+    """
+    overlay = task_journal.load_overlay(file_path)
+    for offset, task in iter_raw_tasks(file_path, start, end):
+        if offset in overlay:
+            task = task_journal.merge(overlay, offset, task)
+        if task is not None:
+            yield offset, task
+
+
+def iter_tasks(file_path):
+    """Yields the parsed fields of each task in the file, one at a time.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    """
+    for _, task in iter_task_lines(file_path):
+        yield task
+
+
+class TaskPager:
+    """Splits a tasks file into fixed size pages.
+
+    Only the byte offset where each page starts is remembered, so moving
+    back or jumping to a page already seen is a single seek and memory
+    use does not grow with the size of the file.
+
+    Attributes:
+    file_path (str): The path to the tasks file.
+    page_size (int): The number of tasks on each page.
+    page_offsets (list): The byte offset each known page starts at.
+    last_page (int): Index of the final page, or None until it is found.
+    """
+
+    def __init__(self, file_path, page_size=10):
+        self.file_path = file_path
+        self.page_size = page_size
+        self.page_offsets = [0]
+        self.last_page = None
+
+    def _read_from(self, offset, keep_tasks):
+        """Reads one page worth of tasks starting at offset.
+
+        Parameters:
+        offset (int): Byte offset the page starts at.
+        keep_tasks (bool): False to skip over lines without parsing them.
+
+        Returns:
+        tuple: (tasks, offset of the next page or None at end of file)
+        """
+        overlay = task_journal.load_overlay(self.file_path)
+        tasks = []
+        count = 0
+        with open(self.file_path, "rb") as file:
+            file.seek(offset)
+            while count < self.page_size:
+                line = file.readline()
+                if not line:
+                    return tasks, None
+                # Deleted tasks do not take up a place on the page
+                if line.strip() and overlay.get(offset, {}) is not None:
+                    count += 1
+                    if keep_tasks:
+                        task = parse_task_line(line.decode())
+                        tasks.append(task_journal.merge(overlay, offset, task))
+                offset += len(line)
+            # Peek past blank lines and deleted tasks so a full last page
+            # is not followed by an empty one
+            next_offset = offset
+            for line in file:
+                if line.strip() and overlay.get(offset, {}) is not None:
+                    return tasks, next_offset
+                offset += len(line)
+                next_offset = offset
+        return tasks, None
+
+    def _record_next(self, page, next_offset):
+        """Stores where the page after page starts."""
+        if next_offset is None:
+            self.last_page = page
+        elif len(self.page_offsets) == page + 1:
+            self.page_offsets.append(next_offset)
+
+    @task_profile.profiled("TaskPager.read_page")
+    def read_page(self, page):
+        """Returns the tasks on a page, counting from 0.
+
+        Pages not seen yet are reached by skipping lines without parsing
+        them.
+
+        Parameters:
+        page (int): The page to read.
+
+        Returns:
+        list: The tasks on the page, or None if the page does not exist.
+        """
+        if page < 0:
+            return None
+        while len(self.page_offsets) <= page:
+            if self.last_page is not None:
+                return None
+            known = len(self.page_offsets) - 1
+            _, next_offset = self._read_from(self.page_offsets[known], False)
+            self._record_next(known, next_offset)
+
+        tasks, next_offset = self._read_from(self.page_offsets[page], True)
+        self._record_next(page, next_offset)
+        task_profile.count_lines(len(tasks))
+        if not tasks and page > 0:
+            return None
+        return tasks
@@ -0,0 +1,126 @@
+"""Task and per-user overview reports for admin.
+
+Every figure in both reports comes from a single streaming pass over the
+tasks, adding each task to its user's counters, so the cost is one read
+of tasks.txt however many users there are. Users with no tasks are taken
+from the user list and shown with zero counts.
+"""
+
+import os
+from datetime import date
+
+from task_dates import date_key
+from task_files import replacing
+
+# Written next to tasks.txt unless another directory is given
+task_overview_file = "task_overview.txt"
+user_overview_file = "user_overview.txt"
+
+separator = "--------------------------------------------"
+
+
+def count_by_user(tasks, today=None):
+    """Counts each user's tasks in one pass.
+
+    Parameters:
+    tasks: Iterable of task field lists, consumed lazily.
+    today (date): The date to count overdue tasks from.
+
+    Returns:
+    dict: Usernames as keys and [assigned, completed, overdue] lists as
+    values.
+    """
+    today_key = (today or date.today()).isoformat()
+    counts = {}
+    for task in tasks:
+        user_counts = counts.get(task[0])
+        if user_counts is None:
+            user_counts = counts[task[0]] = [0, 0, 0]
+        user_counts[0] += 1
+        if task[5].strip().lower() == "yes":
+            user_counts[1] += 1
+        else:
+            key = date_key(task[4])
+            if key != "unknown" and key < today_key:
+                user_counts[2] += 1
+    return counts
+
+
+def percent(part, whole):
+    """Returns part as a percentage of whole, 0 if whole is 0."""
+    return 100 * part / whole if whole else 0.0
+
+
+def task_overview_lines(counts):
+    """Returns the lines of task_overview.txt."""
+    tasks = sum(user[0] for user in counts.values())
+    completed = sum(user[1] for user in counts.values())
+    overdue = sum(user[2] for user in counts.values())
+    incomplete = tasks - completed
+    incomplete_percent = percent(incomplete, tasks)
+    return [
+        separator,
+        "Task overview",
+        separator,
+        f"{'Total tasks: ':<32}{tasks}",
+        f"{'Completed tasks: ':<32}{completed}",
+        f"{'Incomplete tasks: ':<32}{incomplete}",
+        f"{'Overdue tasks: ':<32}{overdue}",
+        f"{'Incomplete (% of tasks): ':<32}{incomplete_percent:.1f}%",
+        f"{'Overdue (% of tasks): ':<32}{percent(overdue, tasks):.1f}%",
+        separator,
+    ]
+
+
+def iter_user_overview_lines(counts, usernames):
+    """Yields the lines of user_overview.txt.
+
+    Parameters:
+    counts (dict): Output of count_by_user.
+    usernames: Every registered user, so those with no tasks are listed.
+    """
+    tasks = sum(user[0] for user in counts.values())
+    users = sorted(set(usernames) | set(counts))
+    yield separator
+    yield "User overview"
+    yield separator
+    yield f"{'Total users: ':<32}{len(users)}"
+    yield f"{'Total tasks: ':<32}{tasks}"
+    yield separator
+    for username in users:
+        assigned, completed, overdue = counts.get(username, (0, 0, 0))
+        incomplete = assigned - completed
+        yield f"{'User: ':<32}{username}"
+        yield f"{'Tasks assigned: ':<32}{assigned}"
+        yield f"{'Share of all tasks: ':<32}{percent(assigned, tasks):.1f}%"
+        yield f"{'Completed: ':<32}{percent(completed, assigned):.1f}%"
+        yield f"{'Incomplete: ':<32}{percent(incomplete, assigned):.1f}%"
+        yield f"{'Overdue: ':<32}{percent(overdue, assigned):.1f}%"
+        yield separator
+
+
+def _write_lines(file_path, lines):
+    """Writes lines to a file, replacing it only once it is complete."""
+    with replacing(file_path, buffering=1024 * 1024) as file:
+        for line in lines:
+            file.write(line + "\n")
+
+
+def generate_reports(storage, directory=".", today=None):
+    """Writes task_overview.txt and user_overview.txt.
+
+    Parameters:
+    storage: The storage backend to report on.
+    directory (str): Where to write the reports.
+    today (date): The date to count overdue tasks from.
+
+    Returns:
+    tuple: The paths of the two reports written.
+    """
+    counts = count_by_user(storage.iter_tasks(), today)
+    usernames = storage.load_users().keys()
+    task_path = os.path.join(directory, task_overview_file)
+    user_path = os.path.join(directory, user_overview_file)
+    _write_lines(task_path, task_overview_lines(counts))
+    _write_lines(user_path, iter_user_overview_lines(counts, usernames))
+    return task_path, user_path
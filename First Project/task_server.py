@@ -0,0 +1,416 @@
+"""Serves many task_manager sessions from one process.
+
+Every session shares one in-memory copy of the tasks, loaded at startup
+by MemoryStorage, so reads never touch the text files. Writes are queued
+to a single writer task, which adds whatever has built up in one batch
+and then loads the new tasks into the shared store. Only the writer
+changes the files, so sessions never race each other. It writes through
+a backend of its own, opened in its own thread, as an SQLite connection
+can only be used by the thread that opened it.
+
+Clients send one JSON object per line and get one back, see
+TaskServer.dispatch. task_client.py is a terminal client with the same
+menu as task_manager.py.
+
+Usage:
+    python task_server.py --port 8765
+    python task_server.py --unix /tmp/task_manager.sock
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import task_stats
+import task_storage
+import task_store
+import user_credentials
+from task_manager import (
+    CommandError,
+    date_format,
+    parse_due_date,
+    positive_int,
+    replace_commas,
+)
+
+# Tasks on each page of "va"
+page_size = 10
+
+# Longest request line accepted
+line_limit = 1024 * 1024
+
+# Connections waiting to be accepted, enough for hundreds of clients
+# connecting at once
+backlog = 1024
+
+
+class SessionError(Exception):
+    """Raised when a request cannot be carried out. The message is sent
+    back to the client."""
+
+
+class Session:
+    """The state of one connected client.
+
+    Attributes:
+    username (str): The user logged in, or None before login.
+    """
+
+    def __init__(self):
+        self.username = None
+
+
+class TaskServer:
+    """Answers requests from every session using one shared store.
+
+    Attributes:
+    storage (MemoryStorage): The shared tasks, read by every session.
+    open_backend: Function returning a new backend over the same data,
+    called in the writer thread to open the backend it writes through.
+    write_thread (ThreadPoolExecutor): The one thread writes run in.
+    write_backend: The writer thread's backend, or None until opened.
+    writes (asyncio.Queue): Writes waiting for the writer task, as
+    (kind, value, future) tuples.
+    sessions (int): The number of clients connected.
+    """
+
+    def __init__(self, storage, open_backend):
+        self.storage = storage
+        self.open_backend = open_backend
+        self.write_thread = ThreadPoolExecutor(1, "task-writer")
+        self.write_backend = None
+        self.writes = asyncio.Queue()
+        self.sessions = 0
+
+    async def handle_client(self, reader, writer):
+        """Reads requests from one client until it disconnects."""
+        self.sessions += 1
+        session = Session()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                response = await self.respond(session, line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+                if response.get("bye"):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def respond(self, session, line):
+        """Returns the response to one request line."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise SessionError("Requests must be JSON objects")
+            result = await self.dispatch(session, request)
+        except ValueError:
+            return {"ok": False, "error": "Requests must be JSON"}
+        except (SessionError, CommandError) as e:
+            return {"ok": False, "error": str(e)}
+        except FileNotFoundError as e:
+            return {"ok": False, "error": f'"{e.filename}" not found'}
+        except Exception as e:
+            # A bug in one request must not drop the client's connection
+            print(f"Request failed: {e!r}", file=sys.stderr)
+            return {"ok": False, "error": "The request failed"}
+        result["ok"] = True
+        return result
+
+    async def dispatch(self, session, request):
+        """Carries out one request.
+
+        Requests have an "op" of "login" with "username" and "password",
+        then any of the menu options "r" with "username" and "password",
+        "a" with "user", "title", "description" and "due", "va" or "vm"
+        with "page", "s" or "e". Pages of tasks come back with "page",
+        "last_page" and "tasks".
+
+        Returns:
+        dict: The result, sent back with "ok" set to True.
+        """
+        op = request.get("op")
+        if op == "login":
+            return await self.login(session, request)
+        if session.username is None:
+            raise SessionError("Log in first")
+        if op == "va":
+            return self.view_all(request)
+        if op == "vm":
+            return self.view_mine(session, request)
+        if op == "s":
+            self.require_admin(session, "view statistics")
+            return {"statistics": self.statistics()}
+        if op == "a":
+            task = self.build_task(request)
+            await self.write("task", task)
+            return {}
+        if op == "r":
+            self.require_admin(session, "register new users")
+            username = self._text(request, "username")
+            password = self._text(request, "password")
+            if not username or "," in username + password:
+                raise SessionError(
+                    "Enter a username and password without commas"
+                )
+            await self.write("user", (username, password))
+            return {}
+        if op == "e":
+            return {"bye": True}
+        raise SessionError(f'Unknown option "{op}"')
+
+    async def login(self, session, request):
+        """Logs a session in if the username and password match. Hashing
+        the password is slow on purpose, so it runs in a worker thread
+        while other sessions are served."""
+        username = self._text(request, "username")
+        stored = self.storage.get_password(username)
+        if stored is None:
+            raise SessionError("Username not found.")
+        matched = await asyncio.to_thread(
+            user_credentials.verify_password,
+            stored,
+            self._text(request, "password"),
+        )
+        if not matched:
+            raise SessionError("Password is incorrect")
+        session.username = username
+        return {"username": username, "admin": username == "admin"}
+
+    @staticmethod
+    def require_admin(session, action):
+        """Raises SessionError unless admin is logged in."""
+        if session.username != "admin":
+            raise SessionError(f"Only admin is allowed to {action}.")
+
+    @staticmethod
+    def _text(request, field):
+        """Returns a text field of a request, or "" if it is missing."""
+        value = request.get(field, "")
+        if not isinstance(value, str):
+            raise SessionError(f'"{field}" must be text')
+        return value
+
+    @staticmethod
+    def _page(request):
+        """Returns the page number asked for."""
+        try:
+            return int(request.get("page", 0))
+        except (TypeError, ValueError):
+            raise SessionError("Page must be a number")
+
+    def view_all(self, request):
+        """Returns one page of every task."""
+        page = self._page(request)
+        pager = self.storage.pager(page_size)
+        tasks = pager.read_page(page)
+        if tasks is None:
+            raise SessionError("No such page")
+        return {"page": page, "last_page": pager.last_page, "tasks": tasks}
+
+    def view_mine(self, session, request):
+        """Returns one page of the tasks assigned to the session's user.
+        Only the tasks on the page are decoded, however many they have."""
+        page = self._page(request)
+        store = self.storage.store
+        rows = store.user_rows(session.username)
+        last_page = max(len(rows) - 1, 0) // page_size
+        if not 0 <= page <= last_page:
+            raise SessionError("No such page")
+        start = page * page_size
+        tasks = [store.task(row) for row in rows[start : start + page_size]]
+        return {"page": page, "last_page": last_page, "tasks": tasks}
+
+    def statistics(self):
+        """Returns the figures for "s" from the shared store.
+
+        Users are counted from the cached users rather than the backend's
+        stats file, which the writer may be updating at the same time.
+        """
+        stats = self.storage.store.task_stats()
+        stats["users"] = len(self.storage.load_users())
+        return task_stats.summarise(stats)
+
+    def build_task(self, request):
+        """Checks an "a" request and returns the task to store."""
+        user = self._text(request, "user")
+        if not self.storage.user_exists(user):
+            raise SessionError(
+                "User does not exist. Register user before assigning task"
+            )
+        title = self._text(request, "title")
+        if "," in title:
+            raise SessionError("Commas are not allowed in the title")
+        return [
+            user,
+            title,
+            replace_commas(self._text(request, "description")),
+            date_format(date.today()),
+            parse_due_date(self._text(request, "due")),
+            "No",
+        ]
+
+    async def write(self, kind, value):
+        """Queues a write for the writer task and waits until it is
+        done."""
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((kind, value, future))
+        await future
+
+    def _call_backend(self, method, *args):
+        """Calls a method of the writer thread's backend, opening it on
+        the first call. Only ever runs in write_thread."""
+        if self.write_backend is None:
+            self.write_backend = self.open_backend()
+        return getattr(self.write_backend, method)(*args)
+
+    async def _write_backend(self, method, *args):
+        """Runs a backend method in the writer thread and waits for it,
+        so reads carry on while the writes are flushed to disk."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.write_thread, self._call_backend, method, *args
+        )
+
+    async def run_writer(self):
+        """Carries out queued writes one batch at a time, forever.
+
+        The shared store is only changed here, in the event loop, once
+        the batch is written. A batch that fails is reported to the
+        sessions waiting on it and the writer carries on with the next.
+        """
+        while True:
+            batch = [await self.writes.get()]
+            while not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+            tasks = [item for item in batch if item[0] == "task"]
+            users = [item for item in batch if item[0] == "user"]
+            if tasks:
+                values = [value for _, value, _ in tasks]
+                await self._finish(tasks, self._add_tasks(values))
+            for item in users:
+                await self._finish([item], self._add_user(*item[1]))
+
+    async def _add_tasks(self, tasks):
+        """Writes a batch of tasks and loads them into the shared store."""
+        await self._write_backend("add_tasks", tasks)
+        try:
+            self.storage.load_new_tasks()
+        except Exception as e:
+            # The next batch loads these tasks too, so they only show late
+            raise SessionError(
+                f"Task saved, but the task list could not be reloaded: {e}"
+            )
+
+    async def _add_user(self, username, password):
+        """Adds a user unless they were registered meanwhile."""
+        if self.storage.user_exists(username):
+            raise SessionError("username already registered.")
+        await self._write_backend("add_user", username, password)
+
+    def close(self):
+        """Closes the writer thread's backend and then the shared one."""
+        if self.write_backend is not None:
+            self.write_thread.submit(self.write_backend.close).result()
+        self.write_thread.shutdown()
+        self.storage.close()
+
+    @staticmethod
+    async def _finish(items, awaitable):
+        """Waits for a write and passes its outcome to the waiting
+        sessions."""
+        try:
+            await awaitable
+        except Exception as error:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for _, _, future in items:
+            if not future.done():
+                future.set_result(None)
+
+
+def open_backend(args):
+    """Opens the chosen storage backend."""
+    if args.backend == "sqlite":
+        return task_storage.SqliteStorage(args.db)
+    return task_storage.TextStorage("user.txt", "tasks.txt")
+
+
+async def serve(args):
+    """Loads the tasks and serves clients until cancelled."""
+    server = TaskServer(
+        task_store.MemoryStorage(open_backend(args)),
+        lambda: open_backend(args),
+    )
+    writer_task = asyncio.create_task(server.run_writer())
+    if args.unix:
+        listener = await asyncio.start_unix_server(
+            server.handle_client,
+            args.unix,
+            limit=line_limit,
+            backlog=backlog,
+        )
+    else:
+        listener = await asyncio.start_server(
+            server.handle_client,
+            args.host,
+            args.port,
+            limit=line_limit,
+            backlog=backlog,
+        )
+    for sock in listener.sockets:
+        print(f"Serving on {sock.getsockname()}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        writer_task.cancel()
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Task manager server")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", metavar="PATH", help="Unix socket to use")
+    parser.add_argument(
+        "--backend",
+        choices=["text", "sqlite"],
+        default="text",
+        help="store data in user.txt/tasks.txt or in an SQLite database",
+    )
+    parser.add_argument(
+        "--db", default="task_manager.db", help="SQLite database file"
+    )
+    parser.add_argument(
+        "--hash-cost",
+        type=positive_int,
+        default=user_credentials.hash_iterations,
+        help="PBKDF2 iterations for new password hashes",
+    )
+    args = parser.parse_args(argv)
+    user_credentials.hash_iterations = args.hash_cost
+    try:
+        asyncio.run(serve(args))
+    except FileNotFoundError as e:
+        print(f'Error. "{e.filename}" not found')
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,650 @@
+"""Tasks split across several files by a hash of the assigned user.
+
+Each shard is an ordinary tasks file with its own indexes, stats, journal
+and lock, handled by a TextStorage. ShardedStorage routes every task to
+the shard for its user, so one user's tasks are always in one file and
+appends for different users usually go to different files.
+
+Every line in a shard ends with a sequence number, a seventh field taken
+from a counter shared by all the shards, so viewing all tasks merges the
+shards back into the order the tasks were added. Numbers are taken while
+the shard's lock is held, so each shard is in sequence order. The extra
+field is removed from every task handed back.
+
+A task id is its byte offset in its shard times the number of shards,
+plus the shard number.
+
+Giving a task to a user in another shard adds it to one shard and
+deletes it from the other. The move is written to moves.journal first,
+so one cut short by a crash is finished the next time the shards are
+opened.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import zlib
+from contextlib import ExitStack, contextmanager
+
+import task_journal
+import task_stats
+from locked_writer import locked
+from task_dates import date_key
+from task_files import replacing
+from task_reader import iter_task_lines
+from task_storage import TextStorage, format_task_line
+from user_registry import UserRegistry
+
+# Shards created when none is given
+default_shard_count = 16
+
+# Tasks held back per shard before add_tasks writes them
+add_batch_size = 10_000
+
+
+def manifest_path(shard_dir):
+    """Returns the path of the file recording how many shards there are."""
+    return os.path.join(shard_dir, "shards.json")
+
+
+def sequence_path(shard_dir):
+    """Returns the path of the file holding the next sequence number."""
+    return os.path.join(shard_dir, "sequence")
+
+
+def moves_path(shard_dir):
+    """Returns the path of the log of tasks moving between shards."""
+    return os.path.join(shard_dir, "moves.journal")
+
+
+def shard_path(shard_dir, shard):
+    """Returns the path of one shard's tasks file."""
+    return os.path.join(shard_dir, f"tasks_{shard:03d}.txt")
+
+
+def shard_of(username, shard_count):
+    """Returns the shard a user's tasks are stored in. crc32 gives the
+    same answer in every process, unlike hash()."""
+    return zlib.crc32(username.encode()) % shard_count
+
+
+def _write_sequence(shard_dir, next_sequence):
+    """Saves the next sequence number to hand out."""
+    with replacing(sequence_path(shard_dir), sync=True) as file:
+        file.write(f"{next_sequence}\n")
+
+
+def reserve_sequence(shard_dir, count=1):
+    """Takes count sequence numbers from the shared counter.
+
+    Parameters:
+    shard_dir: The directory holding the shards.
+    count (int): How many numbers to take.
+
+    Returns:
+    int: The first of the numbers.
+    """
+    path = sequence_path(shard_dir)
+    with locked(path):
+        try:
+            with open(path, "r") as file:
+                first = int(file.read())
+        except FileNotFoundError:
+            # Shards split before lines were numbered start from 0
+            first = 0
+        _write_sequence(shard_dir, first + count)
+    return first
+
+
+def _start_shards(shard_dir):
+    """Checks no shards exist in a directory yet and creates it.
+
+    Raises:
+    FileExistsError: If the directory already holds shards.
+    """
+    if os.path.exists(manifest_path(shard_dir)):
+        raise FileExistsError(17, "Shards already exist", shard_dir)
+    os.makedirs(shard_dir, exist_ok=True)
+
+
+def _finish_shards(shard_dir, shard_count, next_sequence):
+    """Writes the sequence counter and then the manifest, which is what
+    makes the shards usable, once every shard is safely written."""
+    _write_sequence(shard_dir, next_sequence)
+    with replacing(manifest_path(shard_dir), sync=True) as file:
+        file.write(json.dumps({"shards": shard_count}))
+
+
+def create_shards(shard_dir, shard_count=default_shard_count):
+    """Creates an empty shard directory.
+
+    Raises:
+    FileExistsError: If the directory already holds shards.
+    """
+    _start_shards(shard_dir)
+    for shard in range(shard_count):
+        open(shard_path(shard_dir, shard), "w").close()
+    _finish_shards(shard_dir, shard_count, 0)
+
+
+def read_shard_count(shard_dir):
+    """Returns the number of shards recorded in a shard directory.
+
+    Raises:
+    FileNotFoundError: If the directory has no shards.
+    """
+    with open(manifest_path(shard_dir), "r") as file:
+        return json.load(file)["shards"]
+
+
+def task_sequence(task):
+    """Returns the sequence number at the end of a shard's line, or -1
+    for a line written before shards numbered them."""
+    try:
+        return int(task[6])
+    except (IndexError, ValueError):
+        return -1
+
+
+@contextmanager
+def _locked_files(paths):
+    """Holds the locks of several files, taken in the order given. Every
+    caller gives shards in shard order, so two processes cannot each wait
+    for the other."""
+    with ExitStack() as stack:
+        for path in paths:
+            stack.enter_context(locked(path))
+        yield
+
+
+def _merge_key(shard, offset, task):
+    """Orders tasks from different shards by sequence number, which each
+    shard is already in."""
+    return (task_sequence(task), shard, offset)
+
+
+class ShardMerge:
+    """Iterates over several shard files in the order their tasks were
+    added, reading each file a line at a time.
+
+    Yields (shard, offset, task), the task still with its sequence
+    number. The heap always holds the next unread task of every shard
+    that has any left, so positions can say where each shard has got to.
+    """
+
+    def __init__(self, paths, starts=None):
+        """
+        Parameters:
+        paths (list): The shard files, in shard order.
+        starts (list): Byte offset to start each shard at, or None to skip
+        a shard that has been read to the end. All from 0 if not given.
+        """
+        self.shard_count = len(paths)
+        self.heap = []
+        for shard, path in enumerate(paths):
+            start = 0 if starts is None else starts[shard]
+            if start is not None:
+                self._push(shard, iter_task_lines(path, start))
+
+    def _push(self, shard, lines):
+        """Adds the next task from a shard to the heap, if it has one."""
+        for offset, task in lines:
+            item = (_merge_key(shard, offset, task), task, lines)
+            heapq.heappush(self.heap, item)
+            return
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.heap:
+            raise StopIteration
+        key, task, lines = heapq.heappop(self.heap)
+        self._push(key[1], lines)
+        return key[1], key[2], task
+
+    def positions(self):
+        """Returns the offset of each shard's next unread task, or None
+        for shards that have none left."""
+        starts = [None] * self.shard_count
+        for key, _, _ in self.heap:
+            starts[key[1]] = key[2]
+        return starts
+
+
+class ShardPager:
+    """Pages through the merged shards.
+
+    For each page seen, the offset each shard had reached is kept, so
+    any page can be read again by restarting the merge from there.
+
+    Attributes:
+    paths (list): The shard files.
+    page_size (int): The number of tasks on each page.
+    page_starts (list): For each known page, the offset each shard starts
+    at, or None for shards already used up.
+    last_page (int): Index of the final page, or None until it is found.
+    """
+
+    def __init__(self, paths, page_size=10):
+        self.paths = paths
+        self.page_size = page_size
+        self.page_starts = [[0] * len(paths)]
+        self.last_page = None
+
+    def _read_from(self, starts):
+        """Reads one page of tasks.
+
+        Returns:
+        tuple: (tasks, where each shard starts the next page, or None if
+        there is no next page)
+        """
+        merge = ShardMerge(self.paths, starts)
+        page = itertools.islice(merge, self.page_size)
+        tasks = [task[:6] for _, _, task in page]
+        next_starts = merge.positions()
+        if all(start is None for start in next_starts):
+            return tasks, None
+        return tasks, next_starts
+
+    def read_page(self, page):
+        """Returns the tasks on a page, counting from 0, or None if the
+        page does not exist."""
+        if page < 0:
+            return None
+        while len(self.page_starts) <= page:
+            if self.last_page is not None:
+                return None
+            self._read_page_at(len(self.page_starts) - 1)
+        return self._read_page_at(page)
+
+    def _read_page_at(self, page):
+        """Reads a known page and records where the next one starts."""
+        tasks, next_starts = self._read_from(self.page_starts[page])
+        if next_starts is None:
+            self.last_page = page
+        elif len(self.page_starts) == page + 1:
+            self.page_starts.append(next_starts)
+        if not tasks and page > 0:
+            return None
+        return tasks
+
+
+class ShardedStorage:
+    """Stores tasks in shard files, one TextStorage per shard, with users
+    in a single user.txt.
+
+    Attributes:
+    user_file (str): The path to user.txt.
+    shard_dir (str): The directory holding the shards.
+    shards (list): A TextStorage for each shard.
+    users (UserRegistry): Cached users, re-read only when user.txt changes.
+    """
+
+    def __init__(self, user_file="user.txt", shard_dir="task_shards"):
+        self.user_file = user_file
+        self.shard_dir = shard_dir
+        shard_count = read_shard_count(shard_dir)
+        self.shards = [
+            TextStorage(user_file, shard_path(shard_dir, shard))
+            for shard in range(shard_count)
+        ]
+        self.users = UserRegistry(user_file)
+        if os.path.exists(moves_path(shard_dir)):
+            self.recover_moves()
+
+    def _paths(self):
+        return [storage.task_file for storage in self.shards]
+
+    def _shard_for(self, username):
+        """Returns the TextStorage holding a user's tasks."""
+        return self.shards[shard_of(username, len(self.shards))]
+
+    def _task_id(self, shard, offset):
+        """Combines a shard number and an offset in it into one id."""
+        return offset * len(self.shards) + shard
+
+    def _locate(self, task_id):
+        """Splits a task id into (TextStorage, offset)."""
+        offset, shard = divmod(task_id, len(self.shards))
+        return self.shards[shard], offset
+
+    @contextmanager
+    def _locked_shards(self, storages):
+        """Holds the locks of several shards, in shard order."""
+        ordered = sorted(set(storages), key=self.shards.index)
+        with _locked_files(storage.task_file for storage in ordered):
+            yield
+
+    def _append(self, storage, tasks):
+        """Appends tasks to one shard, numbering them while its lock is
+        held. Returns the number written."""
+        with locked(storage.task_file):
+            first = reserve_sequence(self.shard_dir, len(tasks))
+            return storage.add_tasks(
+                [*task[:6], first + number]
+                for number, task in enumerate(tasks)
+            )
+
+    def load_users(self):
+        """Returns a dictionary of usernames and passwords."""
+        return dict(self.users.load())
+
+    def get_password(self, username):
+        """Returns a user's stored password, or None if they are not
+        registered."""
+        return self.users.load().get(username)
+
+    def user_exists(self, username):
+        """Returns True if the username is registered."""
+        return username in self.users
+
+    def add_user(self, username, password):
+        """Appends a new user to user.txt. The first shard's stats count
+        it."""
+        self.shards[0].add_user(username, password)
+
+    def hash_passwords(self, iterations=None):
+        """Hashes the plaintext passwords in user.txt."""
+        return self.shards[0].hash_passwords(iterations)
+
+    def iter_tasks(self):
+        """Yields every task in the order they were added, merging the
+        shards."""
+        for _, _, task in ShardMerge(self._paths()):
+            yield task[:6]
+
+    def iter_task_ids(self):
+        """Yields (task id, task) for every task in the order they were
+        added, merging the shards."""
+        for shard, offset, task in ShardMerge(self._paths()):
+            yield self._task_id(shard, offset), task[:6]
+
+    def iter_user_tasks(self, username):
+        """Yields the tasks assigned to one user from their shard only."""
+        for _, task in self.iter_user_task_ids(username):
+            yield task
+
+    def iter_user_task_ids(self, username):
+        """Yields (task id, task) for each task assigned to one user."""
+        storage = self._shard_for(username)
+        shard = self.shards.index(storage)
+        for offset, task in storage.iter_user_task_ids(username):
+            yield self._task_id(shard, offset), task[:6]
+
+    def pager(self, page_size):
+        """Returns a pager over all tasks in the order they were added."""
+        return ShardPager(self._paths(), page_size)
+
+    def iter_tasks_due(self, start=None, end=None):
+        """Yields incomplete tasks due from start up to, but not including,
+        end, merging each shard's due date index."""
+        return heapq.merge(
+            *(
+                (task[:6] for task in storage.iter_tasks_due(start, end))
+                for storage in self.shards
+            ),
+            key=lambda task: date_key(task[4]),
+        )
+
+    def search_tasks(self, query):
+        """Yields (words matched, task id, task) for tasks matching a
+        search across every shard, best matches first."""
+        found = []
+        for shard, storage in enumerate(self.shards):
+            for score, offset, task in storage.search_tasks(query):
+                task_id = self._task_id(shard, offset)
+                found.append((-score, task_id, task[:6]))
+        found.sort(key=lambda item: item[:2])
+        for score, task_id, task in found:
+            yield -score, task_id, task
+
+    def add_task(self, task):
+        """Appends a task to its user's shard."""
+        self._append(self._shard_for(task[0]), [task])
+
+    def add_tasks(self, tasks):
+        """Appends many tasks, writing each shard's share together.
+
+        Every shard is locked throughout, so the tasks can be numbered in
+        the order given, add_batch_size numbers at a time, however the
+        batches for different shards are written.
+
+        Parameters:
+        tasks: Iterable of task field lists, consumed lazily.
+
+        Returns:
+        int: The number of tasks written.
+        """
+        written = 0
+        pending = {}
+        sequence = end = 0
+        with self._locked_shards(self.shards):
+            for task in tasks:
+                if sequence == end:
+                    sequence = reserve_sequence(self.shard_dir, add_batch_size)
+                    end = sequence + add_batch_size
+                storage = self._shard_for(task[0])
+                batch = pending.setdefault(storage.task_file, (storage, []))
+                batch[1].append([*task[:6], sequence])
+                sequence += 1
+                if len(batch[1]) == add_batch_size:
+                    written += storage.add_tasks(batch[1])
+                    batch[1].clear()
+            for storage, batch in pending.values():
+                if batch:
+                    written += storage.add_tasks(batch)
+        return written
+
+    def count(self, table):
+        """Returns the number of users or tasks from the saved stats.
+
+        Parameters:
+        table (str): Either "users" or "tasks".
+        """
+        stats = self._combined_stats()
+        return stats["users"] if table == "users" else stats["tasks"]
+
+    def _combined_stats(self):
+        """Adds up the saved stats of every shard."""
+        combined = task_stats.empty_task_stats()
+        for storage in self.shards:
+            stats = task_stats.load_stats(self.user_file, storage.task_file)
+            task_stats.merge_task_stats(combined, stats)
+            combined["users"] = stats["users"]
+        return combined
+
+    def statistics(self):
+        """Returns the figures for the statistics menu, see
+        task_stats.summarise."""
+        return task_stats.summarise(self._combined_stats())
+
+    def get_task(self, task_id):
+        """Returns the task with its journalled edits applied.
+
+        Raises:
+        KeyError: If there is no such task or it was deleted.
+        """
+        storage, offset = self._locate(task_id)
+        return storage.get_task(offset)[:6]
+
+    def update_task(self, task_id, changes):
+        """Records an edit to a task. A task given to a user in another
+        shard is moved there, keeping each user's tasks in one shard, and
+        so gets a new id and a new sequence number, which puts it last.
+
+        Parameters:
+        task_id (int): The id of the task.
+        changes (dict): New values keyed by "user", "due_date" or
+        "completed".
+        """
+        storage, offset = self._locate(task_id)
+        new_user = changes.get("user")
+        target = self._shard_for(new_user) if new_user else storage
+        if target is storage:
+            storage.update_task(offset, changes)
+            return
+        with self._locked_shards([storage, target]):
+            old_task = storage.get_task(offset)
+            new_task = task_journal.apply_changes(old_task, changes)
+            new_task[6:] = [reserve_sequence(self.shard_dir)]
+            self._log_move({"id": task_id, "old": old_task, "task": new_task})
+            target.add_tasks([new_task])
+            storage.delete_task(offset)
+            self._log_move({"done": new_task[6]})
+        self._clear_moves()
+
+    def _log_move(self, entry):
+        """Adds an entry to the moves journal and syncs it to disk."""
+        path = moves_path(self.shard_dir)
+        with locked(path):
+            with open(path, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _pending_moves(self):
+        """Returns the moves started but not finished, keyed by the new
+        sequence number of the task moved."""
+        pending = {}
+        try:
+            with open(moves_path(self.shard_dir), "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        if "done" in entry:
+                            pending.pop(entry["done"], None)
+                        else:
+                            pending[entry["task"][6]] = entry
+                    except (ValueError, KeyError, IndexError):
+                        # A line cut short by a crash mid-write is ignored
+                        pass
+        except FileNotFoundError:
+            pass
+        return pending
+
+    def recover_moves(self):
+        """Finishes any move between shards that was cut short.
+
+        The task is added to its new shard unless a line with its new
+        sequence number is already there, and deleted from its old shard
+        if it is still there unchanged. The moves journal is removed once
+        nothing in it is left to finish.
+        """
+        for sequence, entry in self._pending_moves().items():
+            source, offset = self._locate(entry["id"])
+            target = self._shard_for(entry["task"][0])
+            with self._locked_shards([source, target]):
+                # Another process may have finished it while this waited
+                if sequence not in self._pending_moves():
+                    continue
+                added = any(
+                    task_sequence(task) == sequence
+                    for _, task in target.iter_task_ids()
+                )
+                if not added:
+                    target.add_tasks([entry["task"]])
+                try:
+                    if source.get_task(offset) == entry["old"]:
+                        source.delete_task(offset)
+                except KeyError:
+                    pass
+                self._log_move({"done": sequence})
+        self._clear_moves()
+
+    def _clear_moves(self):
+        """Removes the moves journal if every move in it is finished."""
+        path = moves_path(self.shard_dir)
+        with locked(path):
+            if not self._pending_moves() and os.path.exists(path):
+                os.remove(path)
+
+    def delete_task(self, task_id):
+        """Records that a task has been deleted in its shard's journal."""
+        storage, offset = self._locate(task_id)
+        storage.delete_task(offset)
+
+    def compact(self):
+        """Folds each shard's journal into it and returns the number of
+        edited tasks folded in. Any move cut short is finished first, as
+        it finds the task it moved by its offset."""
+        self.recover_moves()
+        return sum(storage.compact() for storage in self.shards)
+
+    def normalise_dates(self):
+        """Rewrites every date in every shard in the canonical format and
+        returns the number of tasks changed."""
+        self.recover_moves()
+        return sum(storage.normalise_dates() for storage in self.shards)
+
+    def close(self):
+        """Nothing to close for the text files."""
+
+
+def split_tasks_file(task_file, shard_dir, shard_count=default_shard_count):
+    """Copies a single tasks file into a new shard directory.
+
+    Journalled edits are applied on the way, and each task is numbered
+    by its place in the original file, which is left as it is and kept
+    locked throughout. The manifest is only written once every shard is
+    safely on disk, so a split cut short leaves no usable shards and can
+    be run again.
+
+    Parameters:
+    task_file: The path to tasks.txt.
+    shard_dir: The directory to create the shards in.
+    shard_count (int): The number of shards.
+
+    Returns:
+    int: The number of tasks copied.
+    """
+    # Tasks appended while the split runs would not reach the shards
+    with locked(task_file):
+        _start_shards(shard_dir)
+        files = [
+            open(shard_path(shard_dir, shard), "w", buffering=1024 * 1024)
+            for shard in range(shard_count)
+        ]
+        copied = 0
+        try:
+            for _, task in iter_task_lines(task_file):
+                files[shard_of(task[0], shard_count)].write(
+                    format_task_line([*task[:6], copied])
+                )
+                copied += 1
+            for file in files:
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            for file in files:
+                file.close()
+        _finish_shards(shard_dir, shard_count, copied)
+    return copied
+
+
+def join_shards(shard_dir, task_file):
+    """Writes every task in a shard directory back into a single tasks
+    file, in the order they were added.
+
+    The tasks are streamed to a temporary file which then replaces
+    task_file. task_file and every shard are locked throughout, so no
+    task added meanwhile is lost. The shards are left as they are.
+
+    Parameters:
+    shard_dir: The directory holding the shards.
+    task_file: The path to write tasks.txt to.
+
+    Returns:
+    int: The number of tasks written.
+    """
+    shard_count = read_shard_count(shard_dir)
+    paths = [shard_path(shard_dir, shard) for shard in range(shard_count)]
+    written = 0
+    with _locked_files([task_file, *paths]), replacing(
+        task_file, buffering=1024 * 1024, sync=True
+    ) as file:
+        for _, _, task in ShardMerge(paths):
+            file.write(format_task_line(task[:6]))
+            written += 1
+    return written
@@ -0,0 +1,95 @@
+"""Binary snapshots of parsed data, saved next to the text files.
+
+A snapshot is a fixed size header followed by a marshal payload. The
+header records the size and modification time of the files the data was
+parsed from and a crc32 of the payload, so a snapshot is only trusted
+when it matches the files on disk and was not cut short or damaged.
+Loading one is a single read and a marshal.loads, with arrays restored
+from raw bytes, rather than parsing every line again.
+
+Snapshots are a cache. Any that cannot be used is ignored and written
+again once the data has been rebuilt.
+"""
+
+import marshal
+import struct
+import zlib
+
+from task_files import replacing
+
+# Magic, format version, two file signatures and the payload's crc32
+header = struct.Struct("<4sHqqqqI")
+
+magic = b"TSNP"
+
+# Raised whenever the payload layout changes so old snapshots are ignored
+version = 3
+
+
+def snapshot_path(file_path):
+    """Returns the path of the snapshot for a text file."""
+    return file_path + ".snap"
+
+
+def _packed(signature):
+    """Returns a signature as two integers for the header, -1 if the file
+    was missing."""
+    return tuple(signature) if signature else (-1, -1)
+
+
+def _unpacked(size, mtime):
+    """Reverses _packed."""
+    return None if size < 0 else [size, mtime]
+
+
+def write_snapshot(file_path, signatures, data):
+    """Saves data as the snapshot for a text file.
+
+    Parameters:
+    file_path: The text file the data was parsed from.
+    signatures (list): file_signature of the text file and of one other
+    file the data depends on, or None.
+    data: Anything marshal can write.
+    """
+    payload = marshal.dumps(data)
+    head = header.pack(
+        magic,
+        version,
+        *_packed(signatures[0]),
+        *_packed(signatures[1]),
+        zlib.crc32(payload),
+    )
+    with replacing(snapshot_path(file_path), "wb") as file:
+        file.write(head + payload)
+
+
+def read_snapshot(file_path):
+    """Returns (signatures, data) from the snapshot for a text file, or
+    None if there is none or it is damaged."""
+    try:
+        with open(snapshot_path(file_path), "rb") as file:
+            head = file.read(header.size)
+            payload = file.read()
+    except FileNotFoundError:
+        return None
+    if len(head) < header.size:
+        return None
+    (
+        found_magic,
+        found_version,
+        size,
+        mtime,
+        other_size,
+        other_mtime,
+        checksum,
+    ) = header.unpack(head)
+    if found_magic != magic or found_version != version:
+        return None
+    if zlib.crc32(payload) != checksum:
+        return None
+    try:
+        data = marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        return None
+    signatures = [_unpacked(size, mtime), _unpacked(other_size, other_mtime)]
+    return signatures, data
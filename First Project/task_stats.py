@@ -0,0 +1,272 @@
+"""Running statistics for user.txt and tasks.txt kept in a small sidecar
+file so the statistics menu does not have to read either file."""
+
+import json
+from datetime import date
+
+import task_journal
+import task_mmap
+import task_parallel
+from task_dates import date_key
+from task_files import file_signature, write_json
+from task_reader import iter_task_lines
+
+# In-memory copy of each stats file
+_stats_cache = {}
+
+
+def stats_path(task_file):
+    """Returns the path of the stats file for a tasks file."""
+    return task_file + ".stats"
+
+
+def empty_task_stats():
+    """Returns task counters for an empty tasks file."""
+    return {"tasks": 0, "completed": 0, "per_user": {}, "incomplete_due": {}}
+
+
+def add_task_to_stats(stats, task, amount=1):
+    """Updates task counters with one task.
+
+    Parameters:
+    stats (dict): The counters to update.
+    task: list of user, title, description, date assigned, due date and
+    completed
+    amount (int): 1 to count the task, -1 to take it back off.
+    """
+    user, due_date, completed = task[0], task[4], task[5]
+    stats["tasks"] += amount
+    per_user = stats["per_user"]
+    per_user[user] = per_user.get(user, 0) + amount
+    if not per_user[user]:
+        del per_user[user]
+    if completed.strip().lower() == "yes":
+        stats["completed"] += amount
+    else:
+        # Overdue depends on today's date, so incomplete tasks are counted
+        # per due date and summed when the statistics are shown
+        due = stats["incomplete_due"]
+        key = date_key(due_date)
+        due[key] = due.get(key, 0) + amount
+        if not due[key]:
+            del due[key]
+
+
+def _count_range(task_file, start, end):
+    """Builds the task counters for one range of a tasks file."""
+    stats = empty_task_stats()
+    for _, task in iter_task_lines(task_file, start, end):
+        add_task_to_stats(stats, task)
+    return stats
+
+
+def count_tasks(task_file, workers=None):
+    """Builds task counters with a single pass over the tasks file, split
+    across processes when the file is large, see task_parallel.
+
+    Parameters:
+    task_file: The path to the tasks file.
+    workers (int): Processes to use, every core by default.
+    """
+    workers = task_parallel.worker_count() if workers is None else workers
+    if not task_parallel.use_parallel(task_file, workers):
+        return _count_range(task_file, 0, None)
+    stats = empty_task_stats()
+    ranges = task_parallel.map_ranges(_count_range, task_file, workers)
+    for range_stats in ranges:
+        merge_task_stats(stats, range_stats)
+    return stats
+
+
+def count_users(user_file):
+    """Counts the non-empty lines of the users file."""
+    return task_mmap.count_lines(user_file)
+
+
+def _read_stats(task_file):
+    """Returns the saved stats for a tasks file, or None."""
+    if task_file in _stats_cache:
+        return _stats_cache[task_file]
+    try:
+        with open(stats_path(task_file), "r") as file:
+            stats = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if "task_signature" not in stats or "user_signature" not in stats:
+        return None
+    _stats_cache[task_file] = stats
+    return stats
+
+
+def save_stats(task_file, stats):
+    """Writes the stats next to the tasks file."""
+    write_json(stats_path(task_file), stats)
+    _stats_cache[task_file] = stats
+
+
+def load_stats(user_file, task_file):
+    """Returns up to date statistics for the two files.
+
+    The saved counters are used as long as each file still has the size
+    and modification time they were saved with, reading the stats file
+    again if another process has updated it. Otherwise only the file that
+    changed is recounted, in a single pass.
+
+    Parameters:
+    user_file: The path to user.txt.
+    task_file: The path to tasks.txt.
+
+    Returns:
+    dict: The counters, see empty_task_stats, plus "users".
+    """
+    user_signature = file_signature(user_file)
+    task_signature = file_signature(task_file)
+    journal_signature = file_signature(task_journal.journal_path(task_file))
+    if user_signature is None:
+        raise FileNotFoundError(2, "No such file", user_file)
+    if task_signature is None:
+        raise FileNotFoundError(2, "No such file", task_file)
+
+    for _ in range(2):
+        stats = _read_stats(task_file)
+        if stats is not None and [
+            stats["user_signature"],
+            stats["task_signature"],
+            stats.get("journal_signature"),
+        ] == [user_signature, task_signature, journal_signature]:
+            return stats
+        # The copy in memory is behind if another process wrote since, so
+        # the stats file is read again before recounting
+        _stats_cache.pop(task_file, None)
+
+    if (
+        stats is None
+        or stats["task_signature"] != task_signature
+        or stats.get("journal_signature") != journal_signature
+    ):
+        users = stats["users"] if stats else 0
+        stats_user_signature = stats["user_signature"] if stats else None
+        stats = count_tasks(task_file)
+        stats["users"] = users
+        stats["user_signature"] = stats_user_signature
+        stats["task_signature"] = task_signature
+        stats["journal_signature"] = journal_signature
+    if stats["user_signature"] != user_signature:
+        stats["users"] = count_users(user_file)
+        stats["user_signature"] = user_signature
+    save_stats(task_file, stats)
+    return stats
+
+
+def _read_stats_at(task_file, key, offset):
+    """Returns the saved stats if the file recorded under key was covered
+    right up to offset, or None.
+
+    The copy in memory is behind if another process wrote since, so the
+    stats file is read again before giving up.
+    """
+    for _ in range(2):
+        stats = _read_stats(task_file)
+        saved = stats.get(key) if stats else None
+        if stats is not None and (saved[0] if saved else 0) == offset:
+            return stats
+        _stats_cache.pop(task_file, None)
+    return None
+
+
+def merge_task_stats(stats, new_stats):
+    """Adds the task counters in new_stats onto stats."""
+    stats["tasks"] += new_stats["tasks"]
+    stats["completed"] += new_stats["completed"]
+    for key in ("per_user", "incomplete_due"):
+        for name, count in new_stats[key].items():
+            stats[key][name] = stats[key].get(name, 0) + count
+
+
+def record_tasks(user_file, task_file, new_stats, offset):
+    """Adds the counters for newly appended tasks to the saved stats.
+
+    The saved stats are only updated in place if they covered the tasks
+    file right up to where the new tasks were written, otherwise the next
+    call to load_stats recounts the file.
+
+    Parameters:
+    user_file: The path to user.txt.
+    task_file: The path to tasks.txt.
+    new_stats (dict): Counters for just the new tasks.
+    offset: The byte offset the first new task was written at.
+    """
+    stats = _read_stats_at(task_file, "task_signature", offset)
+    if stats is None:
+        return
+    merge_task_stats(stats, new_stats)
+    stats["task_signature"] = file_signature(task_file)
+    save_stats(task_file, stats)
+
+
+def record_edit(task_file, old_task, new_task, journal_offset):
+    """Moves an edited task's counts from its old values to its new ones.
+
+    The saved stats are only updated in place if they covered the journal
+    right up to where the edit was written, otherwise the next call to
+    load_stats recounts the tasks.
+
+    Parameters:
+    task_file: The path to tasks.txt.
+    old_task: The task before the edit.
+    new_task: The task after the edit, or None if it was deleted.
+    journal_offset (int): The size of the journal before the edit.
+    """
+    stats = _read_stats_at(task_file, "journal_signature", journal_offset)
+    if stats is None:
+        return
+    journal_file = task_journal.journal_path(task_file)
+    add_task_to_stats(stats, old_task, -1)
+    if new_task is not None:
+        add_task_to_stats(stats, new_task)
+    stats["journal_signature"] = file_signature(journal_file)
+    save_stats(task_file, stats)
+
+
+def record_user(user_file, task_file, offset, added=1):
+    """Counts newly appended users if the saved stats covered the users
+    file right up to where they were written.
+
+    Parameters:
+    user_file: The path to user.txt.
+    task_file: The path to tasks.txt.
+    offset: The byte offset the first new user was written at.
+    added (int): The number of users appended.
+    """
+    stats = _read_stats_at(task_file, "user_signature", offset)
+    if stats is None:
+        return
+    stats["users"] += added
+    stats["user_signature"] = file_signature(user_file)
+    save_stats(task_file, stats)
+
+
+def summarise(stats, today=None):
+    """Works out the figures shown on the statistics menu.
+
+    Parameters:
+    stats (dict): Counters from load_stats or a storage backend.
+    today (date): The date to count overdue tasks from.
+
+    Returns:
+    dict: users, tasks, completed, incomplete, overdue and per_user.
+    """
+    today_key = (today or date.today()).strftime("%Y-%m-%d")
+    overdue = sum(
+        count
+        for key, count in stats["incomplete_due"].items()
+        if key != "unknown" and key < today_key
+    )
+    return {
+        "users": stats["users"],
+        "tasks": stats["tasks"],
+        "completed": stats["completed"],
+        "incomplete": stats["tasks"] - stats["completed"],
+        "overdue": overdue,
+        "per_user": stats["per_user"],
+    }
@@ -0,0 +1,831 @@
+"""Storage backends for task_manager.
+
+TextStorage keeps the original user.txt and tasks.txt files while
+SqliteStorage keeps the same data in indexed tables. Both offer the same
+methods so task_manager does not need to know which one is in use.
+"""
+
+import os
+import sqlite3
+
+import due_index
+import search_index
+import task_dates
+import task_files
+import task_index
+import task_journal
+import task_profile
+import task_stats
+import user_credentials
+from locked_writer import GroupWriter, locked, run_after_write
+from task_reader import TaskPager, iter_task_lines, iter_tasks
+from user_registry import UserRegistry, parse_user_line
+
+
+def iter_user_lines(file_path):
+    """Yields (username, password) for each non-empty line of user.txt."""
+    with open(file_path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield parse_user_line(line)
+
+
+# Inserts a task along with its sortable due date
+insert_task_sql = """INSERT INTO tasks (username, title, description,
+date_assigned, due_date, completed, due_key)
+VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+
+def task_row(task):
+    """Returns the values insert_task_sql needs for a task."""
+    return (*task, task_dates.date_key(task[4]))
+
+
+def format_task_line(task):
+    """Formats a task's fields as a line of tasks.txt.
+
+    Commas inside fields are swapped for | so the line splits cleanly.
+
+    Parameters:
+    task: list of user, title, description, date assigned, due date and
+    completed
+
+    Returns:
+    str: The line, including the trailing newline.
+    """
+    return ", ".join(str(field).replace(",", "|") for field in task) + "\n"
+
+
+class TextStorage:
+    """Stores users and tasks in the comma separated text files.
+
+    Attributes:
+    user_file (str): The path to user.txt.
+    task_file (str): The path to tasks.txt.
+    users (UserRegistry): Cached users, re-read only when user.txt changes.
+    task_writer (GroupWriter): Appends tasks under the tasks.txt lock.
+    user_writer (GroupWriter): Appends users under the user.txt lock.
+    """
+
+    def __init__(self, user_file="user.txt", task_file="tasks.txt"):
+        self.user_file = user_file
+        self.task_file = task_file
+        self.users = UserRegistry(user_file)
+        self.task_writer = GroupWriter(task_file, self._tasks_written)
+        self.user_writer = GroupWriter(user_file, self._users_written)
+
+    def load_users(self):
+        """Returns a dictionary of usernames and passwords."""
+        return dict(self.users.load())
+
+    def get_password(self, username):
+        """Returns a user's stored password, or None if they are not
+        registered."""
+        return self.users.load().get(username)
+
+    def user_exists(self, username):
+        """Returns True if the username is registered."""
+        return username in self.users
+
+    def add_user(self, username, password):
+        """Appends a new user to user.txt, with their password hashed, and
+        counts them in the stats."""
+        stored = user_credentials.hash_password(password)
+        self.user_writer.append(username, f"{username}, {stored}\n")
+
+    def hash_passwords(self, iterations=None):
+        """Replaces every plaintext password in user.txt with a salted
+        hash, under the user.txt lock.
+
+        Parameters:
+        iterations (int): The cost, see user_credentials.hash_password.
+
+        Returns:
+        int: The number of passwords hashed.
+        """
+        with locked(self.user_file):
+            if all(
+                user_credentials.is_hashed(stored)
+                for _, stored in iter_user_lines(self.user_file)
+            ):
+                # Replacing the file would only make its readers reload it
+                return 0
+            hashed = 0
+            with task_files.replacing(self.user_file, sync=True) as file:
+                for username, stored in iter_user_lines(self.user_file):
+                    if not user_credentials.is_hashed(stored):
+                        stored = user_credentials.hash_password(
+                            stored, iterations
+                        )
+                        hashed += 1
+                    file.write(f"{username}, {stored}\n")
+        return hashed
+
+    def _users_written(self, written):
+        """Counts a group of users just appended by user_writer."""
+        task_stats.record_user(
+            self.user_file, self.task_file, written[0][1], len(written)
+        )
+
+    def iter_tasks(self):
+        """Yields every task in file order."""
+        return iter_tasks(self.task_file)
+
+    def iter_task_ids(self):
+        """Yields (task id, task) for every task in file order."""
+        return iter_task_lines(self.task_file)
+
+    def iter_task_ids_after(self, last_id):
+        """Yields (task id, task) for tasks stored after the task with id
+        last_id, or every task if last_id is -1."""
+        for offset, task in iter_task_lines(self.task_file, max(last_id, 0)):
+            if offset > last_id:
+                yield offset, task
+
+    def iter_user_tasks(self, username):
+        """Yields the tasks assigned to one user using the user index."""
+        for _, task in self.iter_user_task_ids(username):
+            yield task
+
+    def iter_user_task_ids(self, username):
+        """Yields (task id, task) for each task assigned to one user. The
+        id is the byte offset of the task in tasks.txt."""
+        offsets = task_index.load_user_offsets(self.task_file, username)
+        return task_journal.lookup(self.task_file, offsets, "user", username)
+
+    def pager(self, page_size):
+        """Returns a pager over all tasks."""
+        return TaskPager(self.task_file, page_size)
+
+    def iter_tasks_due(self, start=None, end=None):
+        """Yields incomplete tasks due from start up to, but not including,
+        end using the due date index."""
+        return due_index.get_tasks_due(self.task_file, start, end)
+
+    def search_tasks(self, query):
+        """Yields (words matched, task id, task) for tasks whose title or
+        description match a query, best matches first. See
+        search_index.parse_query for the query format."""
+        return search_index.search(self.task_file, query)
+
+    def add_task(self, task):
+        """Appends a task to tasks.txt and updates the user index and
+        stats.
+
+        Parameters:
+        task: list of user, title, description, date assigned, due date
+        and completed
+        """
+        self.task_writer.append(task, format_task_line(task))
+
+    def _tasks_written(self, written):
+        """Keeps the indexes and stats in step with a group of tasks just
+        appended by task_writer.
+
+        Parameters:
+        written: List of (task, byte offset) pairs in file order.
+        """
+        new_stats = task_stats.empty_task_stats()
+        for task, _ in written:
+            task_stats.add_task_to_stats(new_stats, task)
+        task_index.record_tasks(
+            self.task_file, [(task[0], offset) for task, offset in written]
+        )
+        due_index.record_due_dates(
+            self.task_file, [(task[4], offset) for task, offset in written]
+        )
+        new_postings = {}
+        for task, offset in written:
+            search_index.add_task_postings(new_postings, task, offset)
+        search_index.record_postings(
+            self.task_file, new_postings, written[0][1]
+        )
+        task_stats.record_tasks(
+            self.user_file, self.task_file, new_stats, written[0][1]
+        )
+
+    def add_tasks(self, tasks):
+        """Appends many tasks with one open, one buffered write stream and
+        one fsync, then updates the indexes and stats once, all under the
+        tasks.txt lock.
+
+        Parameters:
+        tasks: Iterable of task field lists. It is consumed lazily so it
+        can be a generator reading from another file.
+
+        Returns:
+        int: The number of tasks written.
+        """
+        with locked(self.task_file):
+            new_tasks = []
+            new_due_dates = []
+            new_postings = {}
+            new_stats = task_stats.empty_task_stats()
+            with open(self.task_file, "ab", buffering=1024 * 1024) as file:
+                start = offset = file.tell()
+                for task in tasks:
+                    line = format_task_line(task).encode()
+                    file.write(line)
+                    new_tasks.append((task[0], offset))
+                    new_due_dates.append((task[4], offset))
+                    search_index.add_task_postings(new_postings, task, offset)
+                    task_stats.add_task_to_stats(new_stats, task)
+                    offset += len(line)
+                file.flush()
+                os.fsync(file.fileno())
+            run_after_write(
+                self.task_file,
+                self._record_tasks,
+                new_tasks,
+                new_due_dates,
+                new_postings,
+                new_stats,
+                start,
+            )
+        return len(new_tasks)
+
+    def _record_tasks(
+        self, new_tasks, new_due_dates, new_postings, new_stats, start
+    ):
+        """Updates the indexes and stats for tasks appended by add_tasks."""
+        task_index.record_tasks(self.task_file, new_tasks)
+        due_index.record_due_dates(self.task_file, new_due_dates)
+        search_index.record_postings(self.task_file, new_postings, start)
+        if new_tasks:
+            task_stats.record_tasks(
+                self.user_file, self.task_file, new_stats, start
+            )
+
+    def count(self, table):
+        """Returns the number of users or tasks from the saved stats.
+
+        Parameters:
+        table (str): Either "users" or "tasks".
+        """
+        stats = task_stats.load_stats(self.user_file, self.task_file)
+        return stats["users"] if table == "users" else stats["tasks"]
+
+    def statistics(self):
+        """Returns the figures for the statistics menu, see
+        task_stats.summarise."""
+        stats = task_stats.load_stats(self.user_file, self.task_file)
+        return task_stats.summarise(stats)
+
+    def get_task(self, task_id):
+        """Returns the task with its journalled edits applied.
+
+        Raises:
+        KeyError: If there is no task at that offset or it was deleted.
+        """
+        overlay = task_journal.load_overlay(self.task_file)
+        for task in task_files.read_tasks_at(self.task_file, [task_id]):
+            task = task_journal.merge(overlay, task_id, task)
+            if task is not None and len(task) >= 6:
+                return task
+        raise KeyError(task_id)
+
+    def update_task(self, task_id, changes):
+        """Records an edit to a task in the journal.
+
+        Parameters:
+        task_id (int): The byte offset of the task in tasks.txt.
+        changes (dict): New values keyed by "user", "due_date" or
+        "completed".
+        """
+        with locked(self.task_file):
+            old_task = self.get_task(task_id)
+            new_task = task_journal.apply_changes(old_task, changes)
+            start = task_journal.record_change(
+                self.task_file, task_id, changes
+            )
+            task_stats.record_edit(self.task_file, old_task, new_task, start)
+
+    def delete_task(self, task_id):
+        """Records that a task has been deleted in the journal."""
+        with locked(self.task_file):
+            old_task = self.get_task(task_id)
+            start = task_journal.record_delete(self.task_file, task_id)
+            task_stats.record_edit(self.task_file, old_task, None, start)
+
+    def compact(self):
+        """Folds the journal into tasks.txt and returns the number of
+        edited tasks folded in."""
+        with locked(self.task_file):
+            return task_journal.compact(self.task_file)
+
+    def normalise_dates(self):
+        """Rewrites every date in tasks.txt in the canonical format and
+        returns the number of tasks changed."""
+        with locked(self.task_file):
+            # The journal refers to tasks by offset, so it is folded in
+            # first
+            self.compact()
+            return task_dates.rewrite_dates(self.task_file)
+
+    def close(self):
+        """Nothing to close for the text files."""
+
+
+class SqlitePager:
+    """Pages through the tasks table using the id each page starts at.
+
+    Attributes:
+    connection (sqlite3.Connection): The database connection.
+    page_size (int): The number of tasks on each page.
+    page_offsets (list): The task id each known page starts after.
+    last_page (int): Index of the final page, or None until it is found.
+    """
+
+    def __init__(self, connection, page_size=10):
+        self.connection = connection
+        self.page_size = page_size
+        self.page_offsets = [0]
+        self.last_page = None
+
+    def read_page(self, page):
+        """Returns the tasks on a page, counting from 0, or None if the
+        page does not exist."""
+        if page < 0:
+            return None
+        while len(self.page_offsets) <= page:
+            if self.last_page is not None:
+                return None
+            known = len(self.page_offsets) - 1
+            rows = self._fetch(self.page_offsets[known])
+            self._record_next(known, rows)
+
+        rows = self._fetch(self.page_offsets[page])
+        self._record_next(page, rows)
+        if not rows and page > 0:
+            return None
+        return [list(row[1:]) for row in rows[: self.page_size]]
+
+    def _fetch(self, after_id):
+        """Fetches one more row than a page holds to spot the last page."""
+        return self.connection.execute(
+            """SELECT id, username, title, description, date_assigned,
+            due_date, completed FROM tasks WHERE id > ? ORDER BY id
+            LIMIT ?""",
+            (after_id, self.page_size + 1),
+        ).fetchall()
+
+    def _record_next(self, page, rows):
+        """Stores where the page after page starts."""
+        if len(rows) <= self.page_size:
+            self.last_page = page
+        elif len(self.page_offsets) == page + 1:
+            self.page_offsets.append(rows[self.page_size - 1][0])
+
+
+class SqliteStorage:
+    """Stores users and tasks in an SQLite database in WAL mode.
+
+    Attributes:
+    connection (sqlite3.Connection): The database connection.
+    """
+
+    def __init__(self, db_path="task_manager.db"):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.create_tables()
+
+    def create_tables(self):
+        """Creates the users and tasks tables and their indexes."""
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            title TEXT,
+            description TEXT,
+            date_assigned TEXT,
+            due_date TEXT,
+            completed TEXT,
+            due_key TEXT);
+            CREATE INDEX IF NOT EXISTS tasks_username
+            ON tasks (username, id);
+            CREATE TABLE IF NOT EXISTS task_words (
+            word TEXT,
+            task_id INTEGER,
+            PRIMARY KEY (word, task_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS task_words_task
+            ON task_words (task_id);
+            CREATE TABLE IF NOT EXISTS search_progress (
+            last_id INTEGER NOT NULL);
+            """
+        )
+        # Databases made before due_key was added get it filled in once
+        columns = [
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(tasks)")
+        ]
+        if "due_key" not in columns:
+            self.connection.execute(
+                "ALTER TABLE tasks ADD COLUMN due_key TEXT"
+            )
+            self.connection.create_function(
+                "due_date_key", 1, task_dates.date_key
+            )
+            self.connection.execute(
+                "UPDATE tasks SET due_key = due_date_key(due_date)"
+            )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due_key, id)"
+        )
+        self.connection.commit()
+
+    def load_users(self):
+        """Returns a dictionary of usernames and passwords."""
+        return dict(
+            self.connection.execute("SELECT username, password FROM users")
+        )
+
+    def get_password(self, username):
+        """Returns a user's stored password, or None if they are not
+        registered."""
+        row = self.connection.execute(
+            "SELECT password FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def user_exists(self, username):
+        """Returns True if the username is registered."""
+        row = self.connection.execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row is not None
+
+    def add_user(self, username, password):
+        """Inserts a new user with their password hashed."""
+        stored = user_credentials.hash_password(password)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO users (username, password) VALUES (?, ?)",
+                (username, stored),
+            )
+
+    def hash_passwords(self, iterations=None):
+        """Replaces every plaintext password with a salted hash and
+        returns the number hashed."""
+        plaintext = [
+            (user_credentials.hash_password(stored, iterations), username)
+            for username, stored in self.load_users().items()
+            if not user_credentials.is_hashed(stored)
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE users SET password = ? WHERE username = ?", plaintext
+            )
+        return len(plaintext)
+
+    @task_profile.profiled_reader("SqliteStorage._iter_rows")
+    def _iter_rows(self, query, parameters=()):
+        """Yields each row of a task query as a list of fields."""
+        cursor = self.connection.execute(query, parameters)
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield list(row)
+
+    def iter_tasks(self):
+        """Yields every task in the order it was added."""
+        return self._iter_rows(
+            """SELECT username, title, description, date_assigned,
+            due_date, completed FROM tasks ORDER BY id"""
+        )
+
+    def iter_task_ids(self):
+        """Yields (task id, task) for every task in the order it was
+        added."""
+        for row in self._iter_rows(
+            """SELECT id, username, title, description, date_assigned,
+            due_date, completed FROM tasks ORDER BY id"""
+        ):
+            yield row[0], row[1:]
+
+    def iter_task_ids_after(self, last_id):
+        """Yields (task id, task) for tasks with an id above last_id."""
+        for row in self._iter_rows(
+            """SELECT id, username, title, description, date_assigned,
+            due_date, completed FROM tasks WHERE id > ? ORDER BY id""",
+            (last_id,),
+        ):
+            yield row[0], row[1:]
+
+    def iter_user_tasks(self, username):
+        """Yields the tasks assigned to one user using the username
+        index."""
+        for _, task in self.iter_user_task_ids(username):
+            yield task
+
+    def iter_user_task_ids(self, username):
+        """Yields (task id, task) for each task assigned to one user."""
+        for row in self._iter_rows(
+            """SELECT id, username, title, description, date_assigned,
+            due_date, completed FROM tasks WHERE username = ?
+            ORDER BY id""",
+            (username,),
+        ):
+            yield row[0], row[1:]
+
+    def pager(self, page_size):
+        """Returns a pager over all tasks."""
+        return SqlitePager(self.connection, page_size)
+
+    def iter_tasks_due(self, start=None, end=None):
+        """Yields incomplete tasks due from start up to, but not including,
+        end using the due date index."""
+        start_key, end_key = due_index.date_range(start, end)
+        return self._iter_rows(
+            """SELECT username, title, description, date_assigned,
+            due_date, completed FROM tasks
+            WHERE due_key >= ? AND due_key < ? AND due_key != 'unknown'
+            AND lower(trim(completed)) != 'yes'
+            ORDER BY due_key, id""",
+            (start_key, end_key),
+        )
+
+    def _index_new_words(self):
+        """Adds the words of tasks added since the last search to the
+        task_words table."""
+        row = self.connection.execute(
+            "SELECT last_id FROM search_progress"
+        ).fetchone()
+        last_id = row[0] if row else 0
+        new_words = []
+        for task_id, title, description in self.connection.execute(
+            "SELECT id, title, description FROM tasks WHERE id > ?",
+            (last_id,),
+        ):
+            for word in search_index.task_words([None, title, description]):
+                new_words.append((word, task_id))
+            last_id = task_id
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO task_words VALUES (?, ?)", new_words
+            )
+            self.connection.execute("DELETE FROM search_progress")
+            self.connection.execute(
+                "INSERT INTO search_progress VALUES (?)", (last_id,)
+            )
+
+    def _word_ids(self, word, prefix=False):
+        """Returns the set of task ids using a word, or any word starting
+        with it if prefix is True."""
+        if prefix:
+            # Every word starting with the prefix sorts before this one
+            after = word[:-1] + chr(ord(word[-1]) + 1)
+            rows = self.connection.execute(
+                """SELECT task_id FROM task_words
+                WHERE word >= ? AND word < ?""",
+                (word, after),
+            )
+        else:
+            rows = self.connection.execute(
+                "SELECT task_id FROM task_words WHERE word = ?", (word,)
+            )
+        return {row[0] for row in rows}
+
+    def search_tasks(self, query):
+        """Yields (words matched, task id, task) for tasks whose title or
+        description match a query, best matches first. See
+        search_index.parse_query for the query format."""
+        self._index_new_words()
+        ranked = search_index.rank(
+            search_index.parse_query(query), self._word_ids
+        )
+        for start in range(0, len(ranked), 500):
+            chunk = ranked[start : start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            tasks = {
+                row[0]: list(row[1:])
+                for row in self.connection.execute(
+                    f"""SELECT id, username, title, description,
+                    date_assigned, due_date, completed FROM tasks
+                    WHERE id IN ({placeholders})""",
+                    [task_id for _, task_id in chunk],
+                )
+            }
+            for score, task_id in chunk:
+                if task_id in tasks:
+                    yield score, task_id, tasks[task_id]
+
+    def add_task(self, task):
+        """Inserts a task.
+
+        Parameters:
+        task: list of user, title, description, date assigned, due date
+        and completed
+        """
+        with self.connection:
+            self.connection.execute(insert_task_sql, task_row(task))
+
+    def add_tasks(self, tasks):
+        """Inserts many tasks in a single transaction.
+
+        Parameters:
+        tasks: Iterable of task field lists, consumed lazily.
+
+        Returns:
+        int: The number of tasks written.
+        """
+        with self.connection:
+            cursor = self.connection.executemany(
+                insert_task_sql, map(task_row, tasks)
+            )
+        return cursor.rowcount
+
+    def count(self, table):
+        """Returns the number of rows in the users or tasks table.
+
+        Parameters:
+        table (str): Either "users" or "tasks".
+        """
+        table = "users" if table == "users" else "tasks"
+        return self.connection.execute(
+            f"SELECT COUNT(*) FROM {table}"
+        ).fetchone()[0]
+
+    def statistics(self):
+        """Returns the figures for the statistics menu, see
+        task_stats.summarise."""
+        stats = task_stats.empty_task_stats()
+        stats["users"] = self.count("users")
+        rows = self.connection.execute(
+            """SELECT username, lower(trim(completed)) = 'yes', due_date,
+            COUNT(*) FROM tasks GROUP BY username, 2, due_date"""
+        )
+        for user, completed, due_date, count in rows:
+            stats["tasks"] += count
+            stats["per_user"][user] = stats["per_user"].get(user, 0) + count
+            if completed:
+                stats["completed"] += count
+            else:
+                key = task_dates.date_key(due_date)
+                due = stats["incomplete_due"]
+                due[key] = due.get(key, 0) + count
+        return task_stats.summarise(stats)
+
+    def update_task(self, task_id, changes):
+        """Updates the fields of a task in place.
+
+        Parameters:
+        task_id (int): The id of the task.
+        changes (dict): New values keyed by "user", "due_date" or
+        "completed".
+        """
+        columns = {
+            "user": "username",
+            "due_date": "due_date",
+            "completed": "completed",
+        }
+        values = {columns[field]: value for field, value in changes.items()}
+        if "due_date" in changes:
+            values["due_key"] = task_dates.date_key(changes["due_date"])
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self.connection:
+            cursor = self.connection.execute(
+                f"UPDATE tasks SET {assignments} WHERE id = ?",
+                (*values.values(), task_id),
+            )
+        if cursor.rowcount == 0:
+            raise KeyError(task_id)
+
+    def delete_task(self, task_id):
+        """Deletes a task."""
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM tasks WHERE id = ?", (task_id,)
+            )
+            self.connection.execute(
+                "DELETE FROM task_words WHERE task_id = ?", (task_id,)
+            )
+            # The id is reused if it was the highest, so words are looked
+            # for again from there
+            self.connection.execute(
+                "UPDATE search_progress SET last_id = MIN(last_id, ?)",
+                (task_id - 1,),
+            )
+        if cursor.rowcount == 0:
+            raise KeyError(task_id)
+
+    def compact(self):
+        """Edits are made in place, so this only folds the write-ahead log
+        back into the database file. Returns 0."""
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return 0
+
+    def normalise_dates(self):
+        """Rewrites every date in the tasks table in the canonical format
+        and returns the number of tasks changed."""
+        self.connection.create_function(
+            "normalise_date",
+            1,
+            lambda value: task_dates.normalise_date(value) or value,
+        )
+        with self.connection:
+            cursor = self.connection.execute(
+                """UPDATE tasks SET
+                date_assigned = normalise_date(date_assigned),
+                due_date = normalise_date(due_date)
+                WHERE date_assigned != normalise_date(date_assigned)
+                OR due_date != normalise_date(due_date)"""
+            )
+        return cursor.rowcount
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+
+def import_text_files(
+    storage, user_file="user.txt", task_file="tasks.txt", replace=False
+):
+    """Copies users and tasks from the text files into an SqliteStorage.
+
+    Both files are streamed a line at a time and written in a single
+    transaction. Users that already exist are left unchanged. A database
+    that already holds tasks is refused, as importing again would add
+    every task twice, unless replace is True.
+
+    Parameters:
+    storage (SqliteStorage): The database to import into.
+    user_file: The path to user.txt.
+    task_file: The path to tasks.txt.
+    replace (bool): True to delete the tasks already in the database,
+    including any added since an earlier import, and import these.
+
+    Returns:
+    tuple: (number of users read, number of tasks imported)
+
+    Raises:
+    FileExistsError: If the database holds tasks and replace is False.
+    """
+    users = 0
+    tasks = 0
+
+    def count_users():
+        nonlocal users
+        for user in iter_user_lines(user_file):
+            users += 1
+            yield user
+
+    def count_tasks():
+        nonlocal tasks
+        for _, task in iter_task_lines(task_file):
+            tasks += 1
+            yield task_row(task)
+
+    with storage.connection:
+        if replace:
+            for table in ("tasks", "task_words", "search_progress"):
+                storage.connection.execute(f"DELETE FROM {table}")
+        elif storage.connection.execute(
+            "SELECT 1 FROM tasks LIMIT 1"
+        ).fetchone():
+            raise FileExistsError(17, "Tasks already in the database")
+        storage.connection.executemany(
+            """INSERT OR IGNORE INTO users (username, password)
+            VALUES (?, ?)""",
+            count_users(),
+        )
+        storage.connection.executemany(insert_task_sql, count_tasks())
+    return users, tasks
+
+
+def export_text_files(storage, user_file="user.txt", task_file="tasks.txt"):
+    """Writes the users and tasks in a storage backend out in the text
+    file format.
+
+    Each file is written to a temporary file that replaces it under its
+    lock, so nothing appending to it at the same time is lost halfway
+    through and readers never see it half written.
+
+    Parameters:
+    storage: The backend to export from.
+    user_file: The path to write user.txt to.
+    task_file: The path to write tasks.txt to.
+
+    Returns:
+    tuple: (number of users written, number of tasks written)
+    """
+    users = 0
+    tasks = 0
+    with locked(user_file), task_files.replacing(
+        user_file, sync=True
+    ) as file:
+        for username, password in storage.load_users().items():
+            file.write(f"{username}, {password}\n")
+            users += 1
+    with locked(task_file), task_files.replacing(
+        task_file, sync=True
+    ) as file:
+        for task in storage.iter_tasks():
+            file.write(format_task_line(task))
+            tasks += 1
+    return users, tasks
@@ -0,0 +1,694 @@
+"""Compact in-memory task store.
+
+Tasks are held in array-backed columns rather than as six strings each.
+Users and dates are dictionary-encoded, so "admin" or "15 Nov 24" is
+stored once however many tasks share it, titles and descriptions are
+packed into a single bytearray each, and the completed flag is a bitmap.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+
+import task_journal
+import task_parallel
+import task_snapshot
+import task_stats
+from due_index import date_range
+from task_dates import date_key
+from task_files import file_signature, prefix_checksum
+from task_reader import iter_task_lines
+
+
+class TextColumn:
+    """A column of strings packed end to end into one bytearray.
+
+    Attributes:
+    data (bytearray): The UTF-8 encoded strings.
+    ends (array): The offset in data where each string ends.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array("Q")
+
+    def append(self, value):
+        """Adds a string to the end of the column."""
+        self.data += value.encode()
+        self.ends.append(len(self.data))
+
+    def __getitem__(self, row):
+        start = self.ends[row - 1] if row else 0
+        return self.data[start : self.ends[row]].decode()
+
+    def __len__(self):
+        return len(self.ends)
+
+
+class Dictionary:
+    """Gives each distinct string a small integer code.
+
+    Attributes:
+    values (list): The string for each code.
+    codes (dict): The code for each string.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        """Returns the code for a string, adding it if it is new."""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+def _join_bitmaps(bitmap, other, rows, total_rows):
+    """Returns a bitmap holding the first rows bits of bitmap followed by
+    the bits of other, sized for total_rows."""
+    bits = int.from_bytes(bitmap, "little")
+    bits |= int.from_bytes(other, "little") << rows
+    return bytearray(bits.to_bytes((total_rows + 7) // 8, "little"))
+
+
+def get_bit(bitmap, row):
+    """Returns True if the bit for row is set."""
+    return bool(bitmap[row >> 3] & (1 << (row & 7)))
+
+
+def set_bit(bitmap, row, value):
+    """Sets or clears the bit for row."""
+    if value:
+        bitmap[row >> 3] |= 1 << (row & 7)
+    else:
+        bitmap[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+
+class TaskStore:
+    """Holds every task in compact columns.
+
+    Deleted tasks keep their row, marked in the deleted bitmap, so row
+    numbers never change while the store is in use.
+
+    Attributes:
+    ids (array): The storage backend's id for each task, in rising order.
+    users (Dictionary): Encodes usernames.
+    dates (Dictionary): Encodes both date columns.
+    user_codes (array): The user code of each task.
+    titles (TextColumn): The title of each task.
+    descriptions (TextColumn): The description of each task.
+    assigned_codes (array): The date assigned code of each task.
+    due_codes (array): The due date code of each task.
+    completed (bytearray): One bit per task, set if it is completed.
+    deleted (bytearray): One bit per task, set if it has been deleted.
+    rows_by_user (dict): Row numbers of each user's tasks, by user code.
+    rows_by_due (dict): Row numbers of the tasks due on each date code.
+    completed_count (int): The number of completed tasks.
+    deleted_count (int): The number of deleted tasks.
+    incomplete_by_due (dict): Incomplete tasks per due date code.
+    date_keys (list): The sortable key of each date code, filled in as
+    needed by sortable_dates.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.users = Dictionary()
+        self.dates = Dictionary()
+        self.user_codes = array("I")
+        self.titles = TextColumn()
+        self.descriptions = TextColumn()
+        self.assigned_codes = array("I")
+        self.due_codes = array("I")
+        self.completed = bytearray()
+        self.deleted = bytearray()
+        self.rows_by_user = {}
+        self.rows_by_due = {}
+        self.completed_count = 0
+        self.deleted_count = 0
+        self.incomplete_by_due = {}
+        self.date_keys = []
+
+    def __len__(self):
+        return len(self.user_codes) - self.deleted_count
+
+    @property
+    def row_count(self):
+        """The number of rows, including deleted tasks."""
+        return len(self.user_codes)
+
+    def append(self, task, task_id=None):
+        """Adds a task to the store.
+
+        Parameters:
+        task: list of user, title, description, date assigned, due date
+        and completed
+        task_id (int): The backend's id for the task, which must be higher
+        than any already in the store. Defaults to the row number.
+        """
+        user, title, description, assigned, due_date, completed = task
+        row = len(self.user_codes)
+        user_code = self.users.encode(user)
+        due_code = self.dates.encode(due_date)
+        self.ids.append(row if task_id is None else task_id)
+        self.user_codes.append(user_code)
+        self.titles.append(title)
+        self.descriptions.append(description)
+        self.assigned_codes.append(self.dates.encode(assigned))
+        self.due_codes.append(due_code)
+        if row % 8 == 0:
+            self.completed.append(0)
+            self.deleted.append(0)
+        self.rows_by_user.setdefault(user_code, array("I")).append(row)
+        self.rows_by_due.setdefault(due_code, array("I")).append(row)
+        set_bit(self.completed, row, completed.strip().lower() == "yes")
+        self._count(row, 1)
+
+    def extend(self, tasks):
+        """Adds every task from an iterable."""
+        for task in tasks:
+            self.append(task)
+
+    def extend_with_ids(self, tasks):
+        """Adds every (task id, task) pair from an iterable."""
+        for task_id, task in tasks:
+            self.append(task, task_id)
+
+    def extend_with_store(self, other):
+        """Adds every row of another store after the rows in this one, as
+        if its tasks had been appended one at a time.
+
+        The other store's user and date codes are translated to this
+        store's, so stores built separately, e.g. from different parts of
+        tasks.txt, can be joined in file order.
+        """
+        base = self.row_count
+        user_map = array("I", map(self.users.encode, other.users.values))
+        date_map = array("I", map(self.dates.encode, other.dates.values))
+        self.ids.extend(other.ids)
+        self.user_codes.extend(
+            array("I", map(user_map.__getitem__, other.user_codes))
+        )
+        self.assigned_codes.extend(
+            array("I", map(date_map.__getitem__, other.assigned_codes))
+        )
+        self.due_codes.extend(
+            array("I", map(date_map.__getitem__, other.due_codes))
+        )
+        for column, other_column in (
+            (self.titles, other.titles),
+            (self.descriptions, other.descriptions),
+        ):
+            size = len(column.data)
+            column.data += other_column.data
+            ends = map(size.__add__, other_column.ends)
+            column.ends.extend(array("Q", ends))
+        rows = base + other.row_count
+        self.completed = _join_bitmaps(
+            self.completed, other.completed, base, rows
+        )
+        self.deleted = _join_bitmaps(self.deleted, other.deleted, base, rows)
+        for index, other_index, code_map in (
+            (self.rows_by_user, other.rows_by_user, user_map),
+            (self.rows_by_due, other.rows_by_due, date_map),
+        ):
+            for code, other_rows in other_index.items():
+                index.setdefault(code_map[code], array("I")).extend(
+                    array("I", map(base.__add__, other_rows))
+                )
+        self.completed_count += other.completed_count
+        self.deleted_count += other.deleted_count
+        for code, count in other.incomplete_by_due.items():
+            new_code = date_map[code]
+            self.incomplete_by_due[new_code] = (
+                self.incomplete_by_due.get(new_code, 0) + count
+            )
+
+    def _count(self, row, amount):
+        """Adds the task in row to, or with amount -1 takes it off, the
+        completed and incomplete counters."""
+        if self.is_completed(row):
+            self.completed_count += amount
+        else:
+            due_code = self.due_codes[row]
+            self.incomplete_by_due[due_code] = (
+                self.incomplete_by_due.get(due_code, 0) + amount
+            )
+
+    def is_completed(self, row):
+        """Returns True if the task in row is completed."""
+        return get_bit(self.completed, row)
+
+    def is_deleted(self, row):
+        """Returns True if the task in row has been deleted."""
+        return get_bit(self.deleted, row)
+
+    def row_of(self, task_id):
+        """Returns the row holding a backend task id.
+
+        Raises:
+        KeyError: If the id is not in the store or was deleted.
+        """
+        row = bisect_left(self.ids, task_id)
+        if row == len(self.ids) or self.ids[row] != task_id:
+            raise KeyError(task_id)
+        if self.is_deleted(row):
+            raise KeyError(task_id)
+        return row
+
+    def update(self, row, changes):
+        """Changes the user, due date or completed flag of a task.
+
+        Parameters:
+        row (int): The row of the task.
+        changes (dict): New values keyed by "user", "due_date" or
+        "completed".
+        """
+        self._count(row, -1)
+        if "user" in changes:
+            old_code = self.user_codes[row]
+            new_code = self.users.encode(changes["user"])
+            self.rows_by_user[old_code].remove(row)
+            insort(self.rows_by_user.setdefault(new_code, array("I")), row)
+            self.user_codes[row] = new_code
+        if "due_date" in changes:
+            old_code = self.due_codes[row]
+            new_code = self.dates.encode(changes["due_date"])
+            self.rows_by_due[old_code].remove(row)
+            insort(self.rows_by_due.setdefault(new_code, array("I")), row)
+            self.due_codes[row] = new_code
+        if "completed" in changes:
+            completed = changes["completed"].strip().lower() == "yes"
+            set_bit(self.completed, row, completed)
+        self._count(row, 1)
+
+    def delete(self, row):
+        """Marks the task in row as deleted."""
+        self._count(row, -1)
+        self.rows_by_user[self.user_codes[row]].remove(row)
+        self.rows_by_due[self.due_codes[row]].remove(row)
+        set_bit(self.deleted, row, True)
+        self.deleted_count += 1
+
+    def task(self, row):
+        """Returns the fields of the task in row as a list."""
+        return [
+            self.users.values[self.user_codes[row]],
+            self.titles[row],
+            self.descriptions[row],
+            self.dates.values[self.assigned_codes[row]],
+            self.dates.values[self.due_codes[row]],
+            "Yes" if self.is_completed(row) else "No",
+        ]
+
+    def __iter__(self):
+        for row in range(self.row_count):
+            if not self.is_deleted(row):
+                yield self.task(row)
+
+    def user_rows(self, username):
+        """Returns the rows of the tasks assigned to a user, in order."""
+        user_code = self.users.codes.get(username)
+        return self.rows_by_user.get(user_code, array("I"))
+
+    def iter_user(self, username):
+        """Yields (task id, task) for each task assigned to a user."""
+        for row in self.user_rows(username):
+            yield self.ids[row], self.task(row)
+
+    def iter_due(self, start_key, end_key):
+        """Yields incomplete tasks with a due date key from start_key up
+        to, but not including, end_key, soonest first."""
+        due_codes = sorted(
+            (key, code)
+            for code, key in enumerate(self.sortable_dates())
+            if key != "unknown" and start_key <= key < end_key
+        )
+        for _, code in due_codes:
+            for row in self.rows_by_due.get(code, ()):
+                if not self.is_completed(row):
+                    yield self.task(row)
+
+    def sortable_dates(self):
+        """Returns the date_key of every date code. Codes never change, so
+        only dates added since the last call are converted."""
+        known = len(self.date_keys)
+        self.date_keys.extend(map(date_key, self.dates.values[known:]))
+        return self.date_keys
+
+    def task_stats(self):
+        """Returns counters in the form used by task_stats.summarise,
+        without the user count."""
+        date_keys = self.sortable_dates()
+        incomplete_due = {}
+        for code, count in self.incomplete_by_due.items():
+            key = date_keys[code]
+            incomplete_due[key] = incomplete_due.get(key, 0) + count
+        return {
+            "tasks": len(self),
+            "completed": self.completed_count,
+            "per_user": {
+                self.users.values[code]: len(rows)
+                for code, rows in self.rows_by_user.items()
+                if rows
+            },
+            "incomplete_due": incomplete_due,
+        }
+
+
+def _array(typecode, data):
+    """Rebuilds an array from the bytes saved by tobytes."""
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+
+def _text_column(data, ends):
+    """Rebuilds a TextColumn from its saved bytes."""
+    column = TextColumn()
+    column.data = bytearray(data)
+    column.ends = _array("Q", ends)
+    return column
+
+
+def _dictionary(values):
+    """Rebuilds a Dictionary from its list of values."""
+    dictionary = Dictionary()
+    dictionary.values = values
+    dictionary.codes = {value: code for code, value in enumerate(values)}
+    return dictionary
+
+
+def store_to_data(store):
+    """Returns the columns of a TaskStore in a form marshal can write."""
+    return {
+        "ids": store.ids.tobytes(),
+        "users": store.users.values,
+        "dates": store.dates.values,
+        "user_codes": store.user_codes.tobytes(),
+        "titles": (bytes(store.titles.data), store.titles.ends.tobytes()),
+        "descriptions": (
+            bytes(store.descriptions.data),
+            store.descriptions.ends.tobytes(),
+        ),
+        "assigned_codes": store.assigned_codes.tobytes(),
+        "due_codes": store.due_codes.tobytes(),
+        "completed": bytes(store.completed),
+        "deleted": bytes(store.deleted),
+        "rows_by_user": {
+            code: rows.tobytes() for code, rows in store.rows_by_user.items()
+        },
+        "rows_by_due": {
+            code: rows.tobytes() for code, rows in store.rows_by_due.items()
+        },
+        "completed_count": store.completed_count,
+        "deleted_count": store.deleted_count,
+        "incomplete_by_due": store.incomplete_by_due,
+    }
+
+
+def store_from_data(data):
+    """Rebuilds a TaskStore from the output of store_to_data."""
+    store = TaskStore()
+    store.ids = _array("q", data["ids"])
+    store.users = _dictionary(data["users"])
+    store.dates = _dictionary(data["dates"])
+    store.user_codes = _array("I", data["user_codes"])
+    store.titles = _text_column(*data["titles"])
+    store.descriptions = _text_column(*data["descriptions"])
+    store.assigned_codes = _array("I", data["assigned_codes"])
+    store.due_codes = _array("I", data["due_codes"])
+    store.completed = bytearray(data["completed"])
+    store.deleted = bytearray(data["deleted"])
+    store.rows_by_user = {
+        code: _array("I", rows) for code, rows in data["rows_by_user"].items()
+    }
+    store.rows_by_due = {
+        code: _array("I", rows) for code, rows in data["rows_by_due"].items()
+    }
+    store.completed_count = data["completed_count"]
+    store.deleted_count = data["deleted_count"]
+    store.incomplete_by_due = data["incomplete_by_due"]
+    return store
+
+
+def _store_range(file_path, start, end):
+    """Parses one range into a TaskStore and returns it in the snapshot's
+    marshal-ready form, which is much quicker to send back than the
+    tasks themselves."""
+    store = TaskStore()
+    store.extend_with_ids(iter_task_lines(file_path, start, end))
+    return store_to_data(store)
+
+
+def load_task_file(file_path, workers=None):
+    """Returns a TaskStore of every task in a tasks file, keyed by byte
+    offset, with journalled edits applied. A large file is parsed in
+    parallel, see task_parallel.
+
+    Parameters:
+    file_path: The path to the tasks file.
+    workers (int): Processes to use, every core by default.
+    """
+    workers = task_parallel.worker_count() if workers is None else workers
+    store = TaskStore()
+    if not task_parallel.use_parallel(file_path, workers):
+        store.extend_with_ids(iter_task_lines(file_path))
+        return store
+    ranges = task_parallel.map_ranges(_store_range, file_path, workers)
+    for data in ranges:
+        store.extend_with_store(store_from_data(data))
+    return store
+
+
+def _snapshot_store(task_file, signatures):
+    """Returns the TaskStore saved for a tasks file and whether it is
+    complete, or (None, False) if the file or its journal changed in a
+    way the snapshot cannot follow.
+
+    A store missing only tasks appended since it was saved is returned as
+    incomplete, for the caller to load just the new tasks onto. That is
+    only done if the part of tasks.txt it was built from still has the
+    same checksum, as a line edited in place leaves the file no shorter.
+
+    Parameters:
+    task_file: The path to tasks.txt.
+    signatures (list): The current signatures of tasks.txt and its
+    journal.
+    """
+    found = task_snapshot.read_snapshot(task_file)
+    if found is None:
+        return None, False
+    saved, data = found
+    if saved == signatures:
+        return store_from_data(data["store"]), True
+    if saved[0] is None or saved[1] != signatures[1]:
+        return None, False
+    if prefix_checksum(task_file, saved[0][0]) != data["checksum"]:
+        return None, False
+    return store_from_data(data["store"]), False
+
+
+def load_task_store(backend):
+    """Returns a TaskStore holding every task in a storage backend.
+
+    For the text backend the store comes from the snapshot next to
+    tasks.txt when it still matches, with any tasks appended since loaded
+    on top, and the snapshot is written again whenever it had to be
+    rebuilt or extended. A large tasks.txt is rebuilt in parallel, see
+    task_parallel. Other backends are always read in full.
+
+    Parameters:
+    backend: The storage backend to load from.
+
+    Returns:
+    TaskStore: The tasks with the backend's ids.
+    """
+    task_file = getattr(backend, "task_file", None)
+    if task_file is None:
+        store = TaskStore()
+        store.extend_with_ids(backend.iter_task_ids())
+        return store
+
+    journal_file = task_journal.journal_path(task_file)
+    before = [file_signature(task_file), file_signature(journal_file)]
+    if before[0] is None:
+        raise FileNotFoundError(2, "No such file", task_file)
+    store, complete = _snapshot_store(task_file, before)
+    if complete:
+        return store
+    if store is None:
+        store = load_task_file(task_file)
+    else:
+        last_id = store.ids[-1] if len(store.ids) else -1
+        store.extend_with_ids(backend.iter_task_ids_after(last_id))
+
+    # Another process writing meanwhile may or may not be in the store, so
+    # it is only saved if both files are as they were before reading
+    after = [file_signature(task_file), file_signature(journal_file)]
+    if before == after:
+        data = {
+            "store": store_to_data(store),
+            "checksum": prefix_checksum(task_file, before[0][0]),
+        }
+        task_snapshot.write_snapshot(task_file, before, data)
+    return store
+
+
+class MemoryPager:
+    """Pages through a TaskStore.
+
+    Attributes:
+    store (TaskStore): The tasks to page through.
+    page_size (int): The number of tasks on each page.
+    """
+
+    def __init__(self, store, page_size=10):
+        self.store = store
+        self.page_size = page_size
+
+    @property
+    def last_page(self):
+        """Index of the final page."""
+        return max(self.store.row_count - 1, 0) // self.page_size
+
+    def read_page(self, page):
+        """Returns the tasks on a page, counting from 0, or None if the
+        page does not exist. Pages are fixed ranges of rows, so a page
+        with deleted tasks on it is shown short."""
+        if page < 0 or page > self.last_page:
+            return None
+        start = page * self.page_size
+        end = min(start + self.page_size, self.store.row_count)
+        return [
+            self.store.task(row)
+            for row in range(start, end)
+            if not self.store.is_deleted(row)
+        ]
+
+
+class MemoryStorage:
+    """Serves every task view and statistic from a TaskStore loaded once
+    at startup, from the snapshot next to tasks.txt when it is up to date.
+    Writes go to both the store and the backend underneath so nothing is
+    lost when the session ends.
+
+    Attributes:
+    backend: The storage backend the tasks were loaded from.
+    store (TaskStore): The tasks held in memory.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.store = load_task_store(backend)
+
+    def load_users(self):
+        """Returns a dictionary of usernames and passwords."""
+        return self.backend.load_users()
+
+    def get_password(self, username):
+        """Returns a user's stored password, or None if they are not
+        registered."""
+        return self.backend.get_password(username)
+
+    def user_exists(self, username):
+        """Returns True if the username is registered."""
+        return self.backend.user_exists(username)
+
+    def add_user(self, username, password):
+        """Adds a new user to the backend."""
+        self.backend.add_user(username, password)
+
+    def hash_passwords(self, iterations=None):
+        """Hashes the backend's plaintext passwords."""
+        return self.backend.hash_passwords(iterations)
+
+    def iter_tasks(self):
+        """Yields every task in the order it was added."""
+        return iter(self.store)
+
+    def iter_user_tasks(self, username):
+        """Yields the tasks assigned to one user."""
+        for _, task in self.store.iter_user(username):
+            yield task
+
+    def iter_user_task_ids(self, username):
+        """Yields (task id, task) for each task assigned to one user."""
+        return self.store.iter_user(username)
+
+    def pager(self, page_size):
+        """Returns a pager over all tasks."""
+        return MemoryPager(self.store, page_size)
+
+    def iter_tasks_due(self, start=None, end=None):
+        """Yields incomplete tasks due from start up to, but not
+        including, end."""
+        return self.store.iter_due(*date_range(start, end))
+
+    def search_tasks(self, query):
+        """Yields (words matched, task id, task) for tasks matching a
+        search, using the backend's index."""
+        return self.backend.search_tasks(query)
+
+    def add_task(self, task):
+        """Adds a task to the backend and reloads the new tasks into the
+        store so they carry the backend's ids."""
+        self.backend.add_task(task)
+        self.load_new_tasks()
+
+    def add_tasks(self, tasks):
+        """Adds many tasks to the backend in one batch, then loads them
+        into the store."""
+        added = self.backend.add_tasks(tasks)
+        self.load_new_tasks()
+        return added
+
+    def load_new_tasks(self):
+        """Copies tasks the backend holds past the last id in the store."""
+        last_id = self.store.ids[-1] if len(self.store.ids) else -1
+        self.store.extend_with_ids(self.backend.iter_task_ids_after(last_id))
+
+    def update_task(self, task_id, changes):
+        """Edits a task in the backend and the store."""
+        row = self.store.row_of(task_id)
+        self.backend.update_task(task_id, changes)
+        self.store.update(row, changes)
+
+    def delete_task(self, task_id):
+        """Deletes a task from the backend and the store."""
+        row = self.store.row_of(task_id)
+        self.backend.delete_task(task_id)
+        self.store.delete(row)
+
+    def compact(self):
+        """Compacts the backend and reloads the store, as compacting can
+        change task ids."""
+        folded = self.backend.compact()
+        if folded:
+            self.store = load_task_store(self.backend)
+        return folded
+
+    def count(self, table):
+        """Returns the number of users or tasks."""
+        if table == "users":
+            return self.backend.count("users")
+        return len(self.store)
+
+    def statistics(self):
+        """Returns the figures for the statistics menu, see
+        task_stats.summarise."""
+        stats = self.store.task_stats()
+        stats["users"] = self.backend.count("users")
+        return task_stats.summarise(stats)
+
+    def normalise_dates(self):
+        """Rewrites every date in the backend and reloads the store."""
+        changed = self.backend.normalise_dates()
+        self.store = load_task_store(self.backend)
+        return changed
+
+    def close(self):
+        """Closes the backend."""
+        self.backend.close()
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+# The modules sit side by side in First Project rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_storage import SqliteStorage, TextStorage, format_task_line  # noqa
+
+# The users and tasks each test starts from. The dates assigned are out of
+# order, as --assigned and imports allow.
+sample_users = "admin, adm1n\nMike, pass\n"
+sample_tasks = [
+    ["admin", "Plan", "Plan the week", "3 Oct 24", "5 Oct 24", "No"],
+    ["Mike", "Test", "Test the build", "1 Oct 24", "6 Oct 24", "No"],
+    ["admin", "Ship", "Ship the release", "2 Oct 24", "7 Oct 24", "No"],
+]
+
+
+@pytest.fixture
+def tasks():
+    """The sample tasks, in the order they are in tasks.txt."""
+    return [list(task) for task in sample_tasks]
+
+
+@pytest.fixture
+def new_task():
+    """A task for Mike that is not in tasks.txt."""
+    return ["Mike", "Fix", "Fix the bug", "4 Oct 24", "8 Oct 24", "No"]
+
+
+@pytest.fixture
+def user_file(tmp_path):
+    """The path to a user.txt holding the sample users."""
+    path = tmp_path / "user.txt"
+    path.write_text(sample_users)
+    return str(path)
+
+
+@pytest.fixture
+def task_file(tmp_path):
+    """The path to a tasks.txt holding the sample tasks."""
+    path = tmp_path / "tasks.txt"
+    path.write_text("".join(format_task_line(task) for task in sample_tasks))
+    return str(path)
+
+
+@pytest.fixture
+def storage(user_file, task_file):
+    """A TextStorage over the sample files."""
+    return TextStorage(user_file, task_file)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """An empty SqliteStorage, closed after the test."""
+    database = SqliteStorage(str(tmp_path / "task_manager.db"))
+    yield database
+    database.close()
@@ -0,0 +1,32 @@
+import pytest
+
+from locked_writer import GroupWriter
+
+
+def test_failed_after_write_still_reports_the_append(tmp_path, capsys):
+    data_file = tmp_path / "tasks.txt"
+    data_file.write_text("first\n")
+
+    def after_write(written):
+        raise OSError("disk full")
+
+    writer = GroupWriter(str(data_file), after_write)
+    assert writer.append("item", "second\n") == len("first\n")
+    assert data_file.read_text() == "first\nsecond\n"
+    assert "disk full" in capsys.readouterr().err
+
+
+def test_failed_write_is_reported_and_cut_back(tmp_path, monkeypatch):
+    data_file = tmp_path / "tasks.txt"
+    data_file.write_text("first\n")
+    written = []
+    writer = GroupWriter(str(data_file), written.extend)
+
+    def fail(file_descriptor):
+        raise OSError("fsync failed")
+
+    monkeypatch.setattr("locked_writer.os.fsync", fail)
+    with pytest.raises(OSError, match="fsync failed"):
+        writer.append("item", "second\n")
+    assert data_file.read_text() == "first\n"
+    assert written == []
@@ -0,0 +1,42 @@
+import pytest
+
+import task_storage
+
+
+def test_importing_again_is_refused(database, user_file, task_file):
+    task_storage.import_text_files(database, user_file, task_file)
+
+    with pytest.raises(FileExistsError):
+        task_storage.import_text_files(database, user_file, task_file)
+    assert database.count("tasks") == 3
+
+
+def test_importing_again_can_replace_the_tasks(
+    database, user_file, task_file, new_task
+):
+    task_storage.import_text_files(database, user_file, task_file)
+    database.add_task(new_task)
+
+    assert task_storage.import_text_files(
+        database, user_file, task_file, replace=True
+    ) == (2, 3)
+    assert database.count("tasks") == 3
+    assert [task[0] for _, _, task in database.search_tasks("test")] == [
+        "Mike"
+    ]
+
+
+def test_export_writes_what_was_imported(
+    database, user_file, task_file, tmp_path
+):
+    with open(task_file, "r") as file:
+        imported = file.read()
+    task_storage.import_text_files(database, user_file, task_file)
+    open(task_file, "w").close()
+
+    assert task_storage.export_text_files(
+        database, user_file, task_file
+    ) == (2, 3)
+    with open(task_file, "r") as file:
+        assert file.read() == imported
+    assert list(tmp_path.glob("*.tmp")) == []
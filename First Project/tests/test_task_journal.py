@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import task_journal
+from task_files import iter_raw_tasks
+from task_reader import iter_task_lines
+
+
+@pytest.fixture
+def task_file(task_file):
+    task_journal._journal_cache.clear()
+    yield task_file
+    task_journal._journal_cache.clear()
+
+
+@pytest.fixture
+def offsets(task_file):
+    """The byte offset of each line in tasks.txt."""
+    return [offset for offset, _ in iter_raw_tasks(task_file)]
+
+
+def read_tasks(task_file):
+    return [task for _, task in iter_task_lines(task_file)]
+
+
+def restart():
+    """Forgets the cached journals, as a new process would start."""
+    task_journal._journal_cache.clear()
+
+
+def test_edits_and_deletes_are_merged(task_file, offsets):
+    task_journal.record_change(task_file, offsets[1], {"completed": "Yes"})
+    task_journal.record_delete(task_file, offsets[2])
+    restart()
+
+    assert task_journal.load_overlay(task_file) == {
+        offsets[1]: {"completed": "Yes"},
+        offsets[2]: None,
+    }
+    assert [task[5] for task in read_tasks(task_file)] == ["No", "Yes"]
+
+
+def test_lookup_follows_reassigned_tasks(task_file, offsets):
+    task_journal.record_change(task_file, offsets[1], {"user": "admin"})
+
+    found = task_journal.lookup(task_file, [offsets[0]], "user", "admin")
+    assert [offset for offset, _ in found] == offsets[:2]
+
+
+def test_line_cut_short_is_ignored(task_file, offsets):
+    task_journal.record_change(task_file, offsets[0], {"completed": "Yes"})
+    with open(task_journal.journal_path(task_file), "a") as file:
+        file.write('{"offset": 0, "del')
+    restart()
+
+    assert task_journal.load_overlay(task_file) == {
+        offsets[0]: {"completed": "Yes"}
+    }
+
+
+def test_compact_folds_the_journal_in(task_file, offsets):
+    task_journal.record_change(
+        task_file, offsets[0], {"due_date": "9 Oct 24"}
+    )
+    task_journal.record_delete(task_file, offsets[1])
+
+    assert task_journal.compact(task_file) == 2
+    assert not os.path.exists(task_journal.journal_path(task_file))
+    assert task_journal.load_overlay(task_file) == {}
+    assert [task[4] for task in read_tasks(task_file)] == [
+        "9 Oct 24",
+        "7 Oct 24",
+    ]
+
+
+def interrupted_compact(task_file, monkeypatch):
+    """Runs compact but stops it between replacing tasks.txt and removing
+    the journal."""
+
+    def crash(path):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(task_journal.os, "remove", crash)
+    with pytest.raises(KeyboardInterrupt):
+        task_journal.compact(task_file)
+    monkeypatch.undo()
+    restart()
+
+
+def test_journal_left_by_interrupted_compact_is_ignored(
+    task_file, offsets, monkeypatch
+):
+    task_journal.record_delete(task_file, offsets[0])
+    interrupted_compact(task_file, monkeypatch)
+    journal_file = task_journal.journal_path(task_file)
+
+    # The deleted task is gone from the new tasks.txt, so the journal's
+    # offset would now point at what was the second task
+    assert os.path.exists(journal_file)
+    assert task_journal.load_overlay(task_file) == {}
+    assert [task[1] for task in read_tasks(task_file)] == ["Test", "Ship"]
+
+    # The next edit starts the journal again
+    task_journal.record_change(task_file, 0, {"completed": "Yes"})
+    with open(journal_file) as file:
+        lines = file.readlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1]) == {
+        "offset": 0,
+        "changes": {"completed": "Yes"},
+    }
+    restart()
+    assert read_tasks(task_file)[0][5] == "Yes"
+
+
+def test_compact_removes_journal_left_by_interrupted_compact(
+    task_file, offsets, monkeypatch
+):
+    task_journal.record_delete(task_file, offsets[0])
+    interrupted_compact(task_file, monkeypatch)
+
+    assert task_journal.compact(task_file) == 0
+    assert not os.path.exists(task_journal.journal_path(task_file))
+    assert len(read_tasks(task_file)) == 2
+
+
+def test_copied_files_keep_their_edits(task_file, offsets, tmp_path):
+    task_journal.record_change(task_file, offsets[0], {"completed": "Yes"})
+    copy = tmp_path / "copy"
+    copy.mkdir()
+    copied_file = str(copy / "tasks.txt")
+    shutil.copy(task_file, copied_file)
+    shutil.copy(
+        task_journal.journal_path(task_file),
+        task_journal.journal_path(copied_file),
+    )
+
+    assert read_tasks(copied_file)[0][5] == "Yes"
+
+
+def test_journal_without_header_still_applies(task_file, offsets):
+    with open(task_journal.journal_path(task_file), "w") as file:
+        file.write(json.dumps({"offset": offsets[0], "delete": True}) + "\n")
+
+    assert len(read_tasks(task_file)) == 2
+
+
+def test_header_checks_only_the_end_of_a_large_file(
+    task_file, offsets, monkeypatch
+):
+    # Enough tasks that the file is well past the bytes checked
+    with open(task_file, "r+") as file:
+        second_line = file.readlines()[1]
+        file.write(second_line * 4000)
+
+    def whole_file(file_path, size):
+        raise AssertionError("the whole of tasks.txt was read")
+
+    monkeypatch.setattr(task_journal, "prefix_checksum", whole_file)
+    task_journal.record_delete(task_file, offsets[0])
+    restart()
+    assert len(read_tasks(task_file)) == 4002
+
+    # Deleting the first task moves every byte before the old size
+    interrupted_compact(task_file, monkeypatch)
+    assert task_journal.load_overlay(task_file) == {}
+    assert len(read_tasks(task_file)) == 4002
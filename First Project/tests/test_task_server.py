@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import pytest
+
+import task_storage
+import task_store
+from task_server import Session, TaskServer
+
+
+@pytest.fixture(params=["text", "sqlite"])
+def server(request, tmp_path, user_file, task_file):
+    db_path = str(tmp_path / "task_manager.db")
+    if request.param == "sqlite":
+
+        def open_backend():
+            return task_storage.SqliteStorage(db_path)
+
+        backend = open_backend()
+        task_storage.import_text_files(backend, user_file, task_file)
+    else:
+
+        def open_backend():
+            return task_storage.TextStorage(user_file, task_file)
+
+        backend = open_backend()
+    server = TaskServer(task_store.MemoryStorage(backend), open_backend)
+    yield server
+    server.close()
+
+
+def respond(server, session, request):
+    line = json.dumps(request).encode()
+    return asyncio.run(server.respond(session, line))
+
+
+def run_session(server, requests):
+    """Logs in as admin and returns the responses to requests, with the
+    writer running as it does in the server."""
+
+    async def run():
+        writer = asyncio.create_task(server.run_writer())
+        session = Session()
+        login = {"op": "login", "username": "admin", "password": "adm1n"}
+        responses = []
+        for request in [login, *requests]:
+            line = json.dumps(request).encode()
+            responses.append(await server.respond(session, line))
+        writer.cancel()
+        return responses[1:]
+
+    return asyncio.run(run())
+
+
+def test_login(server):
+    session = Session()
+    request = {"op": "login", "username": "Mike", "password": "pass"}
+    response = respond(server, session, request)
+
+    assert response == {"username": "Mike", "admin": False, "ok": True}
+    assert session.username == "Mike"
+
+
+@pytest.mark.parametrize(
+    "request_fields",
+    [
+        {"username": ["admin"], "password": "adm1n"},
+        {"username": "admin", "password": {"password": "adm1n"}},
+    ],
+)
+def test_login_fields_must_be_text(server, request_fields):
+    session = Session()
+    response = respond(server, session, {"op": "login", **request_fields})
+
+    assert response["ok"] is False
+    assert "must be text" in response["error"]
+    assert session.username is None
+
+
+def test_unexpected_error_is_answered(server, monkeypatch, capsys):
+    async def broken(session, request):
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(server, "dispatch", broken)
+    response = respond(server, Session(), {"op": "va"})
+
+    assert response == {"ok": False, "error": "The request failed"}
+    assert "broken" in capsys.readouterr().err
+
+
+def test_writes_are_saved(server):
+    task = {"user": "Mike", "title": "Fix", "description": "Fix the bug"}
+    responses = run_session(
+        server,
+        [
+            {"op": "r", "username": "Sam", "password": "s4m"},
+            {"op": "a", **task, "due": "8 Oct 24"},
+            {"op": "va"},
+        ],
+    )
+
+    assert [response["ok"] for response in responses] == [True] * 3
+    assert [task[1] for task in responses[2]["tasks"]] == [
+        "Plan",
+        "Test",
+        "Ship",
+        "Fix",
+    ]
+    assert server.storage.user_exists("Sam")
+
+
+def test_writer_carries_on_after_a_failed_write(server, monkeypatch):
+    calls = []
+
+    def add_tasks(tasks):
+        calls.append(tasks)
+        if len(calls) == 1:
+            raise RuntimeError("disk full")
+        return original(tasks)
+
+    # Opens the writer thread's backend so its add_tasks can be replaced
+    server.write_thread.submit(server._call_backend, "count", "tasks").result()
+    original = server.write_backend.add_tasks
+    monkeypatch.setattr(server.write_backend, "add_tasks", add_tasks)
+    task = {"user": "Mike", "title": "Fix", "due": "8 Oct 24"}
+    responses = run_session(server, [{"op": "a", **task}] * 2)
+
+    assert responses[0] == {"ok": False, "error": "The request failed"}
+    assert responses[1] == {"ok": True}
+    assert len(server.storage.store) == 4
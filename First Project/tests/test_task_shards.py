@@ -0,0 +1,131 @@
+import os
+import threading
+
+import pytest
+
+import task_shards
+from locked_writer import locked
+from task_shards import ShardedStorage
+
+
+@pytest.fixture
+def shards(tmp_path, user_file):
+    shard_dir = str(tmp_path / "shards")
+    task_shards.create_shards(shard_dir, 4)
+    # The two users must be in different shards for the moves below
+    assert task_shards.shard_of("admin", 4) != task_shards.shard_of(
+        "Mike", 4
+    )
+    return ShardedStorage(user_file, shard_dir)
+
+
+@pytest.fixture
+def tasks(tasks, new_task):
+    """The sample tasks and then the new one, in the order added."""
+    return tasks + [new_task]
+
+
+def titles(storage):
+    return [task[1] for task in storage.iter_tasks()]
+
+
+def test_merge_keeps_the_order_tasks_were_added(shards, tasks):
+    shards.add_task(tasks[0])
+    shards.add_tasks(tasks[1:])
+
+    assert titles(shards) == ["Plan", "Test", "Ship", "Fix"]
+    assert shards.pager(3).read_page(1) == [tasks[3]]
+
+
+def test_split_and_join_keep_the_file_order(tmp_path, tasks):
+    task_file = tmp_path / "tasks.txt"
+    task_file.write_text(
+        "".join(task_shards.format_task_line(task) for task in tasks)
+    )
+    shard_dir = str(tmp_path / "shards")
+
+    assert task_shards.split_tasks_file(str(task_file), shard_dir, 2) == 4
+    os.remove(task_file)
+    assert task_shards.join_shards(shard_dir, str(task_file)) == 4
+    assert task_file.read_text() == "".join(
+        task_shards.format_task_line(task) for task in tasks
+    )
+
+
+def test_split_cut_short_leaves_no_manifest(tmp_path, monkeypatch, tasks):
+    task_file = tmp_path / "tasks.txt"
+    task_file.write_text(task_shards.format_task_line(tasks[0]))
+    shard_dir = str(tmp_path / "shards")
+
+    def crash(shard_dir, next_sequence):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(task_shards, "_write_sequence", crash)
+    with pytest.raises(KeyboardInterrupt):
+        task_shards.split_tasks_file(str(task_file), shard_dir, 2)
+    monkeypatch.undo()
+
+    assert not os.path.exists(task_shards.manifest_path(shard_dir))
+    assert task_shards.split_tasks_file(str(task_file), shard_dir, 2) == 1
+
+
+def test_move_between_shards(shards, tasks):
+    shards.add_tasks(tasks)
+    task_id = next(
+        task_id
+        for task_id, task in shards.iter_task_ids()
+        if task[1] == "Test"
+    )
+    shards.update_task(task_id, {"user": "admin"})
+
+    assert titles(shards) == ["Plan", "Ship", "Fix", "Test"]
+    assert [task[1] for task in shards.iter_user_tasks("admin")] == [
+        "Plan",
+        "Ship",
+        "Test",
+    ]
+    assert not os.path.exists(task_shards.moves_path(shards.shard_dir))
+
+
+def test_move_cut_short_is_finished(shards, monkeypatch, tasks):
+    shards.add_tasks(tasks)
+    task_id = next(
+        task_id
+        for task_id, task in shards.iter_task_ids()
+        if task[1] == "Test"
+    )
+    source, _ = shards._locate(task_id)
+
+    # Crash after the task is added to its new shard but before it is
+    # deleted from its old one
+    def crash(offset):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(source, "delete_task", crash)
+    with pytest.raises(KeyboardInterrupt):
+        shards.update_task(task_id, {"user": "admin"})
+    monkeypatch.undo()
+    assert titles(shards).count("Test") == 2
+
+    reopened = ShardedStorage(shards.user_file, shards.shard_dir)
+    assert titles(reopened) == ["Plan", "Ship", "Fix", "Test"]
+    assert not os.path.exists(task_shards.moves_path(shards.shard_dir))
+
+
+def test_join_waits_for_tasks_being_added(shards, tmp_path, tasks):
+    shards.add_tasks(tasks[:2])
+    task_file = str(tmp_path / "tasks.txt")
+    join = threading.Thread(
+        target=task_shards.join_shards, args=(shards.shard_dir, task_file)
+    )
+    with locked(shards._shard_for("Mike").task_file):
+        join.start()
+        join.join(0.2)
+        assert join.is_alive()
+        shards.add_task(tasks[3])
+    join.join()
+
+    assert (tmp_path / "tasks.txt").read_text() == "".join(
+        task_shards.format_task_line(task)
+        for task in [tasks[0], tasks[1], tasks[3]]
+    )
@@ -0,0 +1,51 @@
+import os
+
+import task_store
+
+
+def touch_later(path):
+    """Moves a file's mtime on, as an edit a moment later would."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def stored_tasks(storage):
+    return [list(task) for task in task_store.load_task_store(storage)]
+
+
+def edit_file(task_file, old, new, appended=""):
+    """Replaces text in tasks.txt and adds appended to the end."""
+    with open(task_file, "r") as file:
+        text = file.read()
+    with open(task_file, "w") as file:
+        file.write(text.replace(old, new) + appended)
+
+
+def test_snapshot_follows_appended_tasks(storage, new_task):
+    stored_tasks(storage)
+    storage.add_task(new_task)
+
+    assert stored_tasks(storage)[-1][:2] == ["Mike", "Fix"]
+    assert len(stored_tasks(storage)) == 4
+
+
+def test_snapshot_ignored_after_same_length_edit(storage, task_file):
+    assert stored_tasks(storage)[0][2] == "Plan the week"
+
+    # Same length, so the file's size does not change
+    edit_file(task_file, "Plan the week", "Plan the year")
+    touch_later(task_file)
+
+    assert stored_tasks(storage)[0][2] == "Plan the year"
+
+
+def test_snapshot_ignored_after_edit_and_append(storage, task_file):
+    stored_tasks(storage)
+
+    with open(task_file, "r") as file:
+        first_line = file.readline()
+    edit_file(task_file, "Test the build", "Test the tests", first_line)
+
+    loaded = stored_tasks(storage)
+    assert loaded[1][2] == "Test the tests"
+    assert len(loaded) == 4
@@ -0,0 +1,19 @@
+import task_stats
+
+
+def test_stats_saved_by_another_process_are_read_again(
+    storage, new_task, monkeypatch
+):
+    assert storage.count("tasks") == 3
+    stale = dict(task_stats._stats_cache[storage.task_file])
+
+    # Another process appends a task and updates the stats file, leaving
+    # this one's copy in memory behind
+    storage.add_task(new_task)
+    task_stats._stats_cache[storage.task_file] = stale
+
+    def recount(task_file, workers=None):
+        raise AssertionError("tasks.txt was recounted")
+
+    monkeypatch.setattr(task_stats, "count_tasks", recount)
+    assert storage.count("tasks") == 4
@@ -0,0 +1,44 @@
+import os
+
+from user_registry import UserRegistry
+
+# Enough users after admin that an edit to admin's line is well away from
+# the end of the file
+others = "".join(f"user{number}, pass{number}\n" for number in range(50))
+
+
+def write_users(tmp_path, text):
+    user_file = tmp_path / "user.txt"
+    user_file.write_text(text)
+    # Moves the mtime on, as an edit a moment later would
+    stat = os.stat(user_file)
+    os.utime(user_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    return str(user_file)
+
+
+def test_appended_user_is_found(tmp_path):
+    user_file = write_users(tmp_path, "admin, adm1n\n")
+    registry = UserRegistry(user_file)
+    assert registry.load() == {"admin": "adm1n"}
+
+    with open(user_file, "a") as file:
+        file.write("Mike, pass\n")
+    assert registry.load() == {"admin": "adm1n", "Mike": "pass"}
+
+
+def test_password_changed_in_place(tmp_path):
+    user_file = write_users(tmp_path, "admin, adm1n\n" + others)
+    registry = UserRegistry(user_file)
+    registry.load()
+
+    write_users(tmp_path, "admin, s3cr3\n" + others)
+    assert registry.load()["admin"] == "s3cr3"
+
+
+def test_snapshot_ignored_after_password_changed(tmp_path):
+    user_file = write_users(tmp_path, "admin, adm1n\n" + others)
+    UserRegistry(user_file).load()
+
+    # A new process starts from the snapshot saved by the first
+    write_users(tmp_path, "admin, s3cr3\n" + others)
+    assert UserRegistry(user_file).load()["admin"] == "s3cr3"
@@ -0,0 +1,82 @@
+"""Salted password hashes for user.txt and the users table.
+
+A stored password is either the plaintext written by earlier versions or
+a hash in the form
+
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+with the salt and hash in base64, so it still fits in the password field
+of user.txt. The number of iterations is the cost: each one makes a
+login, and each guess by anyone holding a copy of user.txt, that much
+slower. It is kept with each hash, so the cost can be raised for new
+passwords without breaking the old ones.
+
+Users are still looked up by name in the dictionary kept by
+UserRegistry, so only the one password being checked is hashed.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+
+# Marks a stored password as a hash and names the algorithm
+algorithm = "pbkdf2_sha256"
+
+# PBKDF2 iterations for new hashes. See task_benchmark.py --login-costs
+# for how long a login takes at each cost on this machine.
+hash_iterations = 200_000
+
+# Bytes of random salt for each password
+salt_size = 16
+
+
+def _encode(data):
+    return base64.b64encode(data).decode()
+
+
+def _digest(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def hash_password(password, iterations=None):
+    """Returns a salted hash of a password to store in place of it.
+
+    Parameters:
+    password (str): The plaintext password.
+    iterations (int): The cost, hash_iterations if not given.
+    """
+    if iterations is None:
+        iterations = hash_iterations
+    salt = os.urandom(salt_size)
+    digest = _digest(password, salt, iterations)
+    return f"{algorithm}${iterations}${_encode(salt)}${_encode(digest)}"
+
+
+def is_hashed(stored):
+    """Returns True if a stored password is a hash rather than
+    plaintext."""
+    return stored.startswith(algorithm + "$")
+
+
+def verify_password(stored, password):
+    """Checks a password against the stored hash or, for users not yet
+    migrated, the stored plaintext.
+
+    Parameters:
+    stored (str): The password field from user.txt.
+    password (str): The password typed in.
+
+    Returns:
+    bool: True if they match.
+    """
+    if not is_hashed(stored):
+        return hmac.compare_digest(stored.encode(), password.encode())
+    try:
+        _, iterations, salt, digest = stored.split("$")
+        expected = base64.b64decode(digest)
+        actual = _digest(password, base64.b64decode(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, actual)
+
@@ -0,0 +1,130 @@
+"""Cached copy of user.txt that only re-reads what has changed."""
+
+import zlib
+
+import task_snapshot
+from task_files import file_signature, prefix_checksum
+
+
+def parse_user_line(line):
+    """Splits one line of user.txt into a stripped username and password.
+
+    Parameters:
+    line (str): A line from user.txt.
+
+    Returns:
+    tuple: (username, password)
+    """
+    user, password = line.strip().split(",")
+    return user.strip(), password.strip()
+
+
+class UserRegistry:
+    """Holds the usernames and passwords from user.txt in a dictionary.
+
+    refresh compares the file's size and modification time with those
+    seen last time. When the file still starts with exactly the bytes
+    parsed before, as it does after add_user appends, just the new bytes
+    are parsed. Any other change, such as a password edited in place,
+    reloads the whole file. The first refresh in a process starts from the
+    snapshot next to user.txt, so only a file changed since the last run
+    is parsed again.
+
+    Attributes:
+    user_file (str): The path to user.txt.
+    users (dict): Usernames as keys and passwords as values.
+    signature (list): Size and mtime of user.txt when last read.
+    parsed_size (int): Bytes of user.txt parsed as complete lines.
+    checksum (int): crc32 of the parsed part of the file.
+    """
+
+    def __init__(self, user_file="user.txt"):
+        self.user_file = user_file
+        self.users = {}
+        self.signature = None
+        self.parsed_size = 0
+        self.checksum = 0
+
+    def _parse_from(self, file, start):
+        """Parses user lines from start to the end of the file."""
+        file.seek(start)
+        data = file.read()
+        # A last line with no newline yet is parsed, but read again next
+        # time in case it was only part written
+        complete = data.rfind(b"\n") + 1
+        for line in data.decode().splitlines():
+            if line.strip():
+                user, password = parse_user_line(line)
+                self.users[user] = password
+        self.parsed_size = start + complete
+        self.checksum = zlib.crc32(
+            data[:complete], self.checksum if start else 0
+        )
+
+    def _only_appended(self, signature):
+        """Returns True if the file still starts with the part already
+        parsed, byte for byte."""
+        if not self.parsed_size or signature[0] < self.parsed_size:
+            return False
+        checksum = prefix_checksum(self.user_file, self.parsed_size)
+        return checksum == self.checksum
+
+    def _load_snapshot(self):
+        """Starts from the users saved in the snapshot, if there is one."""
+        found = task_snapshot.read_snapshot(self.user_file)
+        if found is None:
+            return
+        signatures, data = found
+        self.users = data["users"]
+        self.parsed_size = data["parsed_size"]
+        self.checksum = data["checksum"]
+        self.signature = signatures[0]
+
+    def _save_snapshot(self):
+        """Saves the parsed users for the next process to start from."""
+        data = {
+            "users": self.users,
+            "parsed_size": self.parsed_size,
+            "checksum": self.checksum,
+        }
+        task_snapshot.write_snapshot(
+            self.user_file, [self.signature, None], data
+        )
+
+    def refresh(self):
+        """Brings the cached users up to date with user.txt.
+
+        Raises:
+        FileNotFoundError: If user.txt does not exist.
+        """
+        signature = file_signature(self.user_file)
+        if signature is None:
+            raise FileNotFoundError(2, "No such file", self.user_file)
+        first = self.signature is None
+        if first:
+            self._load_snapshot()
+        if signature == self.signature:
+            return
+
+        with open(self.user_file, "rb") as file:
+            appended = self._only_appended(signature)
+            if appended:
+                self._parse_from(file, self.parsed_size)
+            else:
+                self.users = {}
+                self._parse_from(file, 0)
+        self.signature = signature
+        # Saving after every add_user would rewrite the whole snapshot for
+        # one line, so it is only saved when it was out of date at startup
+        # or the file had to be read in full
+        if first or not appended:
+            self._save_snapshot()
+
+    def load(self):
+        """Returns the up to date dictionary of usernames and passwords."""
+        self.refresh()
+        return self.users
+
+    def __contains__(self, username):
+        self.refresh()
+        return username in self.users
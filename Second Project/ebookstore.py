@@ -6,6 +6,9 @@ cursor = db.cursor()
 
 separator = "------------------------------------"
 
+# Books shown on each page of search results
+page_size = 10
+
 
 def new_book():
     """
@@ -307,12 +310,106 @@ def delete_menu():
     return menu_input
 
 
+def fts_query(search_term):
+    """
+    Turns a search into an FTS5 query.
+
+    Each word is quoted, so characters FTS5 treats as operators are
+    searched for as they are, and matches any word starting with it.
+
+    Parameter:
+        search_term (str): The search as typed by the user.
+
+    Returns:
+        str: The query for MATCH, or an empty string if there are no
+        words to search for.
+    """
+    words = search_term.split()
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+
+def find_books(cursor, search_term, key=None, backward=False):
+    """
+    Finds one page of books by title or author.
+
+    Uses the full-text index when there is one, with the best matches
+    first and matching words marked with [ ]. Otherwise falls back to a
+    partial match of title or author, in order of title. Pages start
+    after the (sort value, id) key of the last book already shown rather
+    than counting past the earlier pages, so every page costs the same.
+
+    Parameters:
+        cursor (sqlite3.Cursor): The database cursor used to execute SQL
+        commands.
+        search_term (str): The search as typed by the user.
+        key (tuple): The sort value and id of the book to start after, or
+        None for the first page.
+        backward (bool): Whether to find the page before key instead.
+
+    Returns:
+        tuple: A list of up to page_size (id, title, author, qty, sort
+        value) rows in display order, and whether there are more books
+        beyond them.
+    """
+    query = fts_query(search_term)
+    if fts_enabled and query:
+        sort = "bm25(book_fts)"
+        sql = """SELECT book.id, highlight(book_fts, 0, '[', ']'),
+                highlight(book_fts, 1, '[', ']'), book.qty, bm25(book_fts)
+            FROM book_fts JOIN book ON book.id = book_fts.rowid
+            WHERE book_fts MATCH ?"""
+        params = [query]
+    else:
+        sort = "book.title"
+        sql = """SELECT book.id, title, author, qty, title FROM book
+            WHERE (title LIKE ? OR author LIKE ?)"""
+        params = ["%" + search_term + "%", "%" + search_term + "%"]
+
+    order = "DESC" if backward else "ASC"
+    if key is not None:
+        sql += f" AND ({sort}, book.id) {'<' if backward else '>'} (?, ?)"
+        params.extend(key)
+    sql += f" ORDER BY {sort} {order}, book.id {order} LIMIT ?"
+    # One more than a page shows whether there is another page
+    params.append(page_size + 1)
+    cursor.execute(sql, params)
+    rows = cursor.fetchmany(page_size + 1)
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backward:
+        rows.reverse()
+    return rows, more
+
+
+def page_key(row):
+    """Returns the (sort value, id) key of a row from find_books."""
+    return row[4], row[0]
+
+
+def print_books(rows, page):
+    """
+    Prints a page of books from find_books.
+
+    Parameters:
+        rows (list): The rows to print.
+        page (int): The page number, counting from 1.
+    """
+    print(separator)
+    for id, title, author, qty, _ in rows:
+        print(f"ID: {id}. {title} by {author} ({qty})")
+    first = (page - 1) * page_size + 1
+    print(separator)
+    print(f"Page {page}: displaying results {first}-{first + len(rows) - 1}")
+    print(separator)
+
+
 def search(cursor):
     """
     Performs a search on the database.
 
-    Searches the database for user input to partially match either the
-    title or author. Only displays a maximum of 10 results.
+    Searches the database for books whose title or author contains words
+    starting with the user's input, best matches first, and shows them a
+    page at a time.
 
     Parameter:
         cursor (sqlite3.Cursor): The database cursor used to execute SQL
@@ -324,30 +421,49 @@ def search(cursor):
             break
         else:
             pass
-        counter = 0
-        cursor.execute(
-            "SELECT * FROM book WHERE title LIKE ? OR author LIKE ? LIMIT 10",
-            ("%" + search_term + "%", "%" + search_term + "%"),
-        )
-        print(separator)
-        for row in cursor.fetchall():
-            id, title, author, qty = row
-            print(f"ID: {id}. {title} by {author} ({qty})")
-            counter += 1
-
-        if counter == 0:
+        rows, has_next = find_books(cursor, search_term)
+        page = 1
 
+        if not rows:
+            print(separator)
             print("No results found.")
             print(separator)
 
-        elif counter > 0 and counter < 10:
-            print(separator)
-            print(f"Displaying {counter} results.")
-            print(separator)
-        else:
-            print(separator)
-            print("Displaying first 10 results only.")
-            print(separator)
+        while rows:
+            print_books(rows, page)
+            choice = input(
+                "n - next page, p - previous page, e - exit results: "
+            ).lower()
+            if choice == "n":
+                if not has_next:
+                    print("Already on the last page.")
+                    continue
+                next_rows, has_next = find_books(
+                    cursor, search_term, page_key(rows[-1])
+                )
+                # Books may have been deleted since the page was shown
+                if next_rows:
+                    rows = next_rows
+                    page += 1
+                else:
+                    print("Already on the last page.")
+            elif choice == "p":
+                if page == 1:
+                    print("Already on the first page.")
+                    continue
+                previous_rows, has_previous = find_books(
+                    cursor, search_term, page_key(rows[0]), backward=True
+                )
+                if previous_rows:
+                    rows = previous_rows
+                    has_next = True
+                    page = page - 1 if has_previous else 1
+                else:
+                    page = 1
+            elif choice == "e":
+                break
+            else:
+                print("Input not recognised. Please try again.")
 
         cont_search = input("Would you like to search again? (yes/no): ")
         print(separator)
@@ -496,6 +612,46 @@ try:
 except sqlite3.OperationalError:
     pass
 
+# Lets searches without the full-text index page through titles in order
+cursor.execute("CREATE INDEX IF NOT EXISTS book_title ON book(title)")
+db.commit()
+
+# Create full-text index of titles and authors for searching. Triggers
+# keep it up to date with every change to book, and books already in the
+# database are indexed the first time.
+fts_enabled = True
+cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'book_fts'")
+if cursor.fetchone() is None:
+    try:
+        cursor.executescript(
+            """BEGIN;
+            CREATE VIRTUAL TABLE book_fts USING fts5(
+                title, author, content='book', content_rowid='id',
+                prefix='2 3'
+            );
+            CREATE TRIGGER book_fts_insert AFTER INSERT ON book BEGIN
+                INSERT INTO book_fts(rowid, title, author)
+                VALUES (new.id, new.title, new.author);
+            END;
+            CREATE TRIGGER book_fts_delete AFTER DELETE ON book BEGIN
+                INSERT INTO book_fts(book_fts, rowid, title, author)
+                VALUES ('delete', old.id, old.title, old.author);
+            END;
+            CREATE TRIGGER book_fts_update AFTER UPDATE OF title, author
+            ON book BEGIN
+                INSERT INTO book_fts(book_fts, rowid, title, author)
+                VALUES ('delete', old.id, old.title, old.author);
+                INSERT INTO book_fts(rowid, title, author)
+                VALUES (new.id, new.title, new.author);
+            END;
+            INSERT INTO book_fts(book_fts) VALUES ('rebuild');
+            COMMIT;"""
+        )
+    # Searches without the index if SQLite was built without FTS5
+    except sqlite3.OperationalError:
+        db.rollback()
+        fts_enabled = False
+
 # Current stock to be added to db
 stock = [
     (3001, "A Tale of Two Cities", "Charles Dickens", 30),